@@ -0,0 +1,78 @@
+"""
+Benchmark of stepping many visual sessions per frame with :class:`BatchVisualGetToKnowYou` compared to one
+:class:`VisualGetToKnowYou` instance per session.
+
+Each tick every session receives a frame with a single face. Sessions cycle through enrollment: they gaze
+at a stranger, are told a name and then keep seeing the same, known face.
+
+Run from the repository root with ``python benchmarks/bench_batch.py``.
+"""
+import argparse
+import time
+
+import numpy as np
+from cltl.face_recognition.api import Face
+
+from cltl.g2ky.batch import BatchVisualGetToKnowYou
+from cltl.g2ky.visual import VisualGetToKnowYou
+
+
+def frames(num_sessions: int, dimension: int):
+    rng = np.random.default_rng(0)
+    faces = [Face(rng.random(dimension, dtype=np.float32), None, None) for _ in range(num_sessions)]
+
+    return {session: [(f"id{session}", faces[session])] for session in range(num_sessions)}
+
+
+def run_objects(frame, ticks: int) -> float:
+    """Time spent on frames, utterances are not included."""
+    sessions = {session: VisualGetToKnowYou() for session in frame}
+
+    elapsed = 0
+    for tick in range(ticks):
+        start = time.perf_counter()
+        for session, persons in frame.items():
+            sessions[session].persons_detected(persons)
+        elapsed += time.perf_counter() - start
+        if tick == 10:
+            for g2ky in sessions.values():
+                g2ky.utterance_detected("Thomas")
+                g2ky.utterance_detected("yes")
+
+    return elapsed
+
+
+def run_batch(frame, ticks: int) -> float:
+    """Time spent on frames, utterances are not included."""
+    batch = BatchVisualGetToKnowYou(capacity=len(frame))
+
+    elapsed = 0
+    for tick in range(ticks):
+        start = time.perf_counter()
+        batch.persons_detected(frame)
+        elapsed += time.perf_counter() - start
+        if tick == 10:
+            for session in frame:
+                batch.utterance_detected(session, "Thomas")
+                batch.utterance_detected(session, "yes")
+
+    return elapsed
+
+
+def main(sessions, ticks: int, dimension: int):
+    print(f"{'sessions':>8} {'per object':>14} {'batch':>14} {'speedup':>8}")
+    for num_sessions in sessions:
+        frame = frames(num_sessions, dimension)
+        objects = run_objects(frame, ticks) / (ticks * num_sessions)
+        batch = run_batch(frame, ticks) / (ticks * num_sessions)
+        print(f"{num_sessions:>8} {objects * 1e6:9.2f} us/fr {batch * 1e6:9.2f} us/fr {objects / batch:7.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Per-frame cost of batched G2KY sessions")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--ticks", type=int, default=50)
+    parser.add_argument("--dimension", type=int, default=128)
+    args = parser.parse_args()
+
+    main(args.sessions, args.ticks, args.dimension)
@@ -0,0 +1,55 @@
+"""
+Micro-benchmark of the per-frame cost of the conversation state machine of :class:`VisualGetToKnowYou`.
+
+Run from the repository root with ``python benchmarks/bench_fsm.py``.
+"""
+import argparse
+import timeit
+
+import numpy as np
+from cltl.face_recognition.api import Face
+
+from cltl.g2ky.visual import VisualGetToKnowYou, ConvState
+
+
+FACE = Face(np.empty((0,)), None, None)
+
+
+def known_g2ky() -> VisualGetToKnowYou:
+    g2ky = VisualGetToKnowYou(friends={"id1": "Thomas"})
+    g2ky.persons_detected([("id1", FACE)])
+    assert g2ky.state.conv_state == ConvState.KNOWN
+
+    return g2ky
+
+
+def enrollment(min_gaze_images=None):
+    g2ky = VisualGetToKnowYou(min_gaze_images=min_gaze_images)
+    for _ in range(7 if min_gaze_images is None else min_gaze_images + 2):
+        g2ky.persons_detected([("id1", FACE)])
+    g2ky.utterance_detected("Thomas")
+    g2ky.utterance_detected("yes")
+
+
+def main(number: int, repeat: int):
+    start = VisualGetToKnowYou()
+    known = known_g2ky()
+    cases = {
+        "START, no person": lambda: start.persons_detected([]),
+        "KNOWN, same person": lambda: known.persons_detected([("id1", FACE)]),
+        "enrollment (9 events)": enrollment,
+        "enrollment, early exit": lambda: enrollment(min_gaze_images=2),
+    }
+
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=number, repeat=repeat)) / number
+        print(f"{name:<24} {best * 1e6:8.2f} us/call")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Per-frame cost of the G2KY state machine")
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    main(args.number, args.repeat)
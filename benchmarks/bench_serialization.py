@@ -0,0 +1,65 @@
+"""
+Compare the `cltl-json` and `cltl-binary` serializers on face recognition events.
+
+The `cltl-json` serializer is combined with bzip2 compression as in the default Kombu configuration,
+embeddings have to be sent as lists for JSON.
+
+Run from the repository root with ``python benchmarks/bench_serialization.py``.
+"""
+import argparse
+import bz2
+import json
+import timeit
+from types import SimpleNamespace
+
+import numpy as np
+
+from cltl_service.g2ky.serialization import BinarySerializer, lz4
+
+
+def face_event(faces: int, dimension: int, as_list: bool):
+    mentions = []
+    for i in range(faces):
+        embedding = np.random.rand(dimension).astype(np.float32)
+        face = SimpleNamespace(embedding=embedding.tolist() if as_list else embedding, gender="FEMALE", age=30)
+        segment = SimpleNamespace(type="MultiIndex", container_id="image_id", bounds=[i * 10, 0, i * 10 + 10, 10])
+        annotation = SimpleNamespace(type="Face", value=face, source="face_recognition", timestamp=0)
+        mentions.append(SimpleNamespace(id=f"mention_{i}", segment=[segment], annotations=[annotation]))
+
+    payload = SimpleNamespace(type="AnnotationEvent", mentions=mentions)
+
+    return SimpleNamespace(id="event_id", payload=payload,
+                           metadata=SimpleNamespace(timestamp=0, offset=0, topic="cltl.topic.face_recogntion"))
+
+
+def json_bzip2():
+    encode = lambda x: bz2.compress(json.dumps(x, default=vars).encode("utf-8"))
+    decode = lambda x: json.loads(bz2.decompress(x), object_hook=lambda d: SimpleNamespace(**d))
+
+    return encode, decode
+
+
+def main(faces: int, dimension: int, number: int):
+    serializers = {"cltl-json + bzip2": (json_bzip2(), True)}
+    for codec in ["none", "zlib"] + (["lz4"] if lz4 else []):
+        serializer = BinarySerializer(codec)
+        serializers[f"cltl-binary + {codec}"] = ((serializer.encode, serializer.decode), False)
+
+    print(f"{faces} faces with {dimension} dimensional embeddings")
+    for name, ((encode, decode), as_list) in serializers.items():
+        event = face_event(faces, dimension, as_list)
+        data = encode(event)
+        encode_time = min(timeit.repeat(lambda: encode(event), number=number, repeat=3)) / number
+        decode_time = min(timeit.repeat(lambda: decode(data), number=number, repeat=3)) / number
+        print(f"{name:<22} {len(data):>8} bytes  encode {encode_time * 1e6:9.1f} us  "
+              f"decode {decode_time * 1e6:9.1f} us")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark event serializers")
+    parser.add_argument("--faces", type=int, default=4)
+    parser.add_argument("--dimension", type=int, default=512)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    main(args.faces, args.dimension, args.number)
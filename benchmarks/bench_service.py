@@ -0,0 +1,272 @@
+"""
+End-to-end benchmark of :class:`GetToKnowYouService`.
+
+Drives the service on a :class:`SynchronousEventBus` with a stub :class:`EmissorDataClient` and synthetic
+image, face, id and utterance event streams, and reports throughput, frame-to-response latency, the number of
+frames observed before asking a stranger for their name, and the memory retained per event: the growth of the
+number of allocated blocks (:func:`sys.getallocatedblocks`), and with ``--memory`` the growth and peak of the memory
+traced by :mod:`tracemalloc`. Results can be stored as baseline and checked against it:
+
+    python benchmarks/bench_service.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_service.py --check benchmarks/baseline.json
+
+Baselines are machine specific and are therefore not part of the repository.
+"""
+import argparse
+import dataclasses
+import json
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+import zlib
+from collections import defaultdict
+from typing import List, Dict, Optional
+
+import numpy as np
+from cltl.combot.event.emissor import AnnotationEvent, ImageSignalEvent, TextSignalEvent
+from cltl.combot.infra.event import Event
+from cltl.combot.infra.event.memory import SynchronousEventBus
+from cltl.combot.infra.time_util import timestamp_now
+from cltl.face_recognition.api import Face
+from cltl_service.emissordata.client import EmissorDataClient
+from emissor.representation.scenario import Annotation, ImageSignal, Mention, MultiIndex, TextSignal
+
+from cltl.g2ky.friends import MemoryFriendStore
+from cltl.g2ky.visual import VisualGetToKnowYou
+from cltl_service.g2ky.service import GetToKnowYouService
+from cltl_service.g2ky.session import SessionManager
+
+UTTERANCE_TOPIC = "cltl.topic.text_in"
+IMAGE_TOPIC = "cltl.topic.image"
+FACE_TOPIC = "cltl.topic.face_recognition"
+ID_TOPIC = "cltl.topic.face_id"
+RESPONSE_TOPIC = "cltl.topic.text_out"
+SPEAKER_TOPIC = "cltl.topic.speaker"
+
+DIMENSION = 128
+
+
+@dataclasses.dataclass
+class Scenario:
+    name: str
+    frames: int = 500
+    fps: float = 0
+    faces_per_frame: int = 1
+    friends: int = 100
+    sessions: int = 1
+    known_ratio: float = 0.5
+    min_gaze_images: Optional[int] = None
+
+
+SCENARIOS = [
+    Scenario("single"),
+    Scenario("crowd", faces_per_frame=4),
+    Scenario("registry", friends=10000),
+    Scenario("sessions", sessions=16),
+    Scenario("early_exit", min_gaze_images=2),
+]
+
+
+class StubEmissorClient(EmissorDataClient):
+    def get_current_scenario_id(self):
+        return "scenario"
+
+
+class Driver:
+    """
+    Generates the synthetic event streams and answers the questions of the service.
+    """
+    def __init__(self, scenario: Scenario, event_bus: SynchronousEventBus):
+        self._scenario = scenario
+        self._event_bus = event_bus
+        self._random = random.Random(42)
+        self._embeddings = np.random.default_rng(42).random((64, DIMENSION), dtype=np.float32)
+
+        self._persons = {}
+        self._utterances = defaultdict(list)
+        self._session = None
+        self._start = None
+        self._frames = defaultdict(int)
+        self._gaze_start = {}
+        self.gaze_frames = []
+        self.latencies = []
+        self.responses = 0
+        self.events = 0
+
+        event_bus.subscribe(RESPONSE_TOPIC, self._on_response)
+
+    def step(self, session: str):
+        # Responses are published synchronously while the events of the session are processed
+        self._session = session
+        if self._utterances[session]:
+            self._publish_utterance(session, self._utterances[session].pop(0))
+
+        if session not in self._persons or self._random.random() < 0.01:
+            known = self._random.random() < self._scenario.known_ratio
+            self._persons[session] = (f"friend_{self._random.randrange(self._scenario.friends)}" if known
+                                      else f"stranger_{uuid.uuid4()}")
+
+        self._frames[session] += 1
+        self._publish_frame(session)
+
+    def _publish_frame(self, session: str):
+        image_id = str(uuid.uuid4())
+        self._start = time.perf_counter()
+
+        faces = range(self._scenario.faces_per_frame)
+        ids = [self._persons[session]] + [f"bystander_{i}" for i in faces][1:]
+        bounds = [(i * 20, 0, i * 20 + 20, 20) for i in faces]
+        embeddings = [self._embeddings[zlib.crc32(id.encode()) % len(self._embeddings)] for id in ids]
+
+        image = ImageSignal.for_scenario(session, timestamp_now(), timestamp_now(), None,
+                                         (0, 0, 20 * len(faces), 20), signal_id=image_id)
+        self._publish(IMAGE_TOPIC, ImageSignalEvent.create(image))
+        self._publish(FACE_TOPIC, self._annotations(image_id, bounds,
+                                                    [Face(embedding, None, None) for embedding in embeddings]))
+        self._publish(ID_TOPIC, self._annotations(image_id, bounds, ids))
+
+    def _publish_utterance(self, session: str, text: str):
+        self._start = time.perf_counter()
+        signal = TextSignal.for_scenario(session, timestamp_now(), timestamp_now(), None, text)
+        self._publish(UTTERANCE_TOPIC, TextSignalEvent.for_speaker(signal))
+
+    def _annotations(self, image_id, bounds, values):
+        mentions = [Mention(str(uuid.uuid4()), [MultiIndex(image_id, bound)], [Annotation("", value, "", 0)])
+                    for bound, value in zip(bounds, values)]
+
+        return AnnotationEvent.create(mentions)
+
+    def _publish(self, topic, payload):
+        self.events += 1
+        self._event_bus.publish(topic, Event.for_payload(payload))
+
+    def _on_response(self, event):
+        self.responses += 1
+        self.latencies.append(time.perf_counter() - self._start)
+
+        text = event.payload.signal.text
+        if text.startswith("Hi Stranger"):
+            self._gaze_start[self._session] = self._frames[self._session]
+        elif text.startswith("What is your name"):
+            if self._session in self._gaze_start:
+                self.gaze_frames.append(self._frames[self._session] - self._gaze_start.pop(self._session))
+            self._utterances[self._session].append(f"Name {self._random.randrange(1000)}")
+        elif text.startswith("So your name is"):
+            self._utterances[self._session].append("yes")
+
+
+def create_service(scenario: Scenario, event_bus: SynchronousEventBus) -> GetToKnowYouService:
+    friend_store = MemoryFriendStore({f"friend_{i}": f"Friend {i}" for i in range(scenario.friends)})
+    sessions = SessionManager(lambda: VisualGetToKnowYou(friend_store=friend_store,
+                                                         min_gaze_images=scenario.min_gaze_images),
+                              max_sessions=max(scenario.sessions, 1))
+
+    return GetToKnowYouService(UTTERANCE_TOPIC, IMAGE_TOPIC, FACE_TOPIC, ID_TOPIC, RESPONSE_TOPIC, SPEAKER_TOPIC,
+                               None, None, [], None, StubEmissorClient(), event_bus, None, sessions=sessions)
+
+
+def run(scenario: Scenario, trace_memory: bool = False) -> Dict[str, float]:
+    event_bus = SynchronousEventBus()
+    service = create_service(scenario, event_bus)
+    driver = Driver(scenario, event_bus)
+    session_ids = [f"scenario_{i}" for i in range(scenario.sessions)]
+
+    service.start()
+    try:
+        if trace_memory:
+            tracemalloc.start()
+        blocks = sys.getallocatedblocks()
+        traced = tracemalloc.get_traced_memory()[0] if trace_memory else 0
+        start = time.perf_counter()
+        for frame in range(scenario.frames):
+            for session in session_ids:
+                driver.step(session)
+            if scenario.fps:
+                time.sleep(max(0.0, start + (frame + 1) / scenario.fps - time.perf_counter()))
+        duration = time.perf_counter() - start
+        retained_blocks = sys.getallocatedblocks() - blocks
+        current, peak = tracemalloc.get_traced_memory() if trace_memory else (0, 0)
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+        service.stop()
+
+    latencies = np.array(driver.latencies) if driver.latencies else np.zeros(1)
+
+    return {
+        "events_per_sec": driver.events / duration,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "retained_blocks_per_event": retained_blocks / driver.events,
+        "retained_bytes_per_event": (current - traced) / driver.events,
+        "peak_kib": peak / 1024,
+        "gaze_frames": float(np.mean(driver.gaze_frames)) if driver.gaze_frames else 0.0,
+        "responses": driver.responses,
+    }
+
+
+def check(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        if result["events_per_sec"] < expected["events_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['events_per_sec']:.0f} events/sec, "
+                               f"baseline {expected['events_per_sec']:.0f}")
+        if result["p99_ms"] > expected["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {result['p99_ms']:.3f} ms, baseline {expected['p99_ms']:.3f} ms")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the GetToKnowYouService")
+    parser.add_argument("--scenario", action="append", help="Run only the given scenarios")
+    parser.add_argument("--frames", type=int, help="Frames per session")
+    parser.add_argument("--fps", type=float, help="Frame rate, 0 to replay as fast as possible")
+    parser.add_argument("--faces", type=int, help="Faces per frame")
+    parser.add_argument("--friends", type=int, help="Number of known friends")
+    parser.add_argument("--sessions", type=int, help="Number of concurrent sessions")
+    parser.add_argument("--min-gaze", type=int, help="Minimal number of frames observed for early exit from gaze")
+    parser.add_argument("--memory", action="store_true",
+                        help="Trace retained and peak memory with tracemalloc (slow)")
+    parser.add_argument("--save-baseline", help="Store the results as baseline in the given file")
+    parser.add_argument("--check", help="Fail if results regress past the baseline in the given file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    overrides = {"frames": args.frames, "fps": args.fps, "faces_per_frame": args.faces,
+                 "friends": args.friends, "sessions": args.sessions, "min_gaze_images": args.min_gaze}
+    overrides = {key: value for key, value in overrides.items() if value is not None}
+    scenarios = [dataclasses.replace(scenario, **overrides) for scenario in SCENARIOS
+                 if not args.scenario or scenario.name in args.scenario]
+
+    results = {}
+    for scenario in scenarios:
+        results[scenario.name] = run(scenario, args.memory)
+        result = results[scenario.name]
+        print(f"{scenario.name:<10} {result['events_per_sec']:10.0f} events/s  "
+              f"p50 {result['p50_ms']:7.3f} ms  p99 {result['p99_ms']:7.3f} ms  "
+              f"retained {result['retained_blocks_per_event']:6.2f} blocks/event "
+              f"{result['retained_bytes_per_event']:8.1f} B/event  "
+              f"peak {result['peak_kib']:8.1f} KiB  gaze {result['gaze_frames']:4.1f} frames  "
+              f"responses {result['responses']}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+
+    if args.check:
+        with open(args.check) as baseline_file:
+            regressions = check(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
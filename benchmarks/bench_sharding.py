@@ -0,0 +1,117 @@
+"""
+Throughput of :class:`ShardedGetToKnowYouService` by number of worker processes.
+
+Sessions receive frames with a single face, each session runs a :class:`VisualGetToKnowYou` that re-identifies
+faces against an :class:`EmbeddingIndex` of `--index` embeddings, such that processing is dominated by the
+per-frame similarity search. BLAS is limited to a single thread per process, throughput therefore scales with
+the number of workers up to the number of available cores.
+
+Run from the repository root with ``python benchmarks/bench_sharding.py``.
+"""
+import os
+
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+os.environ.setdefault("MKL_NUM_THREADS", "1")
+
+import argparse
+import functools
+import time
+import uuid
+
+import numpy as np
+from cltl.combot.event.emissor import AnnotationEvent, ImageSignalEvent
+from cltl.combot.infra.event import Event
+from cltl.combot.infra.event.memory import SynchronousEventBus
+from cltl.face_recognition.api import Face
+from cltl_service.emissordata.client import EmissorDataClient
+from emissor.representation.scenario import Annotation, ImageSignal, Mention, MultiIndex
+
+from cltl.g2ky.embedding import EmbeddingIndex
+from cltl.g2ky.visual import VisualGetToKnowYou
+from cltl_service.g2ky.sharding import ShardedGetToKnowYouService
+
+IMAGE_TOPIC = "cltl.topic.image"
+FACE_TOPIC = "cltl.topic.face_recognition"
+ID_TOPIC = "cltl.topic.face_id"
+
+DIMENSION = 128
+
+_index = None
+
+
+class StubEmissorClient(EmissorDataClient):
+    def get_current_scenario_id(self):
+        return "scenario"
+
+
+def create_g2ky(index_size: int) -> VisualGetToKnowYou:
+    # One index per worker process, shared by its sessions
+    global _index
+    if _index is None:
+        _index = EmbeddingIndex(capacity=index_size)
+        embeddings = np.random.default_rng(1).random((index_size, DIMENSION), dtype=np.float32)
+        for idx in range(0, index_size, 1000):
+            _index.add(f"friend_{idx}", embeddings[idx:idx + 1000])
+
+    return VisualGetToKnowYou(embedding_index=_index)
+
+
+def frame_events(session: str, embedding: np.ndarray):
+    image = ImageSignal.for_scenario(session, 0, 0, None, (0, 0, 20, 20))
+    mentions = lambda value: [Mention(str(uuid.uuid4()), [MultiIndex(image.id, (0, 0, 20, 20))],
+                                      [Annotation("", value, "", 0)])]
+
+    return [(IMAGE_TOPIC, ImageSignalEvent.create(image)),
+            (FACE_TOPIC, AnnotationEvent.create(mentions(Face(embedding, None, None)))),
+            (ID_TOPIC, AnnotationEvent.create(mentions(f"stranger_{session}")))]
+
+
+def run(workers: int, sessions: int, frames: int, index_size: int) -> float:
+    event_bus = SynchronousEventBus()
+    service = ShardedGetToKnowYouService(None, IMAGE_TOPIC, FACE_TOPIC, ID_TOPIC, "response", "speaker",
+                                         None, None, [], functools.partial(create_g2ky, index_size),
+                                         StubEmissorClient(), event_bus, workers=workers,
+                                         max_sessions=sessions, interval=60)
+    rng = np.random.default_rng(0)
+    session_ids = [f"scenario_{idx}" for idx in range(sessions)]
+    events = [event for _ in range(frames) for session in session_ids
+              for event in frame_events(session, rng.random(DIMENSION, dtype=np.float32))]
+
+    service.start()
+    try:
+        # Warm up the index in all workers
+        for topic, payload in frame_events("warmup", rng.random(DIMENSION, dtype=np.float32)):
+            event_bus.publish(topic, Event.for_payload(payload))
+        service.flush()
+
+        start = time.perf_counter()
+        for topic, payload in events:
+            event_bus.publish(topic, Event.for_payload(payload))
+        service.flush(timeout=600)
+        duration = time.perf_counter() - start
+    finally:
+        service.stop()
+
+    return len(events) / duration
+
+
+def main(workers, sessions: int, frames: int, index_size: int):
+    print(f"{os.cpu_count()} cores, {sessions} sessions, {frames} frames per session, {index_size} embeddings")
+    print(f"{'workers':>8} {'events/s':>10} {'scaling':>8}")
+    baseline = None
+    for num_workers in workers:
+        throughput = run(num_workers, sessions, frames, index_size)
+        baseline = baseline or throughput
+        print(f"{num_workers:>8} {throughput:10.0f} {throughput / baseline:7.2f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Throughput of sharded G2KY workers")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--index", type=int, default=50000)
+    args = parser.parse_args()
+
+    main(args.workers, args.sessions, args.frames, args.index)
@@ -0,0 +1,149 @@
+"""
+Cold start benchmark of the G2KY service, from interpreter start until the first event is handled.
+
+Each run starts a fresh interpreter that imports the service, creates the component selected by `--mode` from
+``config/default.config`` in the same way as ``src/app.py``, starts the service on a :class:`SynchronousEventBus`
+and publishes a first utterance (verbal) or frame (visual). Reported times are medians over the runs:
+
+* interpreter: until the benchmark process runs,
+* import: importing the service and the component factory,
+* build: creating and starting the service, including the imports of the selected component,
+* first event: publishing the first event until the response is published,
+* total: from spawning the process until the response.
+
+Run from the repository root with ``python benchmarks/bench_startup.py``.
+"""
+import argparse
+import configparser
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config", "default.config")
+
+
+class _Config:
+    def __init__(self, section):
+        self._section = section
+
+    def __contains__(self, key):
+        return key in self._section
+
+    def get(self, key, multi=False):
+        value = self._section[key]
+
+        return [entry.strip() for entry in value.split(",")] if multi else value
+
+    def get_int(self, key):
+        return self._section.getint(key)
+
+    def get_float(self, key):
+        return self._section.getfloat(key)
+
+    def get_boolean(self, key):
+        return self._section.getboolean(key)
+
+
+class FileConfigurationManager:
+    """
+    Configuration from ``config/default.config`` without the environment overrides of the application.
+    """
+    def __init__(self, path: str, overrides=None):
+        self._parser = configparser.ConfigParser()
+        self._parser.read(path)
+        for section, values in (overrides or {}).items():
+            self._parser[section].update(values)
+
+    def get_config(self, name):
+        return _Config(self._parser[name] if self._parser.has_section(name) else {})
+
+
+def child(mode: str, spawned: float):
+    started = time.time()
+
+    start = time.perf_counter()
+    from cltl.combot.event.emissor import AnnotationEvent, ImageSignalEvent, TextSignalEvent
+    from cltl.combot.infra.event import Event
+    from cltl.combot.infra.event.memory import SynchronousEventBus
+    from emissor.representation.scenario import Annotation, ImageSignal, Mention, MultiIndex, TextSignal
+
+    from cltl_service.g2ky.factory import create_g2ky
+    from cltl_service.g2ky.service import GetToKnowYouService
+    imported = time.perf_counter()
+
+    class StubEmissorClient:
+        def get_current_scenario_id(self):
+            return "scenario"
+
+    config_manager = FileConfigurationManager(CONFIG, {"cltl.g2ky": {"implementation": mode}})
+    events = config_manager.get_config("cltl.g2ky.events")
+    event_bus = SynchronousEventBus()
+    responses = []
+    event_bus.subscribe(events.get("topic_response"), lambda event: responses.append(time.perf_counter()))
+
+    service = GetToKnowYouService.from_config(create_g2ky(config_manager), StubEmissorClient(), event_bus, None,
+                                              config_manager)
+    service.start()
+    built = time.perf_counter()
+
+    if mode == "verbal":
+        signal = TextSignal.for_scenario("scenario", 0, 0, None, "Hi")
+        publish = [(events.get("topic_utterance"), TextSignalEvent.for_speaker(signal))]
+    else:
+        from cltl.face_recognition.api import Face
+
+        image = ImageSignal.for_scenario("scenario", 0, 0, None, (0, 0, 20, 20))
+        mentions = lambda value: [Mention("mention", [MultiIndex(image.id, (0, 0, 20, 20))],
+                                          [Annotation("", value, "", 0)])]
+        publish = [(events.get("topic_image"), ImageSignalEvent.create(image)),
+                   (events.get("topic_face"), AnnotationEvent.create(mentions(Face([0.1] * 128, None, None)))),
+                   (events.get("topic_id"), AnnotationEvent.create(mentions("stranger")))]
+
+    published = time.perf_counter()
+    for topic, payload in publish:
+        event_bus.publish(topic, Event.for_payload(payload))
+    service.stop()
+
+    if not responses:
+        raise ValueError(f"No response to the first {mode} event")
+
+    print(json.dumps({"interpreter": started - spawned,
+                      "import": imported - start,
+                      "build": built - imported,
+                      "first event": responses[0] - published,
+                      "total": started - spawned + responses[0] - start}))
+
+
+def run(mode: str, runs: int):
+    results = []
+    for _ in range(runs):
+        spawned = time.time()
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode, str(spawned)],
+                                check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    return {key: statistics.median(result[key] for result in results) for key in results[0]}
+
+
+def main(modes, runs: int):
+    columns = ("interpreter", "import", "build", "first event", "total")
+    print(f"{'mode':>8} " + " ".join(f"{column:>12}" for column in columns))
+    for mode in modes:
+        result = run(mode, runs)
+        print(f"{mode:>8} " + " ".join(f"{result[key] * 1000:9.1f} ms" for key in result))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], float(sys.argv[3]))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Cold start time of the G2KY service")
+    parser.add_argument("--mode", nargs="+", default=["verbal", "visual"], choices=["verbal", "visual"])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    main(args.mode, args.runs)
@@ -18,7 +18,7 @@ setup(
     license='MIT License',
     author='CLTL',
     author_email='t.baier@vu.nl',
-    description='Template component for Leolani',
+    description='Get to know you component for Leolani',
     long_description=long_description,
     long_description_content_type="text/markdown",
     python_requires='>=3.8',
@@ -1,63 +1,95 @@
 import logging.config
 import time
 
-from cltl.template.dummy_demo import DummyDemoProcessor
-
 logging.config.fileConfig('config/logging.config')
 
-import json
-from types import SimpleNamespace
-
 from cltl.combot.infra.config.k8config import K8LocalConfigurationContainer
 from cltl.combot.infra.di_container import singleton
-from cltl.combot.infra.event.kombu import KombuEventBus
-from cltl.combot.infra.event.memory import SynchronousEventBus
 from cltl.combot.infra.resource.threaded import ThreadedResourceContainer
-from cltl_service.template.service import TemplateService
-from kombu.serialization import register
 
 logger = logging.getLogger(__name__)
 
 K8LocalConfigurationContainer.load_configuration()
 
+
+# Modules that are not needed by every deployment, such as the kombu event bus or the visual component,
+# are imported when they are first used to keep the start-up time short.
 class ApplicationContainer(ThreadedResourceContainer, K8LocalConfigurationContainer):
     logger.info("Initialized ApplicationContainer")
 
     @property
     @singleton
     def event_bus(self):
-        config = self.config_manager.get_config("cltl.template.events")
+        config = self.config_manager.get_config("cltl.event")
         if config.get_boolean("local"):
+            from cltl.combot.infra.event.memory import SynchronousEventBus
+
             return SynchronousEventBus()
         else:
-            register('cltl-json',
-                     lambda x: json.dumps(x, default=vars),
-                     lambda x: json.loads(x, object_hook=lambda d: SimpleNamespace(**d)),
-                     content_type='application/json',
-                     content_encoding='utf-8')
-            return KombuEventBus('cltl-json', self.config_manager)
+            from cltl.combot.infra.event.kombu import KombuEventBus
+            from cltl_service.g2ky.serialization import register_serializers, without_kombu_compression
+
+            serialization = self.config_manager.get_config("cltl.g2ky.serialization")
+            compression = serialization.get("compression") if "compression" in serialization else "none"
+            topic_compression = (dict(entry.split(":") for entry in serialization.get("topic_compression", multi=True))
+                                 if "topic_compression" in serialization else None)
+            register_serializers(compression, topic_compression)
+            serializer = serialization.get("serializer") if "serializer" in serialization else "cltl-json"
+            if serializer == "cltl-binary":
+                return KombuEventBus(serializer, without_kombu_compression(self.config_manager))
+
+            return KombuEventBus(serializer, self.config_manager)
+
+    @property
+    @singleton
+    def emissor_client(self):
+        from cltl_service.emissordata.client import EmissorDataClient
+
+        config = self.config_manager.get_config("cltl.emissor-data.client")
+
+        return EmissorDataClient(config.get("endpoint"))
 
     @property
     @singleton
-    def processor(self):
-        config = self.config_manager.get_config("cltl.template")
+    def friends(self):
+        from cltl_service.g2ky.factory import create_friends
 
-        return DummyDemoProcessor(config.get("phrase"))
+        return create_friends(self.config_manager)
+
+    @property
+    @singleton
+    def g2ky(self):
+        from cltl_service.g2ky.factory import create_g2ky
+
+        return create_g2ky(self.config_manager, self.friends)
 
     @property
     @singleton
     def service(self):
-        return TemplateService.from_config(self.processor, self.event_bus, self.resource_manager, self.config_manager)
+        sharding = self.config_manager.get_config("cltl.g2ky.sharding")
+        if "enabled" in sharding and sharding.get_boolean("enabled"):
+            from cltl_service.g2ky.sharding import ShardedGetToKnowYouService
+
+            return ShardedGetToKnowYouService.from_config(self.g2ky, self.emissor_client, self.event_bus,
+                                                          self.config_manager)
+
+        from cltl_service.g2ky.service import GetToKnowYouService
+
+        return GetToKnowYouService.from_config(self.g2ky, self.emissor_client, self.event_bus,
+                                               self.resource_manager, self.config_manager, friends=self.friends)
 
 
 class Application(ApplicationContainer):
     def run(self):
+        start = time.perf_counter()
         self.service.start()
+        logger.info("Started G2KY service in %.0f ms", 1000 * (time.perf_counter() - start))
         try:
             while True:
                 time.sleep(1)
         except KeyboardInterrupt:
             self.service.stop()
+            self.friends.close()
 
 
 if __name__ == '__main__':
@@ -1,16 +1,42 @@
 import abc
-from typing import Optional, Collection, Tuple, Iterable
+import enum
+from typing import Optional, Collection, Tuple, Iterable, FrozenSet, Dict, Any, Mapping, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+    from cltl.face_recognition.api import Face
+
+from cltl.g2ky.fsm import StateRecord
+
+
+class Input(enum.Enum):
+    UTTERANCE = 1
+    FACES = 2
 
-from cltl.face_recognition.api import Face
 
 class GetToKnowYou(abc.ABC):
     """
     Abstract class representing the interface of the component.
     """
+    supported_inputs: FrozenSet[Input] = frozenset(Input)
+    """Inputs the component uses in any of its states."""
+
+    @property
+    def inputs(self) -> FrozenSet[Input]:
+        """
+        Inputs the component needs in its current state, other inputs can be skipped.
+        """
+        return self.supported_inputs
+
     def utterance_detected(self, utterance: str) -> Optional[str]:
         raise NotImplementedError()
 
-    def persons_detected(self, persons: Iterable[Tuple[str, Face]]) -> Optional[str]:
+    def persons_detected(self, persons: Iterable[Tuple[Optional[str], "Face"]]) -> Optional[str]:
+        """
+        Process the persons detected in an image, given as pairs of identifier and face.
+
+        The identifier is ``None`` for faces that could not be identified.
+        """
         raise NotImplementedError()
 
     def response(self) -> Optional[str]:
@@ -20,5 +46,32 @@ class GetToKnowYou(abc.ABC):
     def speaker(self) -> Tuple[str, str]:
         raise NotImplementedError()
 
+    @property
+    def focus(self) -> Optional[Any]:
+        """
+        The bounds of the face of the person the component talked to in the last processed image,
+        ``None`` if unknown.
+        """
+        return None
+
+    @property
+    def state(self) -> StateRecord:
+        raise NotImplementedError()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Snapshot of the conversation state that can be restored with :meth:`restore`.
+        """
+        return self.state.snapshot()
+
+    def restore(self, snapshot: Mapping[str, Any]):
+        self.state.restore(snapshot)
+
+    def add_friend(self, identifier: str, name: str, embeddings: Optional["np.ndarray"] = None):
+        """
+        Make a friend known to the component, e.g. when moving a conversation, with their face embeddings if available.
+        """
+        raise NotImplementedError()
+
     def clear(self):
         raise NotImplementedError()
\ No newline at end of file
@@ -0,0 +1,411 @@
+import logging
+from typing import Optional, Tuple, Mapping, Iterable, Dict, Hashable, List, Any
+
+import numpy as np
+from cltl.face_recognition.api import Face
+
+from cltl.g2ky.embedding import EmbeddingIndex, FacePrototype, mean_similarity
+from cltl.g2ky.friends import FriendStore, MemoryFriendStore
+from cltl.g2ky.fsm import transition_log
+from cltl.g2ky.visual import ConvState, State, _embedding
+
+logger = logging.getLogger(__name__)
+
+
+_START = ConvState.START.value
+_GAZE = ConvState.GAZE.value
+_QUERY = ConvState.QUERY.value
+_CONFIRM = ConvState.CONFIRM.value
+_KNOWN = ConvState.KNOWN.value
+
+# Response codes of a tick, rendered to strings only for the sessions that respond
+_NO_RESPONSE = 0
+_NOBODY = 1
+_MULTIPLE = 2
+_RECOGNIZED = 3
+_STRANGER = 4
+_QUERY_NAME = 5
+
+_NO_ID = -1
+
+
+class BatchVisualGetToKnowYou:
+    """
+    Run the conversations of :class:`VisualGetToKnowYou` for many sessions in a struct-of-arrays layout.
+
+    The conversation state, state count, face identifier and the identifiers observed during GAZE are kept
+    in NumPy arrays with one row per session, and all sessions that received a frame in a tick are advanced
+    with vectorized transitions. Python code only runs per session to collect the input, to render
+    responses and to gather the embeddings of the face prototypes, which are computed in batches.
+
+    The results are the same as for one :class:`VisualGetToKnowYou` per session with frame count based
+    timing and without a face tracker, which are not supported. Identifiers are interned to integer codes
+    for the lifetime of the engine.
+    """
+    def __init__(self, capacity: int = 1024, gaze_images: int = 5, friends: Mapping[str, str] = None,
+                 friend_store: FriendStore = None, embedding_index: EmbeddingIndex = None, max_exemplars: int = 2,
+                 min_gaze_images: int = None, gaze_confidence: float = 0.8, gaze_similarity: float = 0.6):
+        if min_gaze_images is not None and not 0 < min_gaze_images <= gaze_images:
+            raise ValueError(f"min_gaze_images must be between 1 and gaze_images ({gaze_images}), "
+                             f"was {min_gaze_images}")
+
+        self._gaze_images = gaze_images
+        self._min_gaze_images = min_gaze_images
+        self._gaze_confidence = gaze_confidence
+        self._gaze_similarity = gaze_similarity
+        self._max_exemplars = max_exemplars
+        self._embedding_index = embedding_index
+        self._friends = friend_store if friend_store is not None else MemoryFriendStore()
+        for identifier, name in (friends.items() if friends else []):
+            self._friends.add(identifier, name)
+
+        self._codes = {None: _NO_ID}
+        self._identifiers = []
+
+        self._rows = {}
+        self._free = []
+        self._size = 0
+
+        capacity = max(1, capacity)
+        self._conv = np.full(capacity, _START, dtype=np.int8)
+        self._count = np.zeros(capacity, dtype=np.int64)
+        self._face_id = np.full(capacity, _NO_ID, dtype=np.int64)
+        self._name = np.full(capacity, None, dtype=object)
+        self._prototype = np.full(capacity, None, dtype=object)
+        self._gaze_len = np.zeros(capacity, dtype=np.int64)
+        self._gaze_ids = np.full((capacity, gaze_images), _NO_ID, dtype=np.int64)
+        self._gaze_faces = np.full((capacity, gaze_images), None, dtype=object)
+
+    def _grow(self):
+        capacity = 2 * len(self._conv)
+        defaults = {"_conv": _START, "_count": 0, "_face_id": _NO_ID, "_name": None, "_prototype": None,
+                    "_gaze_len": 0, "_gaze_ids": _NO_ID, "_gaze_faces": None}
+        for field, default in defaults.items():
+            array = getattr(self, field)
+            grown = np.full((capacity,) + array.shape[1:], default, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, field, grown)
+
+    @property
+    def sessions(self) -> List[Hashable]:
+        return list(self._rows)
+
+    def add_session(self, session_id: Hashable) -> int:
+        row = self._rows.get(session_id)
+        if row is not None:
+            return row
+
+        if self._free:
+            row = self._free.pop()
+        else:
+            if self._size == len(self._conv):
+                self._grow()
+            row = self._size
+            self._size += 1
+
+        # Rows are in their initial state when allocated or released
+        self._rows[session_id] = row
+
+        return row
+
+    def remove_session(self, session_id: Hashable):
+        row = self._rows.pop(session_id, None)
+        if row is not None:
+            self._conv[row] = _START
+            self._count[row] = 0
+            self._reset(np.asarray([row]))
+            self._free.append(row)
+
+    def conv_state(self, session_id: Hashable) -> ConvState:
+        return ConvState(int(self._conv[self._rows[session_id]]))
+
+    def speaker(self, session_id: Hashable) -> Tuple[Optional[str], Optional[str]]:
+        row = self._rows[session_id]
+        if self._conv[row] != _KNOWN:
+            return None, None
+
+        return self._identifier(self._face_id[row]), self._name[row]
+
+    def state(self, session_id: Hashable) -> State:
+        """
+        The state of a session as it would be held by :class:`VisualGetToKnowYou`.
+        """
+        row = self._rows[session_id]
+        length = self._gaze_len[row]
+        faces = [(self._identifier(code), face)
+                 for code, face in zip(self._gaze_ids[row, :length], self._gaze_faces[row, :length])]
+        votes = {}
+        for identifier, _ in faces:
+            votes[identifier] = votes.get(identifier, 0) + 1
+
+        return State(self._identifier(self._face_id[row]), self._name[row], ConvState(int(self._conv[row])),
+                     faces, int(self._count[row]), self._prototype[row], votes)
+
+    def snapshot(self, session_id: Hashable) -> Dict[str, Any]:
+        return self.state(session_id).snapshot()
+
+    def restore(self, session_id: Hashable, snapshot: Mapping[str, Any]):
+        state = State(None, None, ConvState.START, [], 0).restore(snapshot)
+
+        row = self.add_session(session_id)
+        self._reset(np.asarray([row]))
+        self._conv[row] = state.conv_state.value
+        self._count[row] = state.state_count
+        self._face_id[row] = self._code(state.face_id)
+        self._name[row] = state.name
+        self._prototype[row] = state.prototype
+        for identifier, face in state.faces[:self._gaze_images]:
+            self._gaze_ids[row, self._gaze_len[row]] = self._code(identifier)
+            self._gaze_faces[row, self._gaze_len[row]] = face
+            self._gaze_len[row] += 1
+
+    def persons_detected(self, frames: Mapping[Hashable, Iterable[Tuple[Optional[str], Face]]]) \
+            -> Dict[Hashable, Optional[str]]:
+        """
+        Process one frame for each of the given sessions, new sessions are added on their first frame.
+
+        Returns the response per session, ``None`` for sessions without response.
+        """
+        session_ids = list(frames)
+        persons = [frame if type(frame) is list else list(frame) for frame in frames.values()]
+        if self._embedding_index is not None and len(self._embedding_index):
+            persons = self._reidentify(persons)
+
+        rows = list(map(self._rows.get, session_ids))
+        if None in rows:
+            rows = [row if row is not None else self.add_session(session_id)
+                    for session_id, row in zip(session_ids, rows)]
+        rows = np.array(rows, dtype=np.int64)
+        num_persons = np.fromiter(map(len, persons), dtype=np.int64, count=len(persons))
+
+        identifiers = [frame[0][0] if len(frame) == 1 else None for frame in persons]
+        codes = list(map(self._codes.get, identifiers))
+        if None in codes:
+            codes = [code if code is not None else self._code(identifier)
+                     for identifier, code in zip(identifiers, codes)]
+        codes = np.array(codes, dtype=np.int64)
+
+        previous = self._conv[rows]
+        conv = previous.copy()
+        count = self._count[rows]
+        face_id = self._face_id[rows]
+        response = np.full(len(rows), _NO_RESPONSE, dtype=np.int8)
+
+        nobody = num_persons == 0
+        single = num_persons == 1
+        multiple = num_persons > 1
+        start = conv == _START
+        gaze = conv == _GAZE
+        known = conv == _KNOWN
+
+        # Sessions that keep their state and count the frame
+        stay = nobody | multiple | (single & known)
+
+        response[nobody & start & (count % 10 == 0)] = _NOBODY
+        absent = nobody & (gaze | known) & (count % 10 != 0)
+        response[multiple & (count % 3 == 2)] = _MULTIPLE
+        changed = single & known & (codes != _NO_ID) & (codes != face_id) & (count > 2)
+        to_start = absent | changed
+        stay &= ~to_start
+
+        conv[to_start] = _START
+        self._reset(rows[to_start])
+
+        greet = np.flatnonzero(single & start)
+        if len(greet):
+            names = [self._friends.get(self._identifier(code)) for code in codes[greet]]
+            recognized = np.fromiter((name is not None for name in names), dtype=bool, count=len(names))
+            conv[greet] = np.where(recognized, _KNOWN, _GAZE)
+            response[greet] = np.where(recognized, _RECOGNIZED, _STRANGER)
+            for idx, name in zip(greet[recognized], (name for name in names if name is not None)):
+                self._face_id[rows[idx]] = codes[idx]
+                self._name[rows[idx]] = name
+
+        observe = np.flatnonzero(single & gaze & (codes != _NO_ID))
+        if len(observe):
+            observed = rows[observe]
+            positions = self._gaze_len[observed]
+            self._gaze_ids[observed, positions] = codes[observe]
+            faces = np.empty(len(observe), dtype=object)
+            faces[:] = [persons[idx][0][1] for idx in observe]
+            self._gaze_faces[observed, positions] = faces
+            self._gaze_len[observed] += 1
+
+            done = self._gaze_len[observed] >= self._gaze_images
+            if self._min_gaze_images is not None:
+                done |= self._confident(observed)
+            memorized = observe[done]
+            if len(memorized):
+                self._memorize(rows[memorized])
+            conv[memorized] = _QUERY
+            response[memorized] = _QUERY_NAME
+
+        transitioned = conv != previous
+        count = np.where(transitioned, 0, np.where(stay, count + 1, count))
+        self._conv[rows] = conv
+        self._count[rows] = count
+
+        if transition_log.enabled:
+            for idx in np.flatnonzero(transitioned):
+                transition_log.record(ConvState(int(previous[idx])), ConvState(int(conv[idx])))
+
+        responses = dict.fromkeys(session_ids)
+        for idx in np.flatnonzero(response):
+            responses[session_ids[idx]] = self._render(int(response[idx]), rows[idx])
+
+        return responses
+
+    def utterance_detected(self, session_id: Hashable, utterance: str) -> Optional[str]:
+        row = self.add_session(session_id)
+        conv = self._conv[row]
+
+        response = None
+        if conv == _START:
+            response = "Hi, I can't see you.." if self._count[row] == 0 else "Sorry, I still can't see you.."
+            self._count[row] += 1
+        elif conv == _GAZE:
+            response = "One more second, stranger, I'm memorizing your face."
+            self._count[row] += 1
+        elif conv == _QUERY:
+            name = " ".join([foo.title() for foo in utterance.strip().split()])
+            response = f"So your name is {name}?"
+            self._name[row] = name
+            self._transition(row, ConvState.CONFIRM)
+        elif conv == _CONFIRM:
+            name = self._name[row]
+            if "yes" in utterance.strip().lower():
+                face_id = self._identifier(self._face_id[row])
+                self._friends.add(face_id, name)
+                if self._embedding_index is not None and self._prototype[row] is not None:
+                    self._embedding_index.add(face_id, self._prototype[row].embeddings)
+                response = f"Nice to meet you, {name}!"
+                self._transition(row, ConvState.KNOWN)
+            else:
+                response = "Can you please repeat and only say your name!"
+                self._transition(row, ConvState.QUERY)
+
+        return response
+
+    def response(self, session_id: Hashable) -> Optional[str]:
+        return None
+
+    def clear(self, session_id: Hashable):
+        row = self._rows[session_id]
+        if ConvState.START not in ConvState(int(self._conv[row])).transitions():
+            raise ValueError(f"Cannot change state from {ConvState(int(self._conv[row]))} to {ConvState.START}")
+        self._reset(np.asarray([row]))
+        self._transition(row, ConvState.START)
+
+    def _transition(self, row: int, conv_state: ConvState):
+        previous = ConvState(int(self._conv[row]))
+        self._conv[row] = conv_state.value
+        self._count[row] = 0
+        if transition_log.enabled:
+            transition_log.record(previous, conv_state)
+
+    def _reset(self, rows: np.ndarray):
+        self._face_id[rows] = _NO_ID
+        self._name[rows] = None
+        self._prototype[rows] = None
+        self._gaze_len[rows] = 0
+        self._gaze_ids[rows] = _NO_ID
+        self._gaze_faces[rows] = None
+
+    def _confident(self, rows: np.ndarray) -> np.ndarray:
+        lengths = self._gaze_len[rows]
+        confident = lengths >= self._min_gaze_images
+        candidates = np.flatnonzero(confident)
+        if not len(candidates):
+            return confident
+
+        winners, votes = self._winners(rows[candidates])
+        confident[candidates] = votes >= self._gaze_confidence * lengths[candidates]
+
+        for idx, winner in zip(candidates, winners):
+            if confident[idx]:
+                embeddings = [embedding for embedding in self._winner_embeddings(rows[idx], winner) if embedding.size]
+                confident[idx] = mean_similarity(embeddings) >= self._gaze_similarity
+
+        return confident
+
+    def _winners(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The most frequent identifier observed during GAZE and its number of votes per row.
+
+        Ties are resolved by the first observation, as for the vote dictionary of VisualGetToKnowYou.
+        """
+        ids = self._gaze_ids[rows]
+        votes = (ids[:, :, None] == ids[:, None, :]).sum(axis=2)
+        votes[ids == _NO_ID] = 0
+        first = np.argmax(votes, axis=1)
+        batch = np.arange(len(rows))
+
+        return ids[batch, first], votes[batch, first]
+
+    def _winner_embeddings(self, row: int, winner: int) -> List[np.ndarray]:
+        length = self._gaze_len[row]
+        faces = self._gaze_faces[row, :length][self._gaze_ids[row, :length] == winner]
+
+        return [_embedding(face) for face in faces]
+
+    def _memorize(self, rows: np.ndarray):
+        winners, _ = self._winners(rows)
+        self._face_id[rows] = winners
+
+        # Compute the prototypes in batches of rows with the same number and dimension of embeddings
+        batches = {}
+        for row, winner in zip(rows, winners):
+            embeddings = [embedding for embedding in self._winner_embeddings(row, winner) if embedding.size]
+            shapes = {embedding.shape for embedding in embeddings}
+            if len(shapes) == 1:
+                batches.setdefault((len(embeddings),) + shapes.pop(), []).append((row, embeddings))
+            else:
+                self._prototype[row] = None
+        for entries in batches.values():
+            prototypes = FacePrototype.from_batch(np.stack([np.stack(embeddings) for _, embeddings in entries]),
+                                                  max_exemplars=self._max_exemplars)
+            for (row, _), prototype in zip(entries, prototypes):
+                self._prototype[row] = prototype
+
+        self._gaze_len[rows] = 0
+        self._gaze_ids[rows] = _NO_ID
+        self._gaze_faces[rows] = None
+        logger.debug("Memorized faces for %s sessions", len(rows))
+
+    def _render(self, response: int, row: int) -> str:
+        if response == _NOBODY:
+            return "Hi, anyone there? I can't see anyone.."
+        if response == _MULTIPLE:
+            return "Hi there! Apologizes, but I will only talk to one of you at a time.."
+        if response == _RECOGNIZED:
+            return f"Nice to meet you again {self._name[row]}!"
+        if response == _STRANGER:
+            return "Hi Stranger! We haven't met, let me look at your face!"
+        if response == _QUERY_NAME:
+            return "What is your name, stranger?"
+
+        raise ValueError(f"Unknown response {response}")
+
+    def _reidentify(self, persons: List[List[Tuple[Optional[str], Face]]]) \
+            -> List[List[Tuple[Optional[str], Face]]]:
+        flat = [person for frame in persons for person in frame]
+        if not flat:
+            return persons
+
+        matches = iter(self._embedding_index.query([_embedding(face) for _, face in flat]))
+
+        return [[(match if match and self._friends.get(identifier) is None else identifier, face)
+                 for (identifier, face), (match, _) in zip(frame, matches)]
+                for frame in persons]
+
+    def _code(self, identifier: Optional[str]) -> int:
+        code = self._codes.get(identifier)
+        if code is None:
+            code = len(self._identifiers)
+            self._codes[identifier] = code
+            self._identifiers.append(identifier)
+
+        return code
+
+    def _identifier(self, code: int) -> Optional[str]:
+        return self._identifiers[code] if code != _NO_ID else None
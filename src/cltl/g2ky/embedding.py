@@ -0,0 +1,245 @@
+import dataclasses
+import logging
+import threading
+from typing import Optional, List, Tuple, Iterable
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(embeddings: np.ndarray) -> np.ndarray:
+    embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+
+    return embeddings / norms
+
+
+def mean_similarity(embeddings: List[np.ndarray]) -> float:
+    """
+    Mean pairwise cosine similarity of the embeddings, ``1`` if there are less than two embeddings.
+    """
+    if len(embeddings) < 2:
+        return 1.0
+    if len({embedding.shape for embedding in embeddings}) > 1:
+        return 0.0
+
+    normalized = normalize(np.stack(embeddings))
+    similarities = normalized @ normalized.T
+    count = len(normalized)
+
+    return float((similarities.sum() - np.trace(similarities)) / (count * (count - 1)))
+
+
+@dataclasses.dataclass
+class FacePrototype:
+    """
+    Compact representation of the face of a person.
+
+    The first row of ``embeddings`` is the normalized mean of the observed embeddings, the remaining rows
+    are a bounded set of diverse, normalized exemplars.
+    """
+    embeddings: np.ndarray
+
+    @property
+    def mean(self) -> np.ndarray:
+        return self.embeddings[0]
+
+    @property
+    def exemplars(self) -> np.ndarray:
+        return self.embeddings[1:]
+
+    @classmethod
+    def from_embeddings(cls, embeddings: Iterable[np.ndarray], max_exemplars: int = 2) -> Optional["FacePrototype"]:
+        embeddings = [np.asarray(embedding, dtype=np.float32).ravel() for embedding in embeddings]
+        embeddings = [embedding for embedding in embeddings if embedding.size]
+        if not embeddings or len({embedding.shape for embedding in embeddings}) > 1:
+            return None
+
+        return cls.from_batch(np.stack(embeddings)[None], max_exemplars=max_exemplars)[0]
+
+    @classmethod
+    def from_batch(cls, embeddings: np.ndarray, max_exemplars: int = 2) -> List[Optional["FacePrototype"]]:
+        """
+        Prototypes for a batch of ``(count, embeddings, dimension)`` embeddings.
+
+        The mean is the normalized mean of the normalized embeddings, exemplars are selected by farthest
+        point selection starting from the embedding closest to the mean.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if not embeddings.size:
+            return [None] * len(embeddings)
+
+        norms = np.sqrt((embeddings * embeddings).sum(axis=2, keepdims=True))
+        norms[norms == 0] = 1
+        normalized = embeddings / norms
+        mean = normalized.mean(axis=1)
+        mean_norms = np.sqrt((mean * mean).sum(axis=1, keepdims=True))
+        mean_norms[mean_norms == 0] = 1
+        mean = mean / mean_norms
+
+        batch = np.arange(len(normalized))
+        num_exemplars = min(max_exemplars, normalized.shape[1])
+        selected = np.empty((len(normalized), num_exemplars), dtype=np.int64)
+        active = np.ones(len(normalized), dtype=bool)
+        lengths = np.zeros(len(normalized), dtype=np.int64)
+        if num_exemplars:
+            selected[:, 0] = np.argmax(_similarities(normalized, mean), axis=1)
+            lengths[:] = 1
+            max_similarity = _similarities(normalized, normalized[batch, selected[:, 0]])
+        for position in range(1, num_exemplars):
+            candidate = np.argmin(max_similarity, axis=1)
+            active &= ~(selected[:, :position] == candidate[:, None]).any(axis=1)
+            selected[active, position] = candidate[active]
+            lengths[active] += 1
+            max_similarity = np.maximum(max_similarity, _similarities(normalized, normalized[batch, candidate]))
+
+        return [cls(np.concatenate([mean[idx:idx + 1], normalized[idx, selected[idx, :length]]]))
+                for idx, length in enumerate(lengths)]
+
+
+def _similarities(embeddings: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    return np.matmul(embeddings, targets[:, :, None])[:, :, 0]
+
+
+class EmbeddingIndex:
+    """
+    Nearest neighbour index over the face embeddings of known friends.
+
+    Embeddings are normalized on insertion and kept in a contiguous float32 matrix. Next to it the index keeps
+    the normalized mean of the embeddings of each identifier, i.e. the mean of its prototypes. A query first
+    compares all faces in a frame to the means in a single matrix product, and then compares each face to the
+    embeddings of the `candidates` most similar identifiers only. If identifiers have about as many embeddings
+    as means, or `candidates` is ``None``, faces are compared to all embeddings.
+    A face is matched to the identifier of its most similar embedding if the similarity exceeds
+    the configured threshold.
+    """
+    def __init__(self, threshold: float = 0.6, capacity: int = 1024, candidates: Optional[int] = 8):
+        self._threshold = threshold
+        self._capacity = capacity
+        self._candidates = candidates
+
+        self._matrix = None
+        self._ids = []
+        self._size = 0
+
+        self._sums = None
+        self._means = None
+        self._labels = {}
+        self._identifiers = []
+        self._rows = []
+
+        self._lock = threading.Lock()
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return self._matrix.shape[1] if self._matrix is not None else None
+
+    @property
+    def threshold(self) -> float:
+        return self._threshold
+
+    def add(self, identifier: str, embeddings: np.ndarray):
+        """
+        Add one or more embeddings for the given identifier.
+        """
+        embeddings = normalize(embeddings)
+        if embeddings.size == 0:
+            return
+
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.empty((self._capacity, embeddings.shape[1]), dtype=np.float32)
+                self._sums = np.empty((self._capacity, embeddings.shape[1]), dtype=np.float32)
+                self._means = np.empty((self._capacity, embeddings.shape[1]), dtype=np.float32)
+            elif embeddings.shape[1] != self._matrix.shape[1]:
+                raise ValueError(f"Expected embeddings of dimension {self._matrix.shape[1]}, "
+                                 f"was {embeddings.shape[1]}")
+
+            required = self._size + len(embeddings)
+            self._matrix = _reserve(self._matrix, self._size, required)
+            self._matrix[self._size:required] = embeddings
+            self._ids.extend([identifier] * len(embeddings))
+
+            label = self._labels.get(identifier)
+            if label is None:
+                label = len(self._identifiers)
+                self._sums = _reserve(self._sums, label, label + 1)
+                self._means = _reserve(self._means, label, label + 1)
+                self._sums[label] = 0
+                self._labels[identifier] = label
+                self._identifiers.append(identifier)
+                self._rows.append([])
+            self._sums[label] += embeddings.sum(axis=0)
+            self._means[label] = normalize(self._sums[label])[0]
+            self._rows[label].extend(range(self._size, required))
+
+            self._size = required
+
+    def query(self, embeddings: Iterable[np.ndarray]) -> List[Tuple[Optional[str], float]]:
+        """
+        Match a batch of embeddings against the index.
+
+        Returns the identifier of the best match and its similarity for each embedding, where the identifier
+        is ``None`` if the best match is below the threshold or the embedding cannot be compared.
+        """
+        embeddings = [np.asarray(embedding, dtype=np.float32).ravel() for embedding in embeddings]
+        result = [(None, 0.0)] * len(embeddings)
+
+        with self._lock:
+            if not self._size:
+                return result
+
+            valid = [idx for idx, embedding in enumerate(embeddings) if embedding.shape[0] == self._matrix.shape[1]]
+            if not valid:
+                return result
+
+            queries = normalize(np.stack([embeddings[idx] for idx in valid]))
+            if self._candidates is None or 2 * len(self._identifiers) > self._size:
+                matches = self._query_all(queries)
+            else:
+                matches = self._query_candidates(queries)
+
+            for idx, (match, score) in zip(valid, matches):
+                result[idx] = (self._ids[match] if score >= self._threshold else None, score)
+
+        return result
+
+    def _query_all(self, queries: np.ndarray) -> List[Tuple[int, float]]:
+        # (size x k) orientation keeps the large matrix in row-major order for BLAS
+        similarities = self._matrix[:self._size] @ queries.T
+        best = np.argmax(similarities, axis=0)
+        scores = similarities[best, np.arange(len(queries))]
+
+        return [(int(match), float(score)) for match, score in zip(best, scores)]
+
+    def _query_candidates(self, queries: np.ndarray) -> List[Tuple[int, float]]:
+        count = len(self._identifiers)
+        similarities = self._means[:count] @ queries.T
+        if self._candidates < count:
+            candidates = np.argpartition(-similarities, self._candidates - 1, axis=0)[:self._candidates]
+        else:
+            candidates = np.broadcast_to(np.arange(count)[:, None], similarities.shape)
+
+        matches = []
+        for query, labels in zip(queries, candidates.T):
+            rows = [row for label in labels for row in self._rows[label]]
+            scores = self._matrix[rows] @ query
+            best = int(np.argmax(scores))
+            matches.append((rows[best], float(scores[best])))
+
+        return matches
+
+    def __len__(self) -> int:
+        return self._size
+
+
+def _reserve(matrix: np.ndarray, size: int, required: int) -> np.ndarray:
+    if required <= len(matrix):
+        return matrix
+
+    grown = np.empty((max(required, 2 * len(matrix)), matrix.shape[1]), dtype=matrix.dtype)
+    grown[:size] = matrix[:size]
+
+    return grown
@@ -0,0 +1,188 @@
+import abc
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional, Mapping, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class FriendStore(abc.ABC):
+    """
+    Registry of the friends known to G2KY, mapping identifiers to names.
+    """
+    def get(self, identifier: str) -> Optional[str]:
+        """
+        Lookup the name of the friend with the given identifier.
+        """
+        raise NotImplementedError()
+
+    def find(self, name: str) -> Optional[str]:
+        """
+        Lookup the identifier of a friend with the given name.
+        """
+        raise NotImplementedError()
+
+    def add(self, identifier: str, name: str):
+        raise NotImplementedError()
+
+    def items(self) -> Iterable[Tuple[str, str]]:
+        raise NotImplementedError()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __contains__(self, identifier: str) -> bool:
+        return self.get(identifier) is not None
+
+    def __len__(self) -> int:
+        raise NotImplementedError()
+
+
+class MemoryFriendStore(FriendStore):
+    def __init__(self, friends: Mapping[str, str] = None):
+        self._names = dict(friends) if friends else dict()
+        self._ids = {name: identifier for identifier, name in self._names.items()}
+
+    def get(self, identifier: str) -> Optional[str]:
+        return self._names.get(identifier)
+
+    def find(self, name: str) -> Optional[str]:
+        return self._ids.get(name)
+
+    def add(self, identifier: str, name: str):
+        self._names[identifier] = name
+        self._ids[name] = identifier
+
+    def items(self) -> Iterable[Tuple[str, str]]:
+        return list(self._names.items())
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+_MISSING = object()
+
+
+class _LruCache:
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        value = self._entries.get(key, _MISSING)
+        if value is not _MISSING:
+            self._entries.move_to_end(key)
+
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+
+class SQLiteFriendStore(FriendStore):
+    """
+    FriendStore backed by a SQLite database with an in-memory LRU cache in front of it.
+
+    Records are only read from the database on demand, using the indices on identifier and name,
+    so startup time does not depend on the size of the registry. Only found records are cached, such that
+    friends added to the database by another process are found. New friends are written behind
+    in batches, either when ``batch_size`` friends are pending or after ``flush_interval`` seconds.
+    """
+    def __init__(self, path: str, batch_size: int = 64, flush_interval: Optional[float] = 1.0,
+                 cache_size: int = 4096):
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS friends (id TEXT PRIMARY KEY, name TEXT NOT NULL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS friends_name ON friends (name)")
+
+        self._names = _LruCache(cache_size)
+        self._ids = _LruCache(cache_size)
+        self._pending = OrderedDict()
+
+        self._stopped = threading.Event()
+        self._writer = None
+        if flush_interval:
+            self._writer = threading.Thread(target=self._write_behind, name=self.__class__.__name__, daemon=True)
+            self._writer.start()
+
+    def get(self, identifier: str) -> Optional[str]:
+        with self._lock:
+            name = self._names.get(identifier)
+            if name is _MISSING:
+                row = self._connection.execute("SELECT name FROM friends WHERE id = ?", (identifier,)).fetchone()
+                if row is None:
+                    return None
+                name = row[0]
+                self._names.put(identifier, name)
+
+            return name
+
+    def find(self, name: str) -> Optional[str]:
+        with self._lock:
+            identifier = self._ids.get(name)
+            if identifier is _MISSING:
+                row = self._connection.execute("SELECT id FROM friends WHERE name = ? LIMIT 1", (name,)).fetchone()
+                if row is None:
+                    return None
+                identifier = row[0]
+                self._ids.put(name, identifier)
+
+            return identifier
+
+    def add(self, identifier: str, name: str):
+        with self._lock:
+            self._names.put(identifier, name)
+            self._ids.put(name, identifier)
+            self._pending[identifier] = name
+
+            if len(self._pending) >= self._batch_size:
+                self.flush()
+
+    def items(self) -> Iterable[Tuple[str, str]]:
+        with self._lock:
+            self.flush()
+            return self._connection.execute("SELECT id, name FROM friends").fetchall()
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+
+            with self._connection:
+                self._connection.executemany("INSERT OR REPLACE INTO friends (id, name) VALUES (?, ?)",
+                                             self._pending.items())
+            logger.debug("Stored %s friends", len(self._pending))
+            self._pending.clear()
+
+    def close(self):
+        self._stopped.set()
+        if self._writer:
+            self._writer.join()
+
+        with self._lock:
+            self.flush()
+            self._connection.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self.flush()
+            return self._connection.execute("SELECT COUNT(*) FROM friends").fetchone()[0]
+
+    def _write_behind(self):
+        while not self._stopped.wait(self._flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to store friends")
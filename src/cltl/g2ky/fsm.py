@@ -0,0 +1,125 @@
+import enum
+import logging
+import time
+from collections import deque
+from typing import Mapping, Iterable, FrozenSet, Dict, Callable, List, Tuple, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+
+def transition_table(allowed: Mapping[enum.Enum, Iterable[enum.Enum]]) -> Dict[enum.Enum, FrozenSet[enum.Enum]]:
+    """
+    Precompute the allowed transitions of a conversation state enum.
+    """
+    return {state: frozenset(targets) for state, targets in allowed.items()}
+
+
+class TransitionLog:
+    """
+    Optional log of state transitions.
+
+    When disabled, recording a transition is a single attribute check. When enabled, transitions are kept
+    in a bounded buffer as ``(timestamp, from_state, to_state)`` and passed to the registered listeners.
+    """
+    def __init__(self, enabled: bool = False, max_size: int = 1024):
+        self.enabled = enabled
+        self._entries = deque(maxlen=max_size)
+        self._listeners = []
+
+    def add_listener(self, listener: Callable[[enum.Enum, enum.Enum], None]):
+        self._listeners.append(listener)
+        self.enabled = True
+
+    def remove_listener(self, listener: Callable[[enum.Enum, enum.Enum], None]):
+        self._listeners.remove(listener)
+
+    @property
+    def entries(self) -> List[Tuple[float, enum.Enum, enum.Enum]]:
+        return list(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+
+    def record(self, from_state: enum.Enum, to_state: enum.Enum):
+        self._entries.append((time.time(), from_state, to_state))
+        logger.debug("Transition from conversation state %s to %s", from_state, to_state)
+        for listener in self._listeners:
+            listener(from_state, to_state)
+
+
+transition_log = TransitionLog()
+
+
+class StateRecord:
+    """
+    Mutable conversation state, updated in place on transitions.
+
+    Subclasses declare their fields in ``__slots__`` and provide the initial values of all fields
+    in :meth:`_reset`, which is applied when entering the ``initial`` conversation state.
+    """
+    __slots__ = ("conv_state",)
+
+    initial = None
+
+    def __init__(self, conv_state: Optional[enum.Enum]):
+        self.conv_state = conv_state
+
+    def transition(self, conv_state: enum.Enum, **kwargs):
+        if conv_state not in self.conv_state.transitions():
+            raise ValueError(f"Cannot change state from {self.conv_state} to {conv_state}")
+
+        previous = self.conv_state
+        if conv_state is self.initial:
+            self._reset()
+        self._update(kwargs)
+        self.conv_state = conv_state
+
+        if transition_log.enabled:
+            transition_log.record(previous, conv_state)
+
+        return self
+
+    def stay(self, **kwargs):
+        if kwargs:
+            self._update(kwargs)
+
+        return self
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        The fields of the state as plain values, with the conversation state by name.
+        """
+        values = {field: getattr(self, field) for field in self._fields()}
+        values["conv_state"] = self.conv_state.name
+
+        return values
+
+    def restore(self, values: Mapping[str, Any]):
+        """
+        Restore the state from a :meth:`snapshot`, fields missing in the snapshot get their initial value.
+        """
+        self._reset()
+        fields = set(self._fields())
+        self._update({key: value for key, value in values.items() if key in fields and key != "conv_state"})
+        self.conv_state = type(self.conv_state)[values["conv_state"]]
+
+        return self
+
+    def _reset(self):
+        raise NotImplementedError()
+
+    def _update(self, kwargs):
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    def _fields(self) -> Iterable[str]:
+        return (slot for cls in reversed(type(self).__mro__) for slot in getattr(cls, "__slots__", ()))
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, field) == getattr(other, field)
+                                                 for field in self._fields())
+
+    def __repr__(self):
+        fields = ", ".join(f"{field}={getattr(self, field)!r}" for field in self._fields())
+
+        return f"{type(self).__name__}({fields})"
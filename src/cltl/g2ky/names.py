@@ -0,0 +1,155 @@
+import logging
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from typing import Callable, Optional, List, Tuple, Iterable, Collection, FrozenSet
+
+logger = logging.getLogger(__name__)
+
+
+_NON_ALPHANUMERIC = re.compile(r"[^\w\s]|_")
+_WHITESPACE = re.compile(r"\s+")
+_SILENT_H = re.compile(r"(?<=\w)h")
+_REPEATED = re.compile(r"(\w)\1+")
+
+
+def normalize_name(name: str) -> str:
+    """
+    Normalize a name for matching: strip accents and punctuation, lower case and collapse whitespace.
+    """
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char))
+    name = _NON_ALPHANUMERIC.sub(" ", name.lower())
+
+    return _WHITESPACE.sub(" ", name).strip()
+
+
+def phonetic_key(normalized: str) -> str:
+    """
+    Coarse phonetic key of a normalized name, e.g. to match "Jon" with "John" or "Ana" with "Anna".
+    """
+    key = _SILENT_H.sub("", normalized.replace("ph", "f"))
+
+    return _REPEATED.sub(r"\1", key)
+
+
+def trigrams(key: str) -> FrozenSet[str]:
+    padded = f"  {key} "
+
+    return frozenset(padded[idx:idx + 3] for idx in range(len(padded) - 2))
+
+
+class NameIndex:
+    """
+    Approximate lookup of identifiers by name.
+
+    Names are normalized with :func:`normalize_name` and indexed in an inverted index of the character
+    trigrams of their :func:`phonetic_key`. Names with the same phonetic key are found with a single lookup,
+    other matches are scored by the Dice coefficient of their trigram sets.
+    As a match above the threshold must share a minimal number of trigrams with the query, candidates are
+    only collected from the postings of the rarest query trigrams.
+
+    If a `loader` is given, e.g. :meth:`FriendStore.items`, the names it returns are indexed on the first search
+    instead of on creation. This reads all names once, when the first name is looked up, names added before
+    are kept.
+    """
+    def __init__(self, names: Iterable[Tuple[str, str]] = (), threshold: float = 0.5,
+                 loader: Callable[[], Iterable[Tuple[str, str]]] = None):
+        self._threshold = threshold
+        self._loader = loader
+
+        self._names = {}
+        self._exact = defaultdict(set)
+        self._postings = defaultdict(set)
+        self._lock = threading.Lock()
+
+        for identifier, name in names:
+            self.add(identifier, name)
+
+    def add(self, identifier: str, name: str):
+        with self._lock:
+            self._add(identifier, name)
+
+    def remove(self, identifier: str):
+        with self._lock:
+            if identifier in self._names:
+                self._remove(identifier)
+
+    def search(self, name: str, limit: int = 1, exclude: Collection[str] = ()) -> List[Tuple[str, float]]:
+        """
+        Identifiers with a name similar to the given name, best match first.
+
+        Only matches with a similarity of at least the configured threshold are returned.
+        """
+        normalized = normalize_name(name)
+        if not normalized:
+            return []
+
+        key = phonetic_key(normalized)
+        with self._lock:
+            self._load()
+            exact = [identifier for identifier in self._exact.get(key, ()) if identifier not in exclude]
+            if len(exact) >= limit:
+                return [(identifier, 1.0) for identifier in sorted(exact)[:limit]]
+
+            query = trigrams(key)
+            min_shared = max(1, math.ceil(self._threshold * len(query) / (2 - self._threshold)))
+            rarest = sorted(query, key=lambda trigram: len(self._postings.get(trigram, ())))
+
+            candidates = set()
+            for trigram in rarest[:len(query) - min_shared + 1]:
+                candidates.update(self._postings.get(trigram, ()))
+
+            scores = []
+            for identifier in candidates:
+                if identifier not in exclude:
+                    keys = self._names[identifier][1]
+                    scores.append((2 * len(query & keys) / (len(query) + len(keys)), identifier))
+
+        matches = sorted(((identifier, score) for score, identifier in scores if score >= self._threshold),
+                         key=lambda match: (-match[1], match[0]))
+
+        return matches[:limit]
+
+    def best(self, name: str, exclude: Collection[str] = ()) -> Optional[str]:
+        matches = self.search(name, exclude=exclude)
+
+        return matches[0][0] if matches else None
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._load()
+            return len(self._names)
+
+    def _add(self, identifier: str, name: str):
+        if identifier in self._names:
+            self._remove(identifier)
+
+        key = phonetic_key(normalize_name(name))
+        self._names[identifier] = (key, trigrams(key))
+        self._exact[key].add(identifier)
+        for trigram in self._names[identifier][1]:
+            self._postings[trigram].add(identifier)
+
+    def _load(self):
+        if self._loader is None:
+            return
+
+        loader, self._loader = self._loader, None
+        added = set(self._names)
+        for identifier, name in loader():
+            if identifier not in added:
+                self._add(identifier, name)
+        logger.info("Indexed %s names", len(self._names))
+
+    def _remove(self, identifier: str):
+        key, keys = self._names.pop(identifier)
+        self._exact[key].discard(identifier)
+        if not self._exact[key]:
+            del self._exact[key]
+        for trigram in keys:
+            self._postings[trigram].discard(identifier)
+            if not self._postings[trigram]:
+                del self._postings[trigram]
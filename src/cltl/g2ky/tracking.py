@@ -0,0 +1,144 @@
+import itertools
+import logging
+from typing import Optional, Tuple, Iterable, List
+
+from cltl.face_recognition.api import Face
+
+logger = logging.getLogger(__name__)
+
+
+Box = Tuple[float, float, float, float]
+
+
+def _box(bounds) -> Optional[Box]:
+    if bounds is None:
+        return None
+    if hasattr(bounds, "x0"):
+        return bounds.x0, bounds.y0, bounds.x1, bounds.y1
+
+    return tuple(bounds)
+
+
+def iou(first: Box, second: Box) -> float:
+    width = min(first[2], second[2]) - max(first[0], second[0])
+    height = min(first[3], second[3]) - max(first[1], second[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+
+    intersection = width * height
+    union = area(first) + area(second) - intersection
+
+    return intersection / union if union > 0 else 0.0
+
+
+def area(box: Box) -> float:
+    return max(0, box[2] - box[0]) * max(0, box[3] - box[1])
+
+
+class Track:
+    """
+    A face followed across frames.
+
+    The identifier of a track is updated from the detections until the track is resolved, after that
+    it is kept for the lifetime of the track.
+    """
+    __slots__ = ("track_id", "box", "identifier", "face", "resolved", "misses")
+
+    def __init__(self, track_id: int, box: Optional[Box], identifier: Optional[str], face: Face):
+        self.track_id = track_id
+        self.box = box
+        self.identifier = identifier
+        self.face = face
+        self.resolved = False
+        self.misses = 0
+
+    def __repr__(self):
+        return f"Track({self.track_id}, {self.identifier}, resolved={self.resolved})"
+
+
+class FaceTracker:
+    """
+    Associate the faces in consecutive frames by the overlap (IoU) of their bounding boxes.
+
+    Faces are matched greedily to the track with the largest overlap above `iou_threshold`. Tracks that are
+    not matched for more than `max_misses` frames are dropped. Faces without bounds are not tracked.
+
+    The tracker keeps the focus on one track as long as it is visible, and otherwise moves the focus to the
+    largest, i.e. presumably closest, face.
+    """
+    def __init__(self, iou_threshold: float = 0.3, max_misses: int = 5):
+        self._iou_threshold = iou_threshold
+        self._max_misses = max_misses
+
+        self._tracks = []
+        self._ids = itertools.count()
+        self._focus = None
+
+    @property
+    def tracks(self) -> List[Track]:
+        return list(self._tracks)
+
+    def update(self, persons: Iterable[Tuple[Optional[str], Face]]) -> List[Track]:
+        """
+        Update the tracks with the faces detected in a frame.
+
+        Returns the tracks of the detected faces, in the order of the faces.
+        """
+        detections = [(identifier, face, _box(getattr(face, "bounds", None))) for identifier, face in persons]
+
+        overlaps = sorted(((iou(track.box, box), track_idx, detection_idx)
+                           for track_idx, track in enumerate(self._tracks)
+                           for detection_idx, (_, _, box) in enumerate(detections)
+                           if box is not None),
+                          reverse=True)
+
+        matched = [None] * len(detections)
+        matched_tracks = set()
+        for overlap, track_idx, detection_idx in overlaps:
+            if overlap < self._iou_threshold:
+                break
+            if matched[detection_idx] is None and track_idx not in matched_tracks:
+                matched[detection_idx] = self._tracks[track_idx]
+                matched_tracks.add(track_idx)
+
+        for track_idx, track in enumerate(self._tracks):
+            if track_idx not in matched_tracks:
+                track.misses += 1
+        self._tracks = [track for track in self._tracks if track.misses <= self._max_misses]
+
+        visible = []
+        for (identifier, face, box), track in zip(detections, matched):
+            if track is None:
+                track = Track(next(self._ids), box, identifier, face)
+                if box is not None:
+                    self._tracks.append(track)
+            else:
+                track.box = box
+                track.face = face
+                track.misses = 0
+                if not track.resolved and identifier is not None:
+                    track.identifier = identifier
+            visible.append(track)
+
+        return visible
+
+    def focus(self, visible: List[Track]) -> Optional[Track]:
+        """
+        The track to talk to among the visible tracks.
+        """
+        if not visible:
+            return None
+
+        for track in visible:
+            if track.track_id == self._focus:
+                return track
+
+        target = max(visible, key=lambda track: area(track.box) if track.box is not None else 0)
+        self._focus = target.track_id
+        logger.debug("Focus on %s", target)
+
+        return target
+
+    def clear(self):
+        self._tracks = []
+        self._focus = None
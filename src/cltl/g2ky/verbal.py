@@ -1,12 +1,16 @@
-import dataclasses
 import enum
 import logging
 import uuid
-from typing import Optional, Tuple, Iterable, Mapping
+from typing import Optional, Tuple, Iterable, Mapping, Set, Dict, Any, TYPE_CHECKING
 
-from cltl.face_recognition.api import Face
+if TYPE_CHECKING:
+    import numpy as np
+    from cltl.face_recognition.api import Face
 
-from cltl.g2ky.api import GetToKnowYou
+from cltl.g2ky.api import GetToKnowYou, Input
+from cltl.g2ky.friends import FriendStore, MemoryFriendStore
+from cltl.g2ky.fsm import StateRecord, transition_table
+from cltl.g2ky.names import NameIndex
 
 logger = logging.getLogger(__name__)
 
@@ -18,47 +22,63 @@ class ConvState(enum.Enum):
     KNOWN = 4
 
     def transitions(self):
-        return self._allowed[self]
+        return _TRANSITIONS[self]
+
+
+_TRANSITIONS = transition_table({
+    ConvState.START: [ConvState.QUERY],
+    ConvState.QUERY: [ConvState.CONFIRM],
+    ConvState.CONFIRM: [ConvState.KNOWN, ConvState.QUERY],
+    ConvState.KNOWN: [ConvState.START]
+})
 
-    @property
-    def _allowed(self):
-        return {
-            ConvState.START: [ConvState.QUERY],
-            ConvState.QUERY: [ConvState.CONFIRM],
-            ConvState.CONFIRM: [ConvState.KNOWN, ConvState.QUERY],
-            ConvState.KNOWN: [ConvState.START]
-        }
 
+class State(StateRecord):
+    __slots__ = ("face_id", "name", "rejected")
 
-@dataclasses.dataclass
-class State:
-    face_id: Optional[str]
-    name: Optional[str]
-    conv_state: Optional[ConvState]
+    initial = ConvState.START
 
-    def transition(self, conv_state: ConvState, **kwargs):
-        if conv_state not in self.conv_state.transitions():
-            raise ValueError(f"Cannot change state from {self.conv_state} to {conv_state}")
+    def __init__(self, face_id: Optional[str], name: Optional[str], conv_state: Optional[ConvState],
+                 rejected: Set[str] = None):
+        super().__init__(conv_state)
+        self.face_id = face_id
+        self.name = name
+        self.rejected = rejected if rejected is not None else set()
 
-        logger.debug("Transition from conversation state %s to %s", self.conv_state, conv_state)
+    def snapshot(self) -> Dict[str, Any]:
+        values = super().snapshot()
+        values["rejected"] = sorted(self.rejected)
 
-        return self._transition(conv_state, **kwargs)
+        return values
 
-    def stay(self, **kwargs):
-        logger.debug("Reenter conversation state %s to %s", self.conv_state)
-        return self._transition(self.conv_state, **kwargs)
+    def restore(self, values: Mapping[str, Any]):
+        values = dict(values)
+        values["rejected"] = set(values.get("rejected") or ())
 
-    def _transition(self, conv_state: ConvState, **kwargs):
-        new_state = vars(State(None, None, None)) if conv_state == ConvState.START else vars(self)
-        new_state.update(**kwargs)
-        new_state["conv_state"] = conv_state
+        return super().restore(values)
 
-        return State(**new_state)
+    def _reset(self):
+        self.face_id = None
+        self.name = None
+        self.rejected = set()
 
 
 class VerbalGetToKnowYou(GetToKnowYou):
-    def __init__(self, friends: Mapping[str, str] = None):
-        self._friends = {name: id for id, name in friends.items()} if friends else dict()
+    """
+    Get to know a person by asking for their name.
+
+    Names are matched approximately to the names of known friends with a :class:`NameIndex`. If the best match
+    is not confirmed, it is excluded and a new identity is created if no other match is found. The name index
+    should be shared with the friend store when multiple instances use the same store.
+    """
+    supported_inputs = frozenset({Input.UTTERANCE})
+
+    def __init__(self, friends: Mapping[str, str] = None, friend_store: FriendStore = None,
+                 name_index: NameIndex = None):
+        self._friends = friend_store if friend_store is not None else MemoryFriendStore()
+        for identifier, name in (friends.items() if friends else []):
+            self._friends.add(identifier, name)
+        self._names = name_index if name_index is not None else NameIndex(loader=self._friends.items)
         self._state = State(None, None, ConvState.START)
 
     @property
@@ -75,33 +95,43 @@ class VerbalGetToKnowYou(GetToKnowYou):
         response = None
         if self.state.conv_state == ConvState.START:
             response = "Hi, nice to meet you! What is your name?"
-            self._state = self.state.transition(ConvState.QUERY)
+            self._state.transition(ConvState.QUERY)
         elif self.state.conv_state == ConvState.QUERY:
             name = " ".join([foo.title() for foo in utterance.strip().split()])
+            face_id = self._names.best(name, exclude=self.state.rejected)
+            if face_id:
+                name = self._friends.get(face_id) or name
+            else:
+                face_id = str(uuid.uuid4())
             response = f"So your name is {name}?"
-            if name not in self._friends:
-                self._friends[name] = str(uuid.uuid4())
-            self._state = self.state.transition(ConvState.CONFIRM, name=name, face_id=self._friends[name])
+            self._state.transition(ConvState.CONFIRM, name=name, face_id=face_id)
         elif self.state.conv_state == ConvState.CONFIRM:
             if "yes" in utterance.strip().lower():
+                self._friends.add(self.state.face_id, self.state.name)
+                self._names.add(self.state.face_id, self.state.name)
                 response = f"Nice to meet you, {self.state.name}!"
-                self._state = self.state.transition(ConvState.KNOWN)
+                self._state.transition(ConvState.KNOWN)
             else:
+                self._state.rejected.add(self.state.face_id)
                 response = "Can you please repeat and only say your name!"
-                self._state = self.state.transition(ConvState.QUERY)
+                self._state.transition(ConvState.QUERY)
 
         return response
 
-    def persons_detected(self, persons: Iterable[Tuple[str, Face]]) -> Optional[str]:
+    def persons_detected(self, persons: Iterable[Tuple[str, "Face"]]) -> Optional[str]:
         pass
 
     def response(self) -> Optional[str]:
         if self.state.conv_state == ConvState.START:
-            self._state = self.state.transition(ConvState.QUERY)
+            self._state.transition(ConvState.QUERY)
 
             return "Hi, nice to meet you! What is your name?"
 
         return None
 
+    def add_friend(self, identifier: str, name: str, embeddings: Optional["np.ndarray"] = None):
+        self._friends.add(identifier, name)
+        self._names.add(identifier, name)
+
     def clear(self):
-        self._state = self._state.transition(ConvState.START)
+        self._state.transition(ConvState.START)
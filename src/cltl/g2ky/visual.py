@@ -1,12 +1,17 @@
 import dataclasses
 import enum
 import logging
-from collections import Counter
+import time
 
+import numpy as np
 from cltl.face_recognition.api import Face
-from typing import Optional, Tuple, Mapping, Iterable, List
+from typing import Optional, Tuple, Mapping, Iterable, List, FrozenSet, Dict, Callable, Any
 
-from cltl.g2ky.api import GetToKnowYou
+from cltl.g2ky.api import GetToKnowYou, Input
+from cltl.g2ky.embedding import EmbeddingIndex, FacePrototype, mean_similarity
+from cltl.g2ky.friends import FriendStore, MemoryFriendStore
+from cltl.g2ky.fsm import StateRecord, transition_table
+from cltl.g2ky.tracking import FaceTracker
 
 logger = logging.getLogger(__name__)
 
@@ -19,61 +24,156 @@ class ConvState(enum.Enum):
     KNOWN = 5
 
     def transitions(self):
-        return self._allowed[self]
+        return _TRANSITIONS[self]
 
-    @property
-    def _allowed(self):
-        return {
-            ConvState.START: [ConvState.GAZE, ConvState.KNOWN],
-            ConvState.GAZE: [ConvState.QUERY, ConvState.START],
-            ConvState.QUERY: [ConvState.CONFIRM],
-            ConvState.CONFIRM: [ConvState.KNOWN, ConvState.QUERY],
-            ConvState.KNOWN: [ConvState.START]
-        }
-
-
-@dataclasses.dataclass
-class State:
-    face_id: Optional[str]
-    name: Optional[str]
-    conv_state: Optional[ConvState]
-    faces: List
-    state_count: int
 
-    def transition(self, conv_state: ConvState, **kwargs):
-        if not conv_state in self.conv_state.transitions():
-            raise ValueError(f"Cannot change state from {self.conv_state} to {conv_state}")
+_TRANSITIONS = transition_table({
+    ConvState.START: [ConvState.GAZE, ConvState.KNOWN],
+    ConvState.GAZE: [ConvState.QUERY, ConvState.START],
+    ConvState.QUERY: [ConvState.CONFIRM],
+    ConvState.CONFIRM: [ConvState.KNOWN, ConvState.QUERY],
+    ConvState.KNOWN: [ConvState.START]
+})
+
+# Faces are ignored while confirming the name. While asking for the name they are still needed to warn
+# if multiple persons are visible and to keep the face tracker up to date.
+_INPUTS = {state: frozenset({Input.UTTERANCE}) if state == ConvState.CONFIRM else frozenset(Input)
+           for state in ConvState}
+
+
+@dataclasses.dataclass(frozen=True)
+class Timing:
+    """
+    Durations in seconds for the time based decisions of :class:`VisualGetToKnowYou`.
+    """
+    prompt_interval: float = 5.0
+    """Interval between prompts when nobody is visible."""
+    absence_timeout: float = 0.5
+    """Time in a state after which the conversation restarts if nobody is visible."""
+    multi_person_interval: float = 1.5
+    """Interval between warnings when multiple persons are visible."""
+    speaker_change_delay: float = 1.5
+    """Time after recognizing a speaker before a different face is treated as a new speaker."""
+
 
-        logger.debug("Transition from conversation state %s to %s", self.conv_state, conv_state)
+class State(StateRecord):
+    __slots__ = ("face_id", "name", "faces", "state_count", "prototype", "votes", "since", "prompted")
 
-        return self._transition(conv_state, state_count=0, **kwargs)
+    initial = ConvState.START
+
+    def __init__(self, face_id: Optional[str], name: Optional[str], conv_state: Optional[ConvState], faces: List,
+                 state_count: int, prototype: Optional[FacePrototype] = None, votes: Dict[str, int] = None):
+        super().__init__(conv_state)
+        self.face_id = face_id
+        self.name = name
+        self.faces = faces
+        self.state_count = state_count
+        self.prototype = prototype
+        self.votes = votes if votes is not None else {}
+        # Time of the first frame and of the last prompt in the current state in time based mode
+        self.since = None
+        self.prompted = None
+
+    def transition(self, conv_state: ConvState, **kwargs):
+        super().transition(conv_state, **kwargs)
+        self.state_count = 0
+        self.since = None
+        self.prompted = None
+
+        return self
 
     def stay(self, **kwargs):
-        logger.debug("Reenter conversation state %s to %s", self.conv_state, self.state_count + 1)
-        return self._transition(self.conv_state, state_count=self.state_count + 1, **kwargs)
+        self.state_count += 1
+        if kwargs:
+            self._update(kwargs)
+
+        return self
+
+    def snapshot(self) -> Dict[str, Any]:
+        values = super().snapshot()
+        values["faces"] = [(identifier, _embedding(face)) for identifier, face in self.faces]
+        values["prototype"] = self.prototype.embeddings if self.prototype is not None else None
+        # Times of the monotonic clock are not valid after a restart
+        values["since"] = None
+        values["prompted"] = None
 
-    def _transition(self, conv_state: ConvState, **kwargs):
-        new_state = vars(State(None, None, None, [], 0)) if conv_state == ConvState.START else vars(self)
-        new_state.update(**kwargs)
-        new_state["conv_state"] = conv_state
+        return values
 
-        return State(**new_state)
+    def restore(self, values: Mapping[str, Any]):
+        values = dict(values)
+        values["faces"] = [(identifier, Face(np.asarray(embedding), None, None))
+                           for identifier, embedding in values.get("faces", ())]
+        prototype = values.get("prototype")
+        values["prototype"] = FacePrototype(np.asarray(prototype, dtype=np.float32)) if prototype is not None else None
+        values["votes"] = dict(values.get("votes") or {})
+
+        return super().restore(values)
+
+    def _reset(self):
+        self.face_id = None
+        self.name = None
+        self.faces = []
+        self.state_count = 0
+        self.prototype = None
+        self.votes = {}
+        self.since = None
+        self.prompted = None
 
 
 class VisualGetToKnowYou(GetToKnowYou):
-    def __init__(self, gaze_images: int = 5, friends: Mapping[str, str] = None):
+    """
+    Get to know a person by memorizing their face and asking for their name.
+
+    A new person is observed for `gaze_images` frames. If `min_gaze_images` is set, observing stops as soon as
+    at least that many frames were collected, the share of frames with the most frequent identifier
+    reaches `gaze_confidence` and the mean cosine similarity of its embeddings reaches `gaze_similarity`.
+
+    By default prompts and speaker changes are timed by the number of received frames. If `timing` is provided,
+    they are timed by `clock` instead, independent of the frame rate.
+
+    If a :class:`FaceTracker` is provided, faces are tracked across frames and the component talks to the
+    focused person when multiple persons are visible. Identifiers are carried over within a track, and once
+    the identifier of a track is known it is not re-identified on subsequent frames.
+    """
+    def __init__(self, gaze_images: int = 5, friends: Mapping[str, str] = None, friend_store: FriendStore = None,
+                 embedding_index: EmbeddingIndex = None, max_exemplars: int = 2, min_gaze_images: int = None,
+                 gaze_confidence: float = 0.8, gaze_similarity: float = 0.6, timing: Timing = None,
+                 clock: Callable[[], float] = time.monotonic, tracker: FaceTracker = None):
+        if min_gaze_images is not None and not 0 < min_gaze_images <= gaze_images:
+            raise ValueError(f"min_gaze_images must be between 1 and gaze_images ({gaze_images}), "
+                             f"was {min_gaze_images}")
+
         self._gaze_images = gaze_images
-        self._friends = dict(friends) if friends else dict()
+        self._min_gaze_images = min_gaze_images
+        self._gaze_confidence = gaze_confidence
+        self._gaze_similarity = gaze_similarity
+        self._timing = timing
+        self._clock = clock
+        self._tracker = tracker
+        self._max_exemplars = max_exemplars
+        self._embedding_index = embedding_index
+        self._friends = friend_store if friend_store is not None else MemoryFriendStore()
+        for identifier, name in (friends.items() if friends else []):
+            self._friends.add(identifier, name)
         self._state = State(None, None, ConvState.START, [], 0)
+        self._focus = None
 
     @property
     def speaker(self) -> Tuple[str, str]:
         return (self.state.face_id, self.state.name) if self._state.conv_state == ConvState.KNOWN else (None, None)
 
+    @property
+    def focus(self) -> Optional[Any]:
+        return self._focus
+
     @property
     def state(self) -> State:
         return self._state
 
+    @property
+    def inputs(self) -> FrozenSet[Input]:
+        return _INPUTS[self._state.conv_state]
+
     def utterance_detected(self, utterance: str) -> Optional[str]:
         logger.debug("Received utterance %s in state %s", utterance, self.state.conv_state.name)
 
@@ -83,76 +183,168 @@ class VisualGetToKnowYou(GetToKnowYou):
                 response = "Hi, I can't see you.."
             else:
                 response = "Sorry, I still can't see you.."
-            self._state = self.state.stay()
+            self._state.stay()
         elif self.state.conv_state == ConvState.GAZE:
             response = "One more second, stranger, I'm memorizing your face."
-            self._state = self.state.stay()
+            self._state.stay()
         elif self.state.conv_state == ConvState.QUERY:
             name = " ".join([foo.title() for foo in utterance.strip().split()])
             response = f"So your name is {name}?"
-            self._state = self.state.transition(ConvState.CONFIRM, name=name)
+            self._state.transition(ConvState.CONFIRM, name=name)
         elif self.state.conv_state == ConvState.CONFIRM:
             if "yes" in utterance.strip().lower():
-                self._friends[self.state.face_id] = self.state.name
+                self._friends.add(self.state.face_id, self.state.name)
+                if self._embedding_index is not None and self.state.prototype is not None:
+                    self._embedding_index.add(self.state.face_id, self.state.prototype.embeddings)
                 response = f"Nice to meet you, {self.state.name}!"
-                self._state = self.state.transition(ConvState.KNOWN)
+                self._state.transition(ConvState.KNOWN)
             else:
                 response = "Can you please repeat and only say your name!"
-                self._state = self.state.transition(ConvState.QUERY)
+                self._state.transition(ConvState.QUERY)
 
         return response
 
     def persons_detected(self, persons: Iterable[Tuple[str, Face]]) -> Optional[str]:
         persons = list(persons)
-        logger.debug("Received %s persons in state %s", len(persons), self.state.conv_state)
+        state = self._state
+        logger.debug("Received %s persons in state %s", len(persons), state.conv_state)
+
+        if self._tracker is not None:
+            persons = self._track(persons)
+        elif self._embedding_index is not None and len(self._embedding_index) and persons:
+            persons = self._reidentify(persons)
+
+        timing = self._timing
+        now = None
+        if timing is not None:
+            now = self._clock()
+            if state.since is None:
+                state.since = now
+
+        self._focus = _focus(persons, state.face_id)
 
         response = None
         if len(persons) == 0:
-            if self.state.conv_state == ConvState.START:
-                response = "Hi, anyone there? I can't see anyone.." if self.state.state_count % 10 == 0 else None
-                self._state = self.state.stay()
-            elif self.state.state_count % 10 and ConvState.START in self.state.conv_state.transitions():
-                self._state = self.state.transition(ConvState.START)
+            if state.conv_state == ConvState.START:
+                if timing is None:
+                    prompt = state.state_count % 10 == 0
+                else:
+                    prompt = self._prompt(state, now, timing.prompt_interval, immediate=True)
+                response = "Hi, anyone there? I can't see anyone.." if prompt else None
+                state.stay()
+            elif (ConvState.START in state.conv_state.transitions()
+                  and (state.state_count % 10 if timing is None else now - state.since >= timing.absence_timeout)):
+                state.transition(ConvState.START)
             else:
-                self._state = self.state.stay()
+                state.stay()
         elif len(persons) > 1:
-            if self.state.state_count % 3 == 2:
+            if timing is None:
+                warn = state.state_count % 3 == 2
+            else:
+                warn = self._prompt(state, now, timing.multi_person_interval, immediate=False)
+            if warn:
                 response = "Hi there! Apologizes, but I will only talk to one of you at a time.."
-            self._state = self.state.stay()
+            state.stay()
         else:
             identifier, face = next(iter(persons))
-            if self.state.conv_state == ConvState.KNOWN:
-                if identifier != self.state.face_id and self.state.state_count > 2:
-                    self._state = self.state.transition(ConvState.START)
+            if state.conv_state == ConvState.KNOWN:
+                settled = state.state_count > 2 if timing is None else now - state.since > timing.speaker_change_delay
+                if identifier is not None and identifier != state.face_id and settled:
+                    state.transition(ConvState.START)
                 else:
-                    self._state = self.state.stay()
-            elif self.state.conv_state == ConvState.START:
-                if identifier in self._friends:
-                    name = self._friends[identifier]
+                    state.stay()
+            elif state.conv_state == ConvState.START:
+                name = self._friends.get(identifier)
+                if name is not None:
                     response = f"Nice to meet you again {name}!"
-                    self._state = self.state.transition(ConvState.KNOWN, face_id=identifier, name=name)
+                    state.transition(ConvState.KNOWN, face_id=identifier, name=name)
                     logger.debug("Recognized known face id %s for %s", identifier, name)
                 else:
                     response = f"Hi Stranger! We haven't met, let me look at your face!"
-                    self._state = self.state.transition(ConvState.GAZE)
-            elif self.state.conv_state == ConvState.GAZE:
-                self.state.faces.append((identifier, face))
-                if len(self.state.faces) == self._gaze_images:
-                    ids = list(zip(*self.state.faces))[0]
-                    identifier = Counter(ids).most_common()[0][0]
-                    if len(set(ids)) > 1:
+                    state.transition(ConvState.GAZE)
+            elif state.conv_state == ConvState.GAZE and identifier is not None:
+                state.faces.append((identifier, face))
+                state.votes[identifier] = state.votes.get(identifier, 0) + 1
+                if len(state.faces) >= self._gaze_images or self._is_confident(state):
+                    identifier = max(state.votes, key=state.votes.get)
+                    if len(state.votes) > 1:
                         logger.debug("Filter multiple faces for %s", identifier)
-                        faces = [(id, face) for id, face in self.state.faces if id == identifier]
+                        faces = [(id, face) for id, face in state.faces if id == identifier]
                     else:
-                        faces = self.state.faces
+                        faces = state.faces
+                    prototype = FacePrototype.from_embeddings((_embedding(face) for _, face in faces),
+                                                              max_exemplars=self._max_exemplars)
                     logger.debug("Memorized face for id %s", identifier)
                     response = f"What is your name, stranger?"
-                    self._state = self.state.transition(ConvState.QUERY, face_id=identifier, faces=faces)
+                    state.transition(ConvState.QUERY, face_id=identifier, faces=[], prototype=prototype, votes={})
 
         return response
 
     def response(self) -> Optional[str]:
         return None
 
+    def add_friend(self, identifier: str, name: str, embeddings: Optional[np.ndarray] = None):
+        self._friends.add(identifier, name)
+        if self._embedding_index is not None and embeddings is not None:
+            self._embedding_index.add(identifier, embeddings)
+
     def clear(self):
-        self._state = self._state.transition(ConvState.START)
\ No newline at end of file
+        self._state.transition(ConvState.START)
+
+    @staticmethod
+    def _prompt(state: State, now: float, interval: float, immediate: bool) -> bool:
+        last = state.prompted if state.prompted is not None or immediate else state.since
+        if last is not None and now - last < interval:
+            return False
+
+        state.prompted = now
+
+        return True
+
+    def _is_confident(self, state: State) -> bool:
+        if self._min_gaze_images is None or len(state.faces) < self._min_gaze_images:
+            return False
+
+        identifier, votes = max(state.votes.items(), key=lambda item: item[1])
+        if votes < self._gaze_confidence * len(state.faces):
+            return False
+
+        embeddings = [_embedding(face) for id, face in state.faces if id == identifier]
+
+        return mean_similarity([embedding for embedding in embeddings if embedding.size]) >= self._gaze_similarity
+
+    def _track(self, persons: List[Tuple[str, Face]]) -> List[Tuple[str, Face]]:
+        visible = self._tracker.update(persons)
+
+        unresolved = [track for track in visible if not track.resolved]
+        if unresolved and self._embedding_index is not None and len(self._embedding_index):
+            matches = self._reidentify([(track.identifier, track.face) for track in unresolved])
+            for track, (identifier, _) in zip(unresolved, matches):
+                track.identifier = identifier
+        for track in unresolved:
+            track.resolved = track.identifier is not None and self._friends.get(track.identifier) is not None
+
+        target = self._tracker.focus(visible)
+
+        return [(target.identifier, target.face)] if target else []
+
+    def _reidentify(self, persons: List[Tuple[str, Face]]) -> List[Tuple[str, Face]]:
+        matches = self._embedding_index.query([_embedding(face) for _, face in persons])
+
+        return [(match if match and self._friends.get(identifier) is None else identifier, face)
+                for (identifier, face), (match, _) in zip(persons, matches)]
+
+
+def _focus(persons: List[Tuple[str, Face]], face_id: Optional[str]) -> Optional[Any]:
+    # Only the bounds are kept, the face may refer to the buffer of the received event
+    if len(persons) == 1:
+        return getattr(persons[0][1], "bounds", None)
+
+    return next((getattr(face, "bounds", None) for identifier, face in persons
+                 if face_id is not None and identifier == face_id), None)
+
+
+def _embedding(face: Face) -> np.ndarray:
+    embedding = getattr(face, "embedding", None)
+
+    return np.asarray(embedding, dtype=np.float32).ravel() if embedding is not None else np.empty((0,))
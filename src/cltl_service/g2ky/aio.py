@@ -0,0 +1,410 @@
+import abc
+import asyncio
+import dataclasses
+import logging
+from collections import defaultdict
+from concurrent.futures import Executor
+from typing import Union, Tuple, List, Callable, Optional, Hashable, Awaitable, Dict
+
+from cltl.combot.event.bdi import DesireEvent
+from cltl.combot.infra.config import ConfigurationManager
+from cltl.combot.infra.event import Event, EventBus
+from cltl_service.emissordata.client import EmissorDataClient
+
+from cltl.g2ky.api import GetToKnowYou, Input
+from cltl_service.g2ky.grouping import ExpiringGroupProcessor, TimeoutGroupByProcessor
+from cltl_service.g2ky.scenario import ScenarioIdCache, SignalScenarios, PendingAnnotations
+from cltl_service.g2ky.service import FaceGroup, create_response_payload, create_speaker_payload, \
+    create_image_speaker_payload, get_image_id
+from cltl_service.g2ky.session import SessionManager
+
+logger = logging.getLogger(__name__)
+
+
+Handler = Callable[[Event], Awaitable[None]]
+
+
+class AsyncEventBus(abc.ABC):
+    """
+    Event bus with coroutine based publishing and handlers.
+    """
+    async def publish(self, topic: str, event: Event):
+        raise NotImplementedError()
+
+    def subscribe(self, topic: str, handler: Handler):
+        raise NotImplementedError()
+
+    def unsubscribe(self, topic: str, handler: Handler = None):
+        raise NotImplementedError()
+
+
+class InMemoryAsyncEventBus(AsyncEventBus):
+    """
+    Local :class:`AsyncEventBus` that awaits the handlers of a topic in the order of subscription.
+    """
+    def __init__(self):
+        self._handlers = defaultdict(list)
+
+    async def publish(self, topic: str, event: Event):
+        event = dataclasses.replace(event, metadata=event.metadata.with_topic(topic))
+        for handler in list(self._handlers[topic]):
+            await handler(event)
+
+    def subscribe(self, topic: str, handler: Handler):
+        self._handlers[topic].append(handler)
+
+    def unsubscribe(self, topic: str, handler: Handler = None):
+        if handler is None:
+            self._handlers.pop(topic, None)
+        elif handler in self._handlers[topic]:
+            self._handlers[topic].remove(handler)
+
+    @property
+    def topics(self) -> List[str]:
+        return [topic for topic, handlers in self._handlers.items() if handlers]
+
+
+class EventBusAdapter(AsyncEventBus):
+    """
+    :class:`AsyncEventBus` on top of a blocking :class:`EventBus`.
+
+    Events are published from `executor`, such that a slow broker does not block the event loop, and received
+    events are passed to the handlers on the event loop that was running when they subscribed.
+    """
+    def __init__(self, event_bus: EventBus, executor: Executor = None):
+        self._event_bus = event_bus
+        self._executor = executor
+        self._subscriptions = defaultdict(dict)
+
+    async def publish(self, topic: str, event: Event):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._event_bus.publish, topic, event)
+
+    def subscribe(self, topic: str, handler: Handler):
+        loop = asyncio.get_running_loop()
+
+        def receive(event: Event):
+            asyncio.run_coroutine_threadsafe(handler(event), loop)
+
+        self._subscriptions[topic][handler] = receive
+        self._event_bus.subscribe(topic, receive)
+
+    def unsubscribe(self, topic: str, handler: Handler = None):
+        handlers = list(self._subscriptions[topic]) if handler is None else [handler]
+        for unsubscribed in handlers:
+            receive = self._subscriptions[topic].pop(unsubscribed, None)
+            if receive is not None:
+                self._event_bus.unsubscribe(topic, receive)
+
+
+_TICK = object()
+
+
+class _SessionWorker(ExpiringGroupProcessor):
+    """
+    Handles the events of a single session in order, and groups its face annotations per image.
+    """
+    def __init__(self, service: "AsyncGetToKnowYouService", session_id: Hashable):
+        self._service = service
+        self.session_id = session_id
+        self.queue = asyncio.Queue()
+        self.task = None
+
+        self._groups = TimeoutGroupByProcessor(self, timeout=service._group_timeout, accept=self._needs_faces)
+        self._ready = []
+
+    def get_key(self, event: Event) -> Optional[Tuple[Hashable, str]]:
+        if event.metadata.topic == self._service._image_topic:
+            return self.session_id, event.payload.signal.id
+
+        return self.session_id, get_image_id(event.payload.mentions)
+
+    def new_group(self, key: Tuple[Hashable, str]) -> FaceGroup:
+        _, image_id = key
+
+        return FaceGroup(image_id, self._service._face_topic, self._service._id_topic, session_id=self.session_id)
+
+    def process_group(self, group: FaceGroup):
+        self._ready.append(group)
+
+    def expire_group(self, group: FaceGroup):
+        if group.has_faces:
+            self._ready.append(group)
+
+    def clear(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.queue.task_done()
+
+    async def run(self):
+        while True:
+            item = await self.queue.get()
+            try:
+                if item is _TICK:
+                    if not self._service._has_session(self.session_id) and self.queue.empty():
+                        self._service._workers.pop(self.session_id, None)
+                        return
+                    self._groups.expire()
+                    await self._service._handle_event(self.session_id, None)
+                elif item.metadata.topic in self._service._camera_topics:
+                    self._groups.process(item)
+                else:
+                    await self._service._handle_event(self.session_id, item)
+
+                while self._ready:
+                    await self._service._process_group(self._ready.pop(0))
+            except Exception:
+                logger.exception("Failed to process %s in session %s", item, self.session_id)
+            finally:
+                self.queue.task_done()
+
+    def _needs_faces(self, key: Tuple[Hashable, str]) -> bool:
+        return Input.FACES in self._service._sessions.get(self.session_id).inputs
+
+
+class AsyncGetToKnowYouService:
+    """
+    asyncio variant of :class:`GetToKnowYouService`.
+
+    Received events are dispatched in order to a task per session, such that conversations do not wait for
+    each other while publishing or processing. Face annotations are grouped per image within the session.
+    With multiple sessions, face and id events that arrive before their image signal are held until it arrives,
+    for at most the `group_timeout`.
+    Lookups of the current scenario id are cached and run in `executor` on a cache miss.
+
+    Unless the event bus is an :class:`AsyncEventBus`, it is wrapped in an :class:`EventBusAdapter` that
+    publishes from `executor`.
+
+    Events other than intentions are only handled while one of the `intentions` is active, if provided.
+    Every `interval` seconds the sessions are asked for a :meth:`GetToKnowYou.response`, incomplete face
+    groups are expired and expired sessions are evicted.
+    """
+    @classmethod
+    def from_config(cls, g2ky: Union[GetToKnowYou, Callable[[], GetToKnowYou]], emissor_client: EmissorDataClient,
+                    event_bus: Union[AsyncEventBus, EventBus], config_manager: ConfigurationManager,
+                    executor: Executor = None):
+        config = config_manager.get_config("cltl.g2ky.events")
+
+        intention_topic = config.get("topic_intention") if "topic_intention" in config else None
+        desire_topic = config.get("topic_desire") if "topic_desire" in config else None
+        scenario_topic = config.get("topic_scenario") if "topic_scenario" in config else None
+        intentions = config.get("intentions", multi=True) if "intentions" in config else []
+
+        sessions = None
+        if not isinstance(g2ky, GetToKnowYou):
+            session_config = config_manager.get_config("cltl.g2ky.sessions")
+            max_sessions = session_config.get_int("max_sessions") if "max_sessions" in session_config else 64
+            ttl = session_config.get_float("ttl") if "ttl" in session_config else None
+            sessions = SessionManager(g2ky, max_sessions=max_sessions, ttl=ttl)
+            g2ky = None
+
+        processing_config = config_manager.get_config("cltl.g2ky.processing")
+        group_timeout = processing_config.get_float("group_timeout") if "group_timeout" in processing_config else 1.0
+        scenario_ttl = processing_config.get_float("scenario_ttl") if "scenario_ttl" in processing_config else 60
+
+        return cls(config.get("topic_utterance"), config.get("topic_image"), config.get("topic_face"),
+                   config.get("topic_id"), config.get("topic_response"), config.get("topic_speaker"),
+                   intention_topic, desire_topic, intentions,
+                   g2ky, emissor_client, event_bus, sessions=sessions, group_timeout=group_timeout,
+                   scenario_topic=scenario_topic, scenario_ttl=scenario_ttl, executor=executor)
+
+    def __init__(self, utterance_topic: str, image_topic: str, face_topic: str, id_topic: str, response_topic: str,
+                 speaker_topic: str, intention_topic: str, desire_topic: str, intentions: List[str],
+                 g2ky: Optional[GetToKnowYou], emissor_client: EmissorDataClient,
+                 event_bus: Union[AsyncEventBus, EventBus], sessions: SessionManager = None,
+                 group_timeout: float = 1.0, scenario_topic: str = None, scenario_ttl: float = 60,
+                 executor: Executor = None, interval: float = 1.0):
+        if g2ky is None and sessions is None:
+            raise ValueError("Either a GetToKnowYou instance or a SessionManager is required")
+
+        self._multi_session = sessions is not None
+        self._sessions = sessions if sessions is not None else SessionManager.for_instance(g2ky)
+
+        self._executor = executor
+        self._scenario_ids = ScenarioIdCache(emissor_client, ttl=scenario_ttl)
+        self._signal_scenarios = SignalScenarios()
+        self._pending = PendingAnnotations(timeout=group_timeout) if self._multi_session else None
+        self._scenario_lookup = None
+        self._event_bus = event_bus if isinstance(event_bus, AsyncEventBus) else EventBusAdapter(event_bus, executor)
+
+        self._utterance_topic = utterance_topic
+        self._image_topic = image_topic
+        self._face_topic = face_topic
+        self._id_topic = id_topic
+        self._response_topic = response_topic
+        self._speaker_topic = speaker_topic
+        self._intention_topic = intention_topic
+        self._desire_topic = desire_topic
+        self._scenario_topic = scenario_topic
+        self._intentions = intentions
+        self._group_timeout = group_timeout
+        self._interval = interval
+
+        self._face_input = Input.FACES in self._sessions.supported_inputs
+        self._camera_topics = (image_topic, face_topic, id_topic)
+        self._active = not intentions
+
+        self._topics = []
+        self._inbox = None
+        self._workers: Dict[Hashable, _SessionWorker] = {}
+        self._tasks = []
+
+    @property
+    def scenario_ids(self) -> ScenarioIdCache:
+        return self._scenario_ids
+
+    async def start(self):
+        self._inbox = asyncio.Queue()
+        self._topics = [self._utterance_topic, self._intention_topic]
+        if self._face_input:
+            self._topics += list(self._camera_topics)
+        if self._scenario_topic:
+            self._topics.append(self._scenario_topic)
+        self._topics = [topic for topic in self._topics if topic]
+
+        for topic in self._topics:
+            self._event_bus.subscribe(topic, self._receive)
+
+        self._tasks = [asyncio.ensure_future(self._dispatch()), asyncio.ensure_future(self._tick())]
+
+    async def stop(self):
+        for topic in self._topics:
+            self._event_bus.unsubscribe(topic, self._receive)
+
+        tasks = self._tasks + [worker.task for worker in self._workers.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        self._tasks = []
+        self._workers = {}
+
+    async def join(self):
+        """
+        Wait until all received events are handled.
+        """
+        await self._inbox.join()
+        for worker in list(self._workers.values()):
+            await worker.queue.join()
+
+    async def _receive(self, event: Event):
+        self._inbox.put_nowait(event)
+
+    async def _dispatch(self):
+        while True:
+            event = await self._inbox.get()
+            try:
+                topic = event.metadata.topic
+                if topic == self._scenario_topic:
+                    self._scenario_ids.update(event)
+                    continue
+                if topic == self._intention_topic and self._intentions:
+                    self._active = any(intention.label in self._intentions
+                                       for intention in getattr(event.payload, "intentions", ()))
+                elif not self._active:
+                    continue
+
+                if self._pending is not None and topic in self._camera_topics:
+                    await self._route(self._pending.arrived(event, self._signal_scenarios))
+                else:
+                    await self._route([event])
+            except Exception:
+                logger.exception("Failed to dispatch %s", event)
+            finally:
+                self._inbox.task_done()
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(self._interval)
+            self._sessions.evict_expired()
+            if self._pending is not None:
+                await self._route(self._pending.expired())
+            for worker in list(self._workers.values()):
+                worker.queue.put_nowait(_TICK)
+
+    async def _route(self, events: List[Event]):
+        for event in events:
+            session_id = await self._get_session_id(event)
+            self._worker(session_id).queue.put_nowait(event)
+
+    def _worker(self, session_id: Hashable) -> _SessionWorker:
+        worker = self._workers.get(session_id)
+        if worker is None:
+            worker = _SessionWorker(self, session_id)
+            worker.task = asyncio.ensure_future(worker.run())
+            self._workers[session_id] = worker
+            logger.debug("Started task for session %s", session_id)
+
+        return worker
+
+    def _has_session(self, session_id: Hashable) -> bool:
+        return not self._multi_session or session_id in self._sessions
+
+    async def _handle_event(self, session_id: Hashable, event: Optional[Event]):
+        # Ticks do not refresh the session, such that idle sessions expire
+        g2ky = self._sessions.get(session_id) if event is not None else self._sessions.peek(session_id)
+        if g2ky is None:
+            return
+
+        response = None
+        if event is None or self._is_g2ky_intention(event):
+            response = g2ky.response()
+        elif event.metadata.topic == self._utterance_topic:
+            response = g2ky.utterance_detected(event.payload.signal.text)
+
+        await self._publish_response(session_id, response)
+
+        id, name = g2ky.speaker
+        if id and name and event is not None and event.metadata.topic == self._utterance_topic:
+            await self._publish_speaker(session_id, g2ky, create_speaker_payload(event.payload.signal, id, name))
+
+    async def _process_group(self, group: FaceGroup):
+        g2ky = self._sessions.get(group.session_id)
+        response = g2ky.persons_detected(group.get_persons())
+        await self._publish_response(group.session_id, response)
+
+        id, name = g2ky.speaker
+        if id and name:
+            img_id, bbox = group.segment_key(g2ky.focus)
+            await self._publish_speaker(group.session_id, g2ky, create_image_speaker_payload(img_id, bbox, id, name))
+
+        group.release()
+
+    async def _publish_response(self, session_id: Hashable, response: Optional[str]):
+        if response:
+            scenario_id = session_id if session_id else await self._get_scenario_id()
+            await self._event_bus.publish(self._response_topic,
+                                          Event.for_payload(create_response_payload(response, scenario_id)))
+
+    async def _publish_speaker(self, session_id: Hashable, g2ky: GetToKnowYou, speaker_event):
+        await self._event_bus.publish(self._speaker_topic, Event.for_payload(speaker_event))
+        if self._desire_topic:
+            await self._event_bus.publish(self._desire_topic, Event.for_payload(DesireEvent(["resolved"])))
+
+        g2ky.clear()
+        if not self._multi_session:
+            self._workers[session_id].clear()
+
+    async def _get_session_id(self, event: Event) -> Hashable:
+        if not self._multi_session:
+            return None
+
+        scenario_id = self._signal_scenarios.scenario_id(event)
+
+        return scenario_id if scenario_id else await self._get_scenario_id()
+
+    async def _get_scenario_id(self) -> Optional[str]:
+        scenario_id = self._scenario_ids.cached()
+        if scenario_id is not None:
+            return scenario_id
+
+        # Concurrent cache misses share a single lookup
+        if self._scenario_lookup is None or self._scenario_lookup.done():
+            loop = asyncio.get_running_loop()
+            self._scenario_lookup = loop.run_in_executor(self._executor, self._scenario_ids.get)
+
+        return await asyncio.shield(self._scenario_lookup)
+
+    def _is_g2ky_intention(self, event: Event) -> bool:
+        return (event.metadata.topic == self._intention_topic
+                and hasattr(event.payload, "intentions")
+                and any('g2ky' == intention.label for intention in event.payload.intentions))
@@ -0,0 +1,187 @@
+import enum
+import logging
+import mmap
+import queue
+import struct
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Iterator, NamedTuple, Optional
+
+from cltl.combot.infra.event import Event
+
+from cltl_service.g2ky.serialization import BinarySerializer
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = b"G2KYLOG1"
+_RECORD = struct.Struct("<BdHI")
+
+
+class Direction(enum.IntEnum):
+    """
+    Kind of a logged record: a consumed or published event, a timer tick of the service without event,
+    or a consumed event that was shed before processing.
+    """
+    CONSUMED = 0
+    PUBLISHED = 1
+    TICK = 2
+    SHED = 3
+
+
+class LoggedEvent(NamedTuple):
+    direction: Direction
+    topic: str
+    timestamp: float
+    event: Any
+
+
+class EventRecorder:
+    """
+    Append consumed and published events to a compact binary log.
+
+    Events are serialized and written on a background thread. If more than `max_pending` events are waiting
+    to be written, new events are dropped and counted instead of blocking the caller.
+
+    Each record in the log consists of the direction, the timestamp, the topic and the event serialized with
+    the :class:`BinarySerializer`, such that embeddings are stored as raw buffers. Ticks are recorded with an
+    empty topic and without event.
+    """
+    def __init__(self, path: str, max_pending: int = 1024, serializer: BinarySerializer = None,
+                 clock: Callable[[], float] = time.time):
+        self._path = path
+        self._serializer = serializer if serializer else BinarySerializer()
+        self._clock = clock
+        self._queue = queue.Queue(maxsize=max_pending)
+
+        self.recorded = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+
+        self._writer = threading.Thread(target=self._write, name=self.__class__.__name__, daemon=True)
+        self._writer.start()
+
+    def record(self, direction: Direction, topic: str, event: Optional[Event]):
+        try:
+            self._queue.put_nowait((direction, topic, self._clock(), event))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+        self._file.close()
+
+    def _write(self):
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                break
+
+            direction, topic, timestamp, event = entry
+            try:
+                topic_bytes = topic.encode("utf-8")
+                payload = self._serializer.encode(event)
+                self._file.write(_RECORD.pack(direction, timestamp, len(topic_bytes), len(payload)))
+                self._file.write(topic_bytes)
+                self._file.write(payload)
+                self.recorded += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Failed to record event on topic %s", topic)
+
+            if self._queue.empty():
+                self._file.flush()
+
+
+class EventLog:
+    """
+    Read an event log written by :class:`EventRecorder` through a memory map.
+
+    Arrays in the decoded events are views on the memory map, the log must therefore be kept open as long as
+    the events are used.
+    """
+    def __init__(self, path: str, serializer: BinarySerializer = None):
+        self._serializer = serializer if serializer else BinarySerializer()
+        with open(path, "rb") as log_file:
+            self._mmap = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a G2KY event log")
+
+    def __iter__(self) -> Iterator[LoggedEvent]:
+        data = memoryview(self._mmap)
+        offset = len(MAGIC)
+        while offset + _RECORD.size <= len(data):
+            direction, timestamp, topic_length, payload_length = _RECORD.unpack_from(data, offset)
+            offset += _RECORD.size
+            if offset + topic_length + payload_length > len(data):
+                logger.warning("Truncated record at the end of the event log")
+                break
+
+            topic = bytes(data[offset:offset + topic_length]).decode("utf-8")
+            offset += topic_length
+            event = self._serializer.decode(data[offset:offset + payload_length])
+            offset += payload_length
+
+            yield LoggedEvent(Direction(direction), topic, timestamp, event)
+
+    def close(self):
+        self._mmap.close()
+
+
+class EventReplayer:
+    """
+    Replay the consumed events and ticks of an :class:`EventLog`, either as fast as possible or in real time.
+
+    Ticks are passed to the processor as ``None``, shed events are skipped as they were not processed.
+    :meth:`timestamp` returns the logged timestamp of the record that is replayed, such that timeouts of the processor
+    expire at the same events as when the log was recorded if it uses it as clock.
+    """
+    def __init__(self, log: EventLog, processor: Callable[[Optional[Event]], None], realtime: bool = False,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self._log = log
+        self._processor = processor
+        self._realtime = realtime
+        self._clock = clock
+        self._sleep = sleep
+        self._time = None
+
+    def timestamp(self) -> Optional[float]:
+        return self._time
+
+    def replay(self, limit: Optional[int] = None) -> int:
+        count = 0
+        start = None
+        first_timestamp = None
+        for logged in self._log:
+            if logged.direction not in (Direction.CONSUMED, Direction.TICK):
+                continue
+            if limit is not None and count >= limit:
+                break
+
+            if self._realtime:
+                if start is None:
+                    start, first_timestamp = self._clock(), logged.timestamp
+                delay = (logged.timestamp - first_timestamp) - (self._clock() - start)
+                if delay > 0:
+                    self._sleep(delay)
+
+            self._time = logged.timestamp
+            event = logged.event
+            if logged.direction == Direction.TICK:
+                event = None
+            elif getattr(event, "metadata", None) is None:
+                event.metadata = SimpleNamespace(topic=logged.topic)
+            elif not getattr(event.metadata, "topic", None):
+                event.metadata.topic = logged.topic
+
+            self._processor(event)
+            count += 1
+
+        return count
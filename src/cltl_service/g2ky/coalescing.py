@@ -0,0 +1,79 @@
+import logging
+import threading
+from collections import deque
+from typing import Any, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescingQueue:
+    """
+    Queue with two lanes: an ordered lane for events that must all be processed, and a frame lane
+    that keeps only the latest frame per session.
+
+    A frame that is superseded by a newer frame of the same session before it was drained is dropped
+    and counted. Items are drained in batches in the order in which they were added.
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._sequence = 0
+        self._ordered = deque()
+        self._frames = {}
+        self._dropped = 0
+        self._closed = False
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
+
+    def put(self, item: Any):
+        with self._condition:
+            self._ordered.append((self._next_sequence(), item))
+            self._condition.notify()
+
+    def put_frame(self, session_id: Hashable, frame: Any):
+        with self._condition:
+            if session_id in self._frames:
+                self._dropped += 1
+                logger.debug("Dropped superseded frame for session %s", session_id)
+            self._frames[session_id] = (self._next_sequence(), frame)
+            self._condition.notify()
+
+    def drain(self, timeout: Optional[float] = None) -> List[Any]:
+        """
+        Remove and return all queued items, waiting up to `timeout` seconds for at least one item.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._closed or self._ordered or self._frames, timeout=timeout)
+
+            items = list(self._ordered)
+            if self._frames:
+                items.extend(self._frames.values())
+                items.sort(key=lambda item: item[0])
+
+            self._ordered.clear()
+            self._frames.clear()
+
+        return [item for _, item in items]
+
+    def clear(self):
+        with self._condition:
+            self._ordered.clear()
+            self._frames.clear()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def __len__(self) -> int:
+        return len(self._ordered) + len(self._frames)
+
+    def _next_sequence(self) -> int:
+        self._sequence += 1
+
+        return self._sequence
@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, Mapping, Optional, Tuple
+
+from cltl.combot.infra.event import Event
+
+from cltl_service.g2ky.metrics import event_age
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineFilter:
+    """
+    Load shedding of stale events before they are grouped or processed.
+
+    Events older than the maximum age configured for their topic in `max_ages` are dropped, the age is
+    determined from the event timestamp. Topics without maximum age are not filtered by age.
+
+    Events on `priority_topics` take precedence over other events: while a priority event was received on
+    the event bus but is not processed yet, events on other topics with a maximum age are dropped, such
+    that a backlog of camera events does not delay utterances and intentions. A priority event that is not
+    processed within `priority_timeout` seconds, e.g. because it was discarded by the topic worker, no longer
+    takes precedence.
+
+    Events on `group_topics` are admitted or dropped per image: the first event of an image decides for the
+    image, face and id events of that image, such that a face group is never split. The decisions for the last
+    `max_groups` images are kept.
+    """
+    def __init__(self, max_ages: Mapping[str, float] = None, priority_topics: Iterable[str] = (),
+                 priority_timeout: float = 1.0, clock: Callable[[], float] = time.time,
+                 group_topics: Iterable[str] = (), max_groups: int = 1024):
+        self._max_ages = dict(max_ages) if max_ages else {}
+        self._priority_topics = frozenset(topic for topic in priority_topics if topic)
+        self._priority_timeout = priority_timeout
+        self._clock = clock
+        self._group_topics = frozenset(topic for topic in group_topics if topic)
+        self._max_groups = max_groups
+
+        self._pending = {}
+        self._groups = OrderedDict()
+        self._lock = threading.Lock()
+        self._dropped = Counter()
+
+    @property
+    def priority_topics(self) -> frozenset:
+        return self._priority_topics
+
+    @property
+    def dropped(self) -> Dict[Tuple[str, str], int]:
+        """
+        Number of dropped events by topic and reason, either ``"stale"`` or ``"preempted"``.
+        """
+        return dict(self._dropped)
+
+    def count(self, reason: str) -> int:
+        return sum(count for (_, dropped_reason), count in self._dropped.items() if dropped_reason == reason)
+
+    def received(self, event: Event):
+        """
+        Register a priority event when it is received on the event bus, before it is queued for processing.
+        """
+        with self._lock:
+            self._pending[event.id] = self._clock()
+
+    def admit(self, event: Event) -> bool:
+        """
+        Whether the event should be processed, counts the event as dropped otherwise.
+        """
+        topic = event.metadata.topic
+        group = _image_id(event) if topic in self._group_topics else None
+        if group is None:
+            reason = self._drop_reason(event, topic)
+        else:
+            with self._lock:
+                reason = self._groups.get(group, False)
+            if reason is False:
+                reason = self._drop_reason(event, topic)
+                with self._lock:
+                    self._groups[group] = reason
+                    if len(self._groups) > self._max_groups:
+                        self._groups.popitem(last=False)
+
+        if reason is not None:
+            self._dropped[(topic, reason)] += 1
+            logger.debug("Dropped %s event on %s", reason, topic)
+
+        return reason is None
+
+    def _drop_reason(self, event: Event, topic: str) -> Optional[str]:
+        now = self._clock()
+
+        max_age = self._max_ages.get(topic)
+        if topic in self._priority_topics:
+            with self._lock:
+                self._pending.pop(event.id, None)
+        elif max_age is not None and self._pending and self._has_pending(now):
+            return "preempted"
+
+        if max_age is not None:
+            age = event_age(event, now)
+            if age is not None and age > max_age:
+                return "stale"
+
+        return None
+
+    def _has_pending(self, now: float) -> bool:
+        with self._lock:
+            expired = [event_id for event_id, received in self._pending.items()
+                       if now - received > self._priority_timeout]
+            for event_id in expired:
+                del self._pending[event_id]
+
+            return bool(self._pending)
+
+
+def _image_id(event: Event) -> Optional[Hashable]:
+    signal = getattr(event.payload, "signal", None)
+    if signal is not None:
+        return signal.id
+
+    image_ids = {segment.container_id for mention in getattr(event.payload, "mentions", None) or ()
+                 for segment in mention.segment}
+
+    return next(iter(image_ids)) if len(image_ids) == 1 else None
@@ -0,0 +1,209 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Union, TYPE_CHECKING
+
+from cltl.combot.infra.config import ConfigurationManager
+
+from cltl.g2ky.api import GetToKnowYou
+
+if TYPE_CHECKING:
+    from cltl.g2ky.embedding import EmbeddingIndex
+    from cltl.g2ky.friends import FriendStore
+    from cltl.g2ky.names import NameIndex
+
+logger = logging.getLogger(__name__)
+
+
+class FriendRegistry:
+    """
+    The friends known to all G2KY sessions: a :class:`FriendStore`, an :class:`EmbeddingIndex` over their faces
+    and a :class:`NameIndex` over their names.
+
+    The friend store is persisted in a SQLite database if `path` is set, and kept in memory otherwise.
+    The stores are created on first use, such that the registry can be passed to worker processes,
+    each of which creates its own instances.
+    """
+    def __init__(self, path: str = None, batch_size: int = 64, flush_interval: Optional[float] = 1.0,
+                 cache_size: int = 4096, embedding_threshold: float = 0.6, embedding_capacity: int = 1024,
+                 name_threshold: float = 0.5):
+        self._path = path
+        self._store_options = {"batch_size": batch_size, "flush_interval": flush_interval, "cache_size": cache_size}
+        self._embedding_options = {"threshold": embedding_threshold, "capacity": embedding_capacity}
+        self._name_threshold = name_threshold
+        self._init()
+
+    def _init(self):
+        self._lock = threading.RLock()
+        self._friend_store = None
+        self._embedding_index = None
+        self._name_index = None
+
+    @property
+    def friend_store(self) -> "FriendStore":
+        with self._lock:
+            if self._friend_store is None:
+                from cltl.g2ky.friends import MemoryFriendStore, SQLiteFriendStore
+                self._friend_store = (SQLiteFriendStore(self._path, **self._store_options) if self._path
+                                      else MemoryFriendStore())
+
+            return self._friend_store
+
+    @property
+    def embedding_index(self) -> "EmbeddingIndex":
+        with self._lock:
+            if self._embedding_index is None:
+                from cltl.g2ky.embedding import EmbeddingIndex
+                self._embedding_index = EmbeddingIndex(**self._embedding_options)
+
+            return self._embedding_index
+
+    @property
+    def name_index(self) -> "NameIndex":
+        with self._lock:
+            if self._name_index is None:
+                from cltl.g2ky.names import NameIndex
+                self._name_index = NameIndex(threshold=self._name_threshold, loader=self.friend_store.items)
+
+            return self._name_index
+
+    def close(self):
+        with self._lock:
+            if self._friend_store is not None:
+                self._friend_store.close()
+                self._friend_store = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"path": self._path, "store_options": self._store_options,
+                "embedding_options": self._embedding_options, "name_threshold": self._name_threshold}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self._path = state["path"]
+        self._store_options = state["store_options"]
+        self._embedding_options = state["embedding_options"]
+        self._name_threshold = state["name_threshold"]
+        self._init()
+
+
+class G2KYFactory:
+    """
+    Create G2KY components that share the friends of a :class:`FriendRegistry`.
+
+    Face trackers follow the faces of a single camera stream and are created per component if `tracking`
+    options are given.
+    """
+    def __init__(self, implementation: str, friends: FriendRegistry, options: Dict[str, Any] = None,
+                 tracking: Dict[str, Any] = None):
+        if implementation not in ("visual", "verbal"):
+            raise ValueError(f"Unsupported G2KY implementation {implementation}, expected visual or verbal")
+
+        self._implementation = implementation
+        self._friends = friends
+        self._options = options or {}
+        self._tracking = tracking
+
+    @property
+    def implementation(self) -> str:
+        return self._implementation
+
+    @property
+    def friends(self) -> FriendRegistry:
+        return self._friends
+
+    def __call__(self) -> GetToKnowYou:
+        if self._implementation == "verbal":
+            from cltl.g2ky.verbal import VerbalGetToKnowYou
+            return VerbalGetToKnowYou(friend_store=self._friends.friend_store, name_index=self._friends.name_index)
+
+        from cltl.g2ky.visual import VisualGetToKnowYou
+        tracker = None
+        if self._tracking is not None:
+            from cltl.g2ky.tracking import FaceTracker
+            tracker = FaceTracker(**self._tracking)
+
+        return VisualGetToKnowYou(friend_store=self._friends.friend_store,
+                                  embedding_index=self._friends.embedding_index, tracker=tracker, **self._options)
+
+
+def create_friends(config_manager: ConfigurationManager) -> FriendRegistry:
+    """
+    Create the :class:`FriendRegistry` from the `cltl.g2ky.friends` configuration section.
+    """
+    config = config_manager.get_config("cltl.g2ky.friends")
+
+    kwargs = {}
+    if "path" in config:
+        kwargs["path"] = config.get("path")
+    for key in ("batch_size", "cache_size", "embedding_capacity"):
+        if key in config:
+            kwargs[key] = config.get_int(key)
+    for key in ("flush_interval", "embedding_threshold", "name_threshold"):
+        if key in config:
+            kwargs[key] = config.get_float(key)
+
+    return FriendRegistry(**kwargs)
+
+
+def create_g2ky(config_manager: ConfigurationManager,
+                friends: FriendRegistry = None) -> Union[GetToKnowYou, Callable[[], GetToKnowYou]]:
+    """
+    Create the :class:`GetToKnowYou` implementation selected in the `cltl.g2ky` configuration section.
+
+    Only the modules of the selected implementation are imported. If `sessions` is enabled, a :class:`G2KYFactory`
+    is returned such that the service creates a component per scenario. All components share the given friends,
+    or the friends configured in the `cltl.g2ky.friends` section.
+    """
+    config = config_manager.get_config("cltl.g2ky")
+    implementation = config.get("implementation") if "implementation" in config else "visual"
+    multi_session = config.get_boolean("sessions") if "sessions" in config else False
+
+    friends = friends if friends is not None else create_friends(config_manager)
+    if implementation == "visual":
+        factory = G2KYFactory(implementation, friends, _visual_options(config_manager),
+                              _tracking_options(config_manager))
+    else:
+        factory = G2KYFactory(implementation, friends)
+
+    logger.info("Created %s G2KY%s", implementation, " per scenario" if multi_session else "")
+
+    return factory if multi_session else factory()
+
+
+def _visual_options(config_manager: ConfigurationManager) -> Dict[str, Any]:
+    config = config_manager.get_config("cltl.g2ky.visual")
+
+    kwargs = {}
+    if "gaze_images" in config:
+        kwargs["gaze_images"] = config.get_int("gaze_images")
+    if "min_gaze_images" in config:
+        kwargs["min_gaze_images"] = config.get_int("min_gaze_images")
+    if "gaze_confidence" in config:
+        kwargs["gaze_confidence"] = config.get_float("gaze_confidence")
+    if "gaze_similarity" in config:
+        kwargs["gaze_similarity"] = config.get_float("gaze_similarity")
+
+    timing = config.get("timing") if "timing" in config else "frames"
+    if timing == "clock":
+        from cltl.g2ky.visual import Timing
+        durations = {field: config.get_float(field)
+                     for field in ("prompt_interval", "absence_timeout", "multi_person_interval",
+                                   "speaker_change_delay")
+                     if field in config}
+        kwargs["timing"] = Timing(**durations)
+    elif timing != "frames":
+        raise ValueError(f"Unsupported timing {timing}, expected frames or clock")
+
+    return kwargs
+
+
+def _tracking_options(config_manager: ConfigurationManager) -> Optional[Dict[str, Any]]:
+    config = config_manager.get_config("cltl.g2ky.tracking")
+    if not ("enabled" in config and config.get_boolean("enabled")):
+        return None
+
+    kwargs = {}
+    if "iou_threshold" in config:
+        kwargs["iou_threshold"] = config.get_float("iou_threshold")
+    if "max_misses" in config:
+        kwargs["max_misses"] = config.get_int("max_misses")
+
+    return kwargs
@@ -0,0 +1,107 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+from cltl.combot.infra.event import Event
+from cltl.combot.infra.groupby_processor import GroupProcessor, Group
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiringGroupProcessor(GroupProcessor):
+    """
+    :class:`GroupProcessor` that is notified about groups that did not complete in time.
+    """
+    def expire_group(self, group: Group):
+        raise NotImplementedError()
+
+
+class TimeoutGroupByProcessor:
+    """
+    Group events by key with a deadline per group.
+
+    Complete groups are passed to :meth:`GroupProcessor.process_group`. Groups that are not complete before
+    their deadline, or that are evicted because more than `max_size` groups are pending, are passed to
+    :meth:`ExpiringGroupProcessor.expire_group`. Events for groups that were already completed or expired
+    are dropped as late events.
+
+    If `accept` is provided, events that would start a new group are dropped as filtered events unless
+    `accept` returns ``True`` for the group key. Events for groups that were already started are not filtered.
+    """
+    def __init__(self, processor: ExpiringGroupProcessor, max_size: int = 16, timeout: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic, max_closed: int = 256,
+                 accept: Optional[Callable[[Hashable], bool]] = None):
+        self._processor = processor
+        self._accept = accept
+        self._max_size = max_size
+        self._timeout = timeout
+        self._clock = clock
+        self._max_closed = max_closed
+
+        self._groups = OrderedDict()
+        self._closed = OrderedDict()
+
+        self.completed = 0
+        self.expired = 0
+        self.evicted = 0
+        self.late = 0
+        self.filtered = 0
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def process(self, event: Event):
+        now = self._clock()
+        self._expire(now)
+
+        key = self._processor.get_key(event)
+        if key is None:
+            return
+
+        if key in self._closed:
+            self.late += 1
+            logger.debug("Dropped late event %s for group %s", event.id, key)
+            return
+
+        if key in self._groups:
+            group = self._groups[key][1]
+        elif self._accept is not None and not self._accept(key):
+            self.filtered += 1
+            return
+        else:
+            group = self._processor.new_group(key)
+            self._groups[key] = (now + self._timeout, group)
+            if len(self._groups) > self._max_size:
+                evicted_key, (_, evicted_group) = self._groups.popitem(last=False)
+                self.evicted += 1
+                self._close(evicted_key)
+                logger.debug("Evicted incomplete group %s", evicted_key)
+                self._processor.expire_group(evicted_group)
+
+        group.add(event)
+        if group.complete:
+            del self._groups[key]
+            self.completed += 1
+            self._close(key)
+            self._processor.process_group(group)
+
+    def expire(self):
+        self._expire(self._clock())
+
+    def _expire(self, now: float):
+        while self._groups:
+            key, (deadline, group) = next(iter(self._groups.items()))
+            if deadline > now:
+                break
+
+            del self._groups[key]
+            self.expired += 1
+            self._close(key)
+            logger.debug("Expired incomplete group %s", key)
+            self._processor.expire_group(group)
+
+    def _close(self, key: Hashable):
+        self._closed[key] = True
+        if len(self._closed) > self._max_closed:
+            self._closed.popitem(last=False)
@@ -0,0 +1,309 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Optional, Tuple
+
+from cltl.g2ky.fsm import transition_log
+
+logger = logging.getLogger(__name__)
+
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DURATION_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    labels = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Counter:
+    """
+    Counter with optional labels.
+
+    Updates do not take a lock, with concurrent writers an increment may occasionally be lost.
+    """
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def get(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for label_values, value in list(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets and optional labels.
+
+    Updates do not take a lock, with concurrent writers an observation may occasionally be lost.
+    """
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._buckets = buckets
+        self._series = {}
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series.setdefault(label_values, [[0] * (len(self._buckets) + 1), 0.0])
+        series[0][bisect.bisect_left(self._buckets, value)] += 1
+        series[1] += value
+
+    def count(self, *label_values) -> int:
+        series = self._series.get(label_values)
+
+        return sum(series[0]) if series else 0
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, (counts, total) in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self._buckets + (float("inf"),), list(counts)):
+                cumulative += count
+                bucket = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, label_values, bucket)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labels, label_values)} {cumulative}"
+
+
+class CallbackMetric:
+    """
+    Metric whose value is read from a callback when a snapshot is taken.
+
+    Without labels the callback returns the value, with labels it returns a mapping from label values to values.
+    """
+    def __init__(self, name: str, help: str, callback: Callable[[], Any], labels: Tuple[str, ...] = (),
+                 type: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.type = type
+        self._callback = callback
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type}"
+        if not self.labels:
+            yield f"{self.name} {self._callback()}"
+            return
+
+        for label_values, value in self._callback().items():
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def callback(self, name: str, help: str, callback: Callable[[], Any], labels: Tuple[str, ...] = (),
+                 type: str = "gauge") -> CallbackMetric:
+        return self._register(CallbackMetric(name, help, callback, labels, type))
+
+    def render(self) -> str:
+        """
+        Snapshot of all metrics in the Prometheus text exposition format.
+        """
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+
+        return metric
+
+
+def event_age(event, now: float = None) -> Optional[float]:
+    """
+    Age of an event in seconds based on the timestamp in its metadata, if available.
+    """
+    timestamp = getattr(getattr(event, "metadata", None), "timestamp", None)
+    if not timestamp:
+        return None
+
+    # Timestamps are either in seconds or, as emissor timestamps, in milliseconds
+    if timestamp > 1e11:
+        timestamp = timestamp / 1000
+
+    return (now if now is not None else time.time()) - timestamp
+
+
+class ServiceMetrics:
+    """
+    Metrics of the :class:`GetToKnowYouService`.
+
+    Collects the handling latency and queue wait time per topic, the processing time of face groups,
+    the conversation state transitions, the time from the first face seen until the speaker is published,
+    and the number of dropped frames.
+
+    A snapshot of the metrics is served over HTTP if a `port` is given, and periodically written to `path`
+    if a path is given. Snapshots are only rendered when they are requested or written.
+    """
+    def __init__(self, registry: MetricsRegistry = None, port: int = None, path: str = None, interval: float = 10,
+                 clock: Callable[[], float] = time.perf_counter, max_sessions: int = 1024):
+        self.registry = registry if registry else MetricsRegistry()
+        self._clock = clock
+        self._max_sessions = max_sessions
+
+        self._exporters = []
+        if port:
+            self._exporters.append(MetricsServer(self.registry, port))
+        if path:
+            self._exporters.append(MetricsFileDumper(self.registry, path, interval))
+
+        self.handling_latency = self.registry.histogram("g2ky_event_handling_seconds",
+                                                        "Time to handle an event per topic", ("topic",))
+        self.queue_wait = self.registry.histogram("g2ky_event_queue_wait_seconds",
+                                                  "Time from publishing an event until it is handled",
+                                                  ("topic",))
+        self.group_latency = self.registry.histogram("g2ky_face_group_processing_seconds",
+                                                     "Time to process a face group")
+        self.transitions = self.registry.counter("g2ky_state_transitions_total",
+                                                 "Conversation state transitions", ("from_state", "to_state"))
+        self.time_to_known = self.registry.histogram("g2ky_time_to_known_seconds",
+                                                     "Time from the first face seen until the speaker is published",
+                                                     buckets=DURATION_BUCKETS)
+
+        self._first_seen = OrderedDict()
+
+    def start(self):
+        transition_log.add_listener(self._on_transition)
+        for exporter in self._exporters:
+            exporter.start()
+
+    def stop(self):
+        transition_log.remove_listener(self._on_transition)
+        for exporter in self._exporters:
+            exporter.stop()
+
+    def event_handled(self, topic: str, start: float, age: Optional[float]):
+        self.handling_latency.observe(self._clock() - start, topic)
+        if age is not None:
+            self.queue_wait.observe(age, topic)
+
+    def group_processed(self, start: float):
+        self.group_latency.observe(self._clock() - start)
+
+    def face_seen(self, session_id: Hashable, new_conversation: bool = False):
+        """
+        Record that a face was seen in the session, the time to known starts with the first face seen,
+        or again if the face starts a `new_conversation`.
+        """
+        if new_conversation:
+            self._first_seen.pop(session_id, None)
+        if session_id not in self._first_seen:
+            self._first_seen[session_id] = self._clock()
+            if len(self._first_seen) > self._max_sessions:
+                self._first_seen.popitem(last=False)
+
+    def speaker_published(self, session_id: Hashable):
+        first_seen = self._first_seen.pop(session_id, None)
+        if first_seen is not None:
+            self.time_to_known.observe(self._clock() - first_seen)
+
+    def _on_transition(self, from_state, to_state):
+        self.transitions.inc(from_state.name, to_state.name)
+
+
+def _handler_class(registry: MetricsRegistry):
+    # http.server is only imported when metrics are served
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    return MetricsHandler
+
+
+class MetricsServer:
+    """
+    Serve a snapshot of the metrics over HTTP, rendered only when requested.
+    """
+    def __init__(self, registry: MetricsRegistry, port: int, host: str = "127.0.0.1"):
+        from http.server import ThreadingHTTPServer
+
+        self._server = ThreadingHTTPServer((host, port), _handler_class(registry))
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name=self.__class__.__name__,
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+
+class MetricsFileDumper:
+    """
+    Periodically write a snapshot of the metrics to a file.
+    """
+    def __init__(self, registry: MetricsRegistry, path: str, interval: float = 10):
+        self._registry = registry
+        self._path = path
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.__class__.__name__, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self.dump()
+
+    def dump(self):
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, "w") as metrics_file:
+            metrics_file.write(self._registry.render())
+        os.replace(tmp_path, self._path)
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            try:
+                self.dump()
+            except Exception:
+                logger.exception("Failed to write metrics to %s", self._path)
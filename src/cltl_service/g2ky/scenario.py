@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from cltl.combot.infra.event import Event
+from cltl_service.emissordata.client import EmissorDataClient
+
+logger = logging.getLogger(__name__)
+
+
+class ScenarioIdCache:
+    """
+    Cache of the current scenario id of the :class:`EmissorDataClient`.
+
+    The cache is updated from scenario start and stop events. Cached ids expire after `ttl` seconds,
+    such that the id is refreshed from the client also if scenario events are missed.
+    """
+    def __init__(self, emissor_client: EmissorDataClient, ttl: float = 60,
+                 clock: Callable[[], float] = time.monotonic):
+        self._emissor_client = emissor_client
+        self._ttl = ttl
+        self._clock = clock
+
+        # Replaced as a whole to be read without a lock
+        self._entry = (None, 0.0)
+
+        self.hits = 0
+        self.misses = 0
+
+    def cached(self) -> Optional[str]:
+        """
+        The cached scenario id, or ``None`` if it is not cached or expired, without querying the client.
+        """
+        scenario_id, expires = self._entry
+        if scenario_id is not None and self._clock() < expires:
+            self.hits += 1
+            return scenario_id
+
+        return None
+
+    def get(self) -> Optional[str]:
+        scenario_id, expires = self._entry
+        if scenario_id is not None and self._clock() < expires:
+            self.hits += 1
+            return scenario_id
+
+        self.misses += 1
+        scenario_id = self._emissor_client.get_current_scenario_id()
+        self._set(scenario_id)
+
+        return scenario_id
+
+    def invalidate(self):
+        self._entry = (None, 0.0)
+
+    def update(self, event: Event):
+        """
+        Update the cache from a scenario event.
+        """
+        event_type = getattr(event.payload, "type", None)
+        scenario = getattr(event.payload, "scenario", None)
+        if event_type == "ScenarioStarted" and scenario is not None:
+            self._set(scenario.id)
+            logger.debug("Scenario %s started", scenario.id)
+        else:
+            self.invalidate()
+            logger.debug("Invalidated scenario id on %s", event_type)
+
+    def _set(self, scenario_id: Optional[str]):
+        self._entry = (scenario_id, self._clock() + self._ttl)
+
+
+class SignalScenarios:
+    """
+    Resolve the scenario of signal and annotation events from the events themselves.
+
+    Signals carry their scenario id as the container of their temporal ruler. Annotations only refer to
+    the signal they annotate by the container id of their mention segments, their scenario is looked up from
+    the last `capacity` signals seen.
+    """
+    def __init__(self, capacity: int = 1024):
+        self._capacity = capacity
+        self._signals = OrderedDict()
+        self._lock = threading.Lock()
+
+    def scenario_id(self, event: Event) -> Optional[str]:
+        """
+        The scenario id of the event, or ``None`` if it cannot be derived from the event.
+        """
+        signal = getattr(event.payload, "signal", None)
+        if signal is not None:
+            return self._from_signal(signal)
+
+        for mention in getattr(event.payload, "mentions", None) or ():
+            for segment in mention.segment:
+                scenario_id = self._lookup(getattr(segment, "container_id", None))
+                if scenario_id is not None:
+                    return scenario_id
+
+        return None
+
+    def _from_signal(self, signal) -> Optional[str]:
+        scenario_id = getattr(getattr(signal, "time", None), "container_id", None)
+        signal_id = getattr(signal, "id", None)
+        if scenario_id is not None and signal_id is not None:
+            with self._lock:
+                self._signals[signal_id] = scenario_id
+                self._signals.move_to_end(signal_id)
+                if len(self._signals) > self._capacity:
+                    self._signals.popitem(last=False)
+
+        return scenario_id
+
+    def _lookup(self, signal_id) -> Optional[str]:
+        if signal_id is None:
+            return None
+
+        with self._lock:
+            return self._signals.get(signal_id)
+
+
+def annotated_signal_id(event: Event) -> Optional[str]:
+    """
+    The id of the signal annotated by an annotation event, i.e. the container of its first mention segment.
+    """
+    for mention in getattr(event.payload, "mentions", None) or ():
+        for segment in mention.segment:
+            container_id = getattr(segment, "container_id", None)
+            if container_id is not None:
+                return container_id
+
+    return None
+
+
+class PendingAnnotations:
+    """
+    Annotations that arrived before the signal they annotate, held until the signal arrives.
+
+    The scenario of an annotation is only known from its signal. Annotations are held for at most `timeout`
+    seconds and for at most `capacity` signals, after which they are released without their signal.
+    """
+    def __init__(self, timeout: float = 1.0, capacity: int = 64, clock: Callable[[], float] = time.monotonic):
+        self._timeout = timeout
+        self._capacity = capacity
+        self._clock = clock
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+
+    def arrived(self, event: Event, scenarios: SignalScenarios) -> List[Event]:
+        """
+        The events to process, in order, after `event` arrived.
+
+        Annotations of a signal with unknown scenario are held, the signal is followed by its held annotations.
+        """
+        signal = getattr(event.payload, "signal", None)
+        if signal is not None:
+            return [event] + self.release(signal.id)
+
+        signal_id = annotated_signal_id(event)
+        if signal_id is None or scenarios.scenario_id(event) is not None:
+            return [event]
+
+        return self.hold(signal_id, event)
+
+    def hold(self, signal_id: str, event: Event) -> List[Event]:
+        """
+        Hold the annotation event until its signal arrives.
+
+        Returns the annotations released as more than `capacity` signals are pending.
+        """
+        with self._lock:
+            if signal_id in self._pending:
+                self._pending[signal_id][1].append(event)
+                return []
+
+            self._pending[signal_id] = (self._clock() + self._timeout, [event])
+            released = []
+            while len(self._pending) > self._capacity:
+                released.extend(self._pending.popitem(last=False)[1][1])
+
+        if released:
+            logger.debug("Released %s annotations without their signal", len(released))
+
+        return released
+
+    def release(self, signal_id: str) -> List[Event]:
+        """
+        Release the annotations of a signal once it arrived.
+        """
+        with self._lock:
+            entry = self._pending.pop(signal_id, None)
+
+        return entry[1] if entry else []
+
+    def expired(self) -> List[Event]:
+        """
+        Release the annotations held for longer than `timeout`.
+        """
+        now = self._clock()
+        released = []
+        with self._lock:
+            while self._pending:
+                deadline, events = next(iter(self._pending.values()))
+                if deadline > now:
+                    break
+                self._pending.popitem(last=False)
+                released.extend(events)
+
+        if released:
+            logger.debug("Released %s annotations without their signal", len(released))
+
+        return released
+
+    def __len__(self) -> int:
+        return len(self._pending)
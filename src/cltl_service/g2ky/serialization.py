@@ -0,0 +1,212 @@
+import bz2
+import enum
+import json
+import logging
+import lzma
+import struct
+import zlib
+from types import SimpleNamespace
+from typing import Any, Mapping, Optional, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    import lz4.frame as lz4
+except ImportError:
+    lz4 = None
+
+
+MAGIC = b"G2KB"
+_PREFIX = struct.Struct("<4sBBI")
+_BUFFER_LENGTH = struct.Struct("<Q")
+_ALIGNMENT = 16
+
+_NONE, _ZLIB, _BZ2, _LZMA, _LZ4 = range(5)
+CODECS = {"none": _NONE, "zlib": _ZLIB, "bz2": _BZ2, "lzma": _LZMA, "lz4": _LZ4}
+
+
+def _compress(codec: int, data: bytes) -> bytes:
+    if codec == _ZLIB:
+        return zlib.compress(data, 1)
+    if codec == _BZ2:
+        return bz2.compress(data)
+    if codec == _LZMA:
+        return lzma.compress(data)
+    if codec == _LZ4:
+        return lz4.compress(data)
+
+    return data
+
+
+def _decompress(codec: int, data: memoryview) -> memoryview:
+    if codec == _ZLIB:
+        return memoryview(zlib.decompress(data))
+    if codec == _BZ2:
+        return memoryview(bz2.decompress(data))
+    if codec == _LZMA:
+        return memoryview(lzma.decompress(data))
+    if codec == _LZ4:
+        return memoryview(lz4.decompress(data))
+
+    return data
+
+
+class BinarySerializer:
+    """
+    Binary event serializer that sends NumPy arrays as raw buffers.
+
+    Events are encoded as a JSON header, in which arrays are replaced by a reference with their dtype and shape,
+    followed by the raw array buffers. On decoding the arrays are created with :func:`numpy.frombuffer`
+    on the received message without copying, all other objects are decoded as :class:`SimpleNamespace`
+    like in the `cltl-json` serializer.
+
+    The compression codec can be chosen per topic, the topic is taken from the event metadata. Events without
+    a topic in their metadata are compressed with the default codec. The codec is stored in the message,
+    such that messages can be decoded independent of the configuration.
+
+    With `namespaces` disabled objects are decoded as dictionaries.
+    """
+    def __init__(self, compression: str = "none", topic_compression: Mapping[str, str] = None,
+                 namespaces: bool = True):
+        self._namespaces = namespaces
+        self._codec = self._get_codec(compression)
+        self._topic_codecs = {topic: self._get_codec(codec) for topic, codec in (topic_compression or {}).items()}
+        self._warned = False
+
+    @staticmethod
+    def _get_codec(name: str) -> int:
+        if name not in CODECS:
+            raise ValueError(f"Unsupported compression {name}, supported are {list(CODECS)}")
+        if name == "lz4" and lz4 is None:
+            raise ValueError("Compression lz4 requires the lz4 package")
+
+        return CODECS[name]
+
+    def encode(self, obj: Any) -> bytes:
+        buffers = []
+        header = json.dumps(obj, default=lambda value: self._encode_value(value, buffers)).encode("utf-8")
+
+        body = bytearray(header)
+        for buffer in buffers:
+            body.extend(b"\0" * (-(len(body) + _PREFIX.size + _BUFFER_LENGTH.size) % _ALIGNMENT))
+            body.extend(_BUFFER_LENGTH.pack(buffer.nbytes))
+            body.extend(buffer)
+
+        codec = self._codec_for(obj)
+
+        return _PREFIX.pack(MAGIC, 1, codec, len(header)) + _compress(codec, bytes(body))
+
+    def decode(self, data: bytes) -> Any:
+        data = memoryview(data)
+        magic, version, codec, header_length = _PREFIX.unpack_from(data)
+        if magic != MAGIC or version != 1:
+            raise ValueError("Not a binary G2KY event")
+
+        body = _decompress(codec, data[_PREFIX.size:])
+        buffers = []
+        offset = header_length
+        while offset < len(body):
+            offset += -(offset + _PREFIX.size + _BUFFER_LENGTH.size) % _ALIGNMENT
+            length, = _BUFFER_LENGTH.unpack_from(body, offset)
+            offset += _BUFFER_LENGTH.size
+            buffers.append(body[offset:offset + length])
+            offset += length
+
+        return json.loads(bytes(body[:header_length]),
+                          object_hook=lambda value: self._decode_value(value, buffers, self._namespaces))
+
+    def _codec_for(self, obj: Any) -> int:
+        if not self._topic_codecs:
+            return self._codec
+
+        topic = _get(_get(obj, "metadata"), "topic")
+        if topic is None:
+            if not self._warned:
+                logger.warning("Event without topic, using the default compression instead of the topic compression")
+                self._warned = True
+            return self._codec
+
+        return self._topic_codecs.get(topic, self._codec)
+
+    @staticmethod
+    def _encode_value(value: Any, buffers: List[memoryview]):
+        if isinstance(value, np.ndarray):
+            array = np.ascontiguousarray(value)
+            buffers.append(memoryview(array).cast("B"))
+            return {"__ndarray__": len(buffers) - 1, "dtype": array.dtype.str, "shape": array.shape}
+        if isinstance(value, np.generic):
+            return value.item()
+        if isinstance(value, enum.Enum):
+            return value.name
+
+        return vars(value)
+
+    @staticmethod
+    def _decode_value(value: dict, buffers: List[memoryview], namespaces: bool = True):
+        if "__ndarray__" in value:
+            buffer = buffers[value["__ndarray__"]]
+            return np.frombuffer(buffer, dtype=np.dtype(value["dtype"])).reshape(value["shape"])
+
+        return SimpleNamespace(**value) if namespaces else value
+
+
+def _get(obj: Any, key: str) -> Any:
+    return obj.get(key) if isinstance(obj, Mapping) else getattr(obj, key, None)
+
+
+class _UncompressedConfig:
+    def __init__(self, config):
+        self._config = config
+
+    def __contains__(self, key):
+        return key != "compression" and key in self._config
+
+    def get(self, key, *args, **kwargs):
+        return None if key == "compression" else self._config.get(key, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._config, name)
+
+
+class _UncompressedKombuConfigurationManager:
+    def __init__(self, config_manager):
+        self._config_manager = config_manager
+
+    def get_config(self, name, *args, **kwargs):
+        config = self._config_manager.get_config(name, *args, **kwargs)
+
+        return _UncompressedConfig(config) if name == "cltl.event.kombu" else config
+
+    def __getattr__(self, name):
+        return getattr(self._config_manager, name)
+
+
+def without_kombu_compression(config_manager):
+    """
+    Configuration manager that hides the `compression` of the `cltl.event.kombu` section.
+
+    Used with the `cltl-binary` serializer, which compresses messages itself, such that they are
+    not compressed twice.
+    """
+    return _UncompressedKombuConfigurationManager(config_manager)
+
+
+def register_serializers(compression: str = "none", topic_compression: Mapping[str, str] = None,
+                         serializer: Optional[BinarySerializer] = None):
+    """
+    Register the `cltl-json` and `cltl-binary` serializers with Kombu.
+    """
+    from kombu.serialization import register
+
+    register('cltl-json',
+             lambda x: json.dumps(x, default=vars),
+             lambda x: json.loads(x, object_hook=lambda d: SimpleNamespace(**d)),
+             content_type='application/json',
+             content_encoding='utf-8')
+
+    serializer = serializer if serializer else BinarySerializer(compression, topic_compression)
+    register('cltl-binary', serializer.encode, serializer.decode,
+             content_type='application/x-cltl-binary',
+             content_encoding='binary')
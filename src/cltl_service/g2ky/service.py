@@ -1,53 +1,126 @@
-import dataclasses
 import logging
+import signal
+import threading
+import time
 import uuid
-from typing import Union, Tuple, List, Iterable
+from typing import Union, Tuple, List, Iterable, Callable, Optional, Hashable, TYPE_CHECKING
 
-from cltl.combot.event.bdi import DesireEvent
 from cltl.combot.event.emissor import TextSignalEvent, AnnotationEvent
 from cltl.combot.infra.config import ConfigurationManager
 from cltl.combot.infra.event import Event, EventBus
-from cltl.combot.infra.groupby_processor import GroupProcessor, Group, GroupByProcessor
+from cltl.combot.infra.groupby_processor import Group
 from cltl.combot.infra.resource import ResourceManager
 from cltl.combot.infra.time_util import timestamp_now
 from cltl.combot.infra.topic_worker import TopicWorker
-from cltl.face_recognition.api import Face
-from cltl.nlp.api import Entity, EntityType
-from cltl.vector_id.api import VectorIdentity
 from cltl_service.emissordata.client import EmissorDataClient
 from emissor.representation.scenario import TextSignal, Mention, Annotation, Signal, MultiIndex
 
-from cltl.g2ky.api import GetToKnowYou
+from cltl.g2ky.api import GetToKnowYou, Input
+from cltl_service.g2ky.coalescing import CoalescingQueue
+from cltl_service.g2ky.deadline import DeadlineFilter
+from cltl_service.g2ky.grouping import ExpiringGroupProcessor, TimeoutGroupByProcessor
+from cltl_service.g2ky.metrics import ServiceMetrics, event_age
+from cltl_service.g2ky.scenario import ScenarioIdCache, SignalScenarios, PendingAnnotations
+from cltl_service.g2ky.session import SessionManager
+
+if TYPE_CHECKING:
+    import numpy as np
+    from cltl.face_recognition.api import Face
+    from cltl_service.g2ky.capture import EventRecorder
+    from cltl_service.g2ky.factory import FriendRegistry
+    from cltl_service.g2ky.snapshot import SnapshotStore
+    from cltl_service.g2ky.tracing import Tracer
 
 logger = logging.getLogger(__name__)
 
 
+class FaceRecord:
+    """
+    The fields of a face annotation used by G2KY: the embedding, as view on the received array if possible,
+    and the bounds of the face in the image.
+    """
+    __slots__ = ("embedding", "bounds")
+
+    def __init__(self, embedding: Optional["np.ndarray"], bounds: Optional[Tuple]):
+        self.embedding = embedding
+        self.bounds = bounds
+
+    @classmethod
+    def from_face(cls, face: "Face", bounds: Optional[Tuple]):
+        # numpy is loaded with the visual component, verbal deployments do not need it
+        import numpy as np
+
+        embedding = getattr(face, "embedding", None)
+
+        return cls(np.asarray(embedding).ravel() if embedding is not None else None, bounds)
+
+
 class FaceGroup(Group):
-    def __init__(self, image_id, face_topic, id_topic):
+    def __init__(self, image_id, face_topic, id_topic, session_id: Hashable = None):
         super().__init__()
         self._face_topic = face_topic
         self._id_topic = id_topic
 
         self._img_id = image_id
+        self._session_id = session_id
         self._faces = None
         self._ids = None
 
     @property
-    def key(self) -> str:
+    def key(self) -> Tuple[Hashable, str]:
+        return self._session_id, self._img_id
+
+    @property
+    def image_id(self) -> str:
         return self._img_id
 
+    @property
+    def session_id(self) -> Hashable:
+        return self._session_id
+
     @property
     def complete(self) -> bool:
         return self._faces is not None and self._ids is not None
 
-    def get_persons(self) -> Iterable[Tuple[str, Face]]:
-        if not self.complete:
-            raise ValueError("Not all annotations received")
+    @property
+    def has_faces(self) -> bool:
+        return self._faces is not None
+
+    def get_persons(self) -> Iterable[Tuple[Optional[str], "Face"]]:
+        """
+        Faces in the image with their identifier.
+
+        If the group is incomplete because the identifiers were not received, the faces are returned
+        as strangers with identifier ``None``.
+        """
+        if not self.has_faces:
+            raise ValueError("No faces received")
 
         if self._ids is None:
-            return []
+            return [(None, face) for face in self._faces.values()]
+
+        return [(self._ids.get(key), face) for key, face in self._faces.items()]
 
-        return [(self._ids[key], face) for key, face in self._faces.items()]
+    @property
+    def segment_keys(self) -> List[Tuple[str, Tuple]]:
+        return list(self._faces) if self._faces else []
+
+    def segment_key(self, bounds: Optional[Tuple]) -> Tuple[str, Tuple]:
+        """
+        The container id and bounds of the face with the given bounds, or of the first face if there is none.
+        """
+        if not self._faces:
+            raise ValueError(f"No faces in image {self._img_id}")
+
+        return next((key for key, record in self._faces.items()
+                     if bounds is not None and record.bounds == bounds), next(iter(self._faces)))
+
+    def release(self):
+        """
+        Release the received annotations once the group is processed.
+        """
+        self._faces = None
+        self._ids = None
 
     def add(self, event: Event):
         if event.metadata.topic == self._id_topic:
@@ -56,15 +129,17 @@ class FaceGroup(Group):
             self._set_faces(event.payload.mentions)
 
     def _set_faces(self, mentions: List[Mention]):
-        has_faces = len(mentions) == 1 and mentions[0].annotations and mentions[0].annotations[0].value
-        logger.debug("Received %sface for image %s", "" if has_faces else "no ", self._img_id)
-
-        if not has_faces:
-            self._faces = {}
-            self._ids = []
-        else:
-            self._faces = {self._to_segment_key(mention.segment): self._to_annotation_value(mention.annotations)
-                           for mention in mentions}
+        faces = {}
+        for mention in mentions:
+            face = self._to_annotation_value(mention.annotations) if mention.annotations else None
+            if face:
+                key = self._to_segment_key(mention.segment)
+                faces[key] = FaceRecord.from_face(face, key[1])
+        logger.debug("Received %s faces for image %s", len(faces), self._img_id)
+
+        self._faces = faces
+        if not faces:
+            self._ids = {}
 
     def _set_ids(self, mentions: Iterable[Mention]):
         logger.debug("Received ids for image %s", self._img_id)
@@ -79,7 +154,10 @@ class FaceGroup(Group):
         if len(segments) > 1:
             logger.warning("Got mention with more than one segment: {}", segments)
 
-        return dataclasses.astuple(segments[0])
+        segment = segments[0]
+        bounds = getattr(segment, "bounds", None)
+
+        return segment.container_id, tuple(bounds) if bounds is not None else None
 
     def _to_annotation_value(self, annotations):
         if len(annotations) == 0:
@@ -91,32 +169,202 @@ class FaceGroup(Group):
         return annotations[0].value
 
 
-class GetToKnowYouService(GroupProcessor):
+def create_response_payload(response: str, scenario_id: str) -> TextSignalEvent:
+    signal = TextSignal.for_scenario(scenario_id, timestamp_now(), timestamp_now(), None, response)
+
+    return TextSignalEvent.for_agent(signal)
+
+
+def create_speaker_payload(signal: Signal, id: str, name: str) -> AnnotationEvent:
+    offset = signal.ruler
+    if hasattr(signal, 'text'):
+        segment_start = signal.text.find(name)
+        if segment_start >= 0:
+            offset = signal.ruler.get_offset(segment_start, segment_start + len(name))
+
+    return _speaker_annotation(offset, id, name)
+
+
+def create_image_speaker_payload(img_id: str, bbox, id: str, name: str) -> AnnotationEvent:
+    return _speaker_annotation(MultiIndex(img_id, bbox), id, name)
+
+
+def _speaker_annotation(offset, id: str, name: str) -> AnnotationEvent:
+    # Only needed once a speaker is known
+    from cltl.nlp.api import Entity, EntityType
+    from cltl.vector_id.api import VectorIdentity
+
+    ts = timestamp_now()
+
+    id_annotations = [Annotation(VectorIdentity.__name__, id, __name__, ts),
+                      Annotation(Entity.__name__, Entity(name, EntityType.SPEAKER, offset), __name__, ts)]
+
+    return AnnotationEvent.create([Mention(str(uuid.uuid4()), [offset], id_annotations)])
+
+
+def get_image_id(mentions: Iterable[Mention]) -> str:
+    image_ids = {segment.container_id
+                 for mention in mentions
+                 for segment in mention.segment}
+
+    if len(image_ids) != 1:
+        raise ValueError("Expected exactly on image container, was %s", len(image_ids))
+
+    return next(iter(image_ids))
+
+
+class GetToKnowYouService(ExpiringGroupProcessor):
     """
     Service used to integrate the component into applications.
+
+    The service either wraps a single :class:`GetToKnowYou` instance, or, if a :class:`SessionManager`
+    is provided, serves one conversation per scenario id. The scenario of an event is taken from its signal,
+    or from the image signal annotated by face and id events, and falls back to the current scenario id.
+    Face and id events that arrive before their image signal are held until it arrives, for at most the
+    `group_timeout`.
+
+    With `coalesce_frames` enabled, events are handled on a separate processing thread that drains the
+    queued events in batches and only processes the latest complete :class:`FaceGroup` of each session.
+
+    Face groups that are not complete within `group_timeout` seconds are processed with the received
+    faces as strangers, or dropped if no faces were received.
+
+    If an :class:`EventRecorder` is provided, all consumed and published events are captured, together with
+    the timer ticks and the events dropped by the deadline filter. An :class:`EventReplayer` reproduces the
+    processing of the log if its timestamps are used as the `clock` of the face group deadlines.
+
+    If :class:`ServiceMetrics` are provided, event handling is instrumented, otherwise no measurements are taken.
+    Likewise, methods are only wrapped for tracing if a :class:`Tracer` is provided.
+
+    Camera topics are only subscribed if the component supports face input, and face groups are only started
+    for sessions that need faces in their current state.
+
+    The current scenario id is cached for `scenario_ttl` seconds, and updated from the events on the
+    `scenario_topic` if provided.
+
+    If a :class:`SnapshotStore` is provided, the state of a session is written on each transition and
+    the stored sessions are restored when the service starts. Stored friends are restored into the
+    :class:`FriendRegistry` shared by the sessions, if provided.
+
+    If a :class:`DeadlineFilter` is provided, stale events are dropped before they are grouped or processed.
     """
     @classmethod
-    def from_config(cls, g2ky: GetToKnowYou, emissor_client: EmissorDataClient,
+    def from_config(cls, g2ky: Union[GetToKnowYou, Callable[[], GetToKnowYou]], emissor_client: EmissorDataClient,
                     event_bus: EventBus, resource_manager: ResourceManager,
-                    config_manager: ConfigurationManager):
+                    config_manager: ConfigurationManager, friends: "FriendRegistry" = None):
+        """
+        Create the service from configuration.
+
+        If `g2ky` is a factory instead of a :class:`GetToKnowYou` instance, a session is created per scenario
+        using the settings in the `cltl.g2ky.sessions` configuration section. The `friends` shared by the
+        components are restored from snapshots, if configured.
+        """
         config = config_manager.get_config("cltl.g2ky.events")
 
         intention_topic = config.get("topic_intention") if "topic_intention" in config else None
         desire_topic = config.get("topic_desire") if "topic_desire" in config else None
+        scenario_topic = config.get("topic_scenario") if "topic_scenario" in config else None
         intentions = config.get("intentions", multi=True) if "intentions" in config else []
 
+        sessions = None
+        if not isinstance(g2ky, GetToKnowYou):
+            session_config = config_manager.get_config("cltl.g2ky.sessions")
+            max_sessions = session_config.get_int("max_sessions") if "max_sessions" in session_config else 64
+            ttl = session_config.get_float("ttl") if "ttl" in session_config else None
+            sessions = SessionManager(g2ky, max_sessions=max_sessions, ttl=ttl)
+            g2ky = None
+
+        processing_config = config_manager.get_config("cltl.g2ky.processing")
+        coalesce_frames = (processing_config.get_boolean("coalesce_frames")
+                           if "coalesce_frames" in processing_config else False)
+        group_timeout = processing_config.get_float("group_timeout") if "group_timeout" in processing_config else 1.0
+        scenario_ttl = processing_config.get_float("scenario_ttl") if "scenario_ttl" in processing_config else 60
+        capture_path = processing_config.get("capture_path") if "capture_path" in processing_config else None
+        recorder = None
+        if capture_path:
+            from cltl_service.g2ky.capture import EventRecorder
+            recorder = EventRecorder(capture_path)
+
+        metrics = None
+        metrics_config = config_manager.get_config("cltl.g2ky.metrics")
+        port = metrics_config.get_int("port") if "port" in metrics_config else None
+        path = metrics_config.get("path") if "path" in metrics_config else None
+        if port or path:
+            interval = metrics_config.get_float("interval") if "interval" in metrics_config else 10
+            metrics = ServiceMetrics(port=port, path=path, interval=interval)
+
+        tracer = None
+        tracing_config = config_manager.get_config("cltl.g2ky.tracing")
+        if "enabled" in tracing_config and tracing_config.get_boolean("enabled"):
+            from cltl_service.g2ky.tracing import Tracer
+            tracer = Tracer(
+                sample_rate=tracing_config.get_float("sample_rate") if "sample_rate" in tracing_config else 1.0,
+                path=tracing_config.get("path") if "path" in tracing_config else None,
+                control_topic=tracing_config.get("topic_control") if "topic_control" in tracing_config else None,
+                profile_path=tracing_config.get("profile_path") if "profile_path" in tracing_config else "g2ky.prof",
+                profile_seconds=(tracing_config.get_float("profile_seconds")
+                                 if "profile_seconds" in tracing_config else 10))
+            if "profile_signal" in tracing_config:
+                try:
+                    tracer.install_signal_handler(signal.Signals[tracing_config.get("profile_signal")])
+                except ValueError:
+                    logger.warning("Profiling signal can only be installed from the main thread")
+
+        snapshots = None
+        snapshot_config = config_manager.get_config("cltl.g2ky.snapshots")
+        if "path" in snapshot_config:
+            from cltl_service.g2ky.snapshot import SnapshotStore
+            compact_after = snapshot_config.get_int("compact_after") if "compact_after" in snapshot_config else 1000
+            snapshots = SnapshotStore(snapshot_config.get("path"), compact_after=compact_after)
+
+        deadlines = None
+        deadline_config = config_manager.get_config("cltl.g2ky.deadlines")
+        camera_max_age = deadline_config.get_float("camera_max_age") if "camera_max_age" in deadline_config else None
+        utterance_max_age = (deadline_config.get_float("utterance_max_age")
+                             if "utterance_max_age" in deadline_config else None)
+        if camera_max_age is not None or utterance_max_age is not None:
+            max_ages = {}
+            if camera_max_age is not None:
+                max_ages.update({topic: camera_max_age for topic in (config.get("topic_image"),
+                                                                     config.get("topic_face"),
+                                                                     config.get("topic_id"))})
+            if utterance_max_age is not None:
+                max_ages[config.get("topic_utterance")] = utterance_max_age
+            priority = deadline_config.get_boolean("priority") if "priority" in deadline_config else True
+            priority_topics = (config.get("topic_utterance"), intention_topic) if priority else ()
+            priority_timeout = (deadline_config.get_float("priority_timeout")
+                                if "priority_timeout" in deadline_config else 1.0)
+            deadlines = DeadlineFilter(max_ages, priority_topics=priority_topics, priority_timeout=priority_timeout,
+                                       group_topics=(config.get("topic_image"), config.get("topic_face"),
+                                                     config.get("topic_id")))
+
         return cls(config.get("topic_utterance"), config.get("topic_image"), config.get("topic_face"),
                    config.get("topic_id"), config.get("topic_response"), config.get("topic_speaker"),
                    intention_topic, desire_topic, intentions,
-                   g2ky, emissor_client, event_bus, resource_manager)
+                   g2ky, emissor_client, event_bus, resource_manager, sessions=sessions,
+                   coalesce_frames=coalesce_frames, group_timeout=group_timeout, recorder=recorder,
+                   metrics=metrics, tracer=tracer, scenario_topic=scenario_topic, scenario_ttl=scenario_ttl,
+                   snapshots=snapshots, deadlines=deadlines, friends=friends)
 
     def __init__(self, utterance_topic: str, image_topic: str, face_topic: str, id_topic: str, response_topic: str,
                  speaker_topic: str, intention_topic: str, desire_topic: str, intentions: List[str],
-                 g2ky: GetToKnowYou, emissor_client: EmissorDataClient,
-                 event_bus: EventBus, resource_manager: ResourceManager):
-        self._g2ky = g2ky
+                 g2ky: Optional[GetToKnowYou], emissor_client: EmissorDataClient,
+                 event_bus: EventBus, resource_manager: ResourceManager, sessions: SessionManager = None,
+                 coalesce_frames: bool = False, group_timeout: float = 1.0, recorder: "EventRecorder" = None,
+                 metrics: ServiceMetrics = None, tracer: "Tracer" = None, scenario_topic: str = None,
+                 scenario_ttl: float = 60, snapshots: "SnapshotStore" = None, deadlines: DeadlineFilter = None,
+                 friends: "FriendRegistry" = None, clock: Callable[[], float] = time.monotonic):
+        if g2ky is None and sessions is None:
+            raise ValueError("Either a GetToKnowYou instance or a SessionManager is required")
+
+        self._multi_session = sessions is not None
+        self._sessions = sessions if sessions is not None else SessionManager.for_instance(g2ky)
 
         self._emissor_client = emissor_client
+        self._scenario_ids = ScenarioIdCache(emissor_client, ttl=scenario_ttl)
+        self._signal_scenarios = SignalScenarios()
+        # Annotations that arrive before their image are held until its scenario is known
+        self._pending = PendingAnnotations(timeout=group_timeout, clock=clock) if self._multi_session else None
         self._event_bus = event_bus
         self._resource_manager = resource_manager
 
@@ -128,21 +376,71 @@ class GetToKnowYouService(GroupProcessor):
         self._speaker_topic = speaker_topic
         self._intention_topic = intention_topic
         self._desire_topic = desire_topic
+        self._scenario_topic = scenario_topic
         self._intentions = intentions
 
         self._topic_worker = None
         self._app = None
 
-        self._face_processor = GroupByProcessor(self, max_size=4, buffer_size=16)
+        self._queue = CoalescingQueue() if coalesce_frames else None
+        self._recorder = recorder
+        self._processing_thread = None
+
+        self._face_input = Input.FACES in self._sessions.supported_inputs
+        self._face_processor = TimeoutGroupByProcessor(self, max_size=4 * self._sessions.max_sessions,
+                                                       timeout=group_timeout, clock=clock, accept=self._needs_faces)
+
+        self._metrics = metrics
+        if metrics:
+            metrics.registry.callback("g2ky_dropped_frames_total", "Frames dropped before processing",
+                                      self._dropped_frame_counts, labels=("reason",), type="counter")
+            metrics.registry.callback("g2ky_sessions", "Active conversation sessions", lambda: len(self._sessions))
+            metrics.registry.callback("g2ky_scenario_id_cache_total", "Scenario id cache lookups",
+                                      lambda: {("hit",): self._scenario_ids.hits, ("miss",): self._scenario_ids.misses},
+                                      labels=("result",), type="counter")
+
+        self._snapshots = snapshots
+        self._friends = friends
+
+        self._deadlines = deadlines
+        if metrics and deadlines:
+            metrics.registry.callback("g2ky_shed_events_total", "Events dropped as stale or preempted",
+                                      lambda: deadlines.dropped, labels=("topic", "reason"), type="counter")
+
+        self._tracer = tracer
+        if tracer:
+            tracer.instrument(self)
 
     def start(self, timeout=30):
-        topics = [self._utterance_topic, self._image_topic, self._face_topic, self._id_topic, self._intention_topic]
+        if self._snapshots:
+            if self._friends:
+                self._restore_friends()
+            self._restore_sessions()
+
+        if self._metrics:
+            self._metrics.start()
+
+        topics = [self._utterance_topic, self._intention_topic]
+        if self._face_input:
+            topics += [self._image_topic, self._face_topic, self._id_topic]
+        if self._scenario_topic:
+            topics.append(self._scenario_topic)
+        if self._tracer and self._tracer.control_topic:
+            topics.append(self._tracer.control_topic)
+        if self._deadlines:
+            # Registered before the topic worker to see priority events before they are queued
+            for topic in self._deadlines.priority_topics:
+                self._event_bus.subscribe(topic, self._deadlines.received)
         self._topic_worker = TopicWorker(topics, self._event_bus,
                                          provides=[self._speaker_topic, self._response_topic],
                                          resource_manager=self._resource_manager,
                                          intention_topic=self._intention_topic, intentions=self._intentions,
                                          scheduled=1, buffer_size=16,
                                          processor=self._process, name=self.__class__.__name__)
+        if self._queue is not None:
+            self._processing_thread = threading.Thread(target=self._run_coalesced, daemon=True,
+                                                       name=f"{self.__class__.__name__}-processing")
+            self._processing_thread.start()
         self._topic_worker.start().wait()
 
     def stop(self):
@@ -153,105 +451,263 @@ class GetToKnowYouService(GroupProcessor):
         self._topic_worker.await_stop()
         self._topic_worker = None
 
+        if self._deadlines:
+            for topic in self._deadlines.priority_topics:
+                self._event_bus.unsubscribe(topic, self._deadlines.received)
+
+        if self._processing_thread:
+            self._queue.close()
+            self._processing_thread.join()
+            self._processing_thread = None
+
+        if self._recorder:
+            self._recorder.close()
+
+        if self._metrics:
+            self._metrics.stop()
+
+        if self._tracer:
+            self._tracer.close()
+
+        if self._snapshots:
+            self._snapshots.close()
+
+    def _restore_friends(self):
+        start = time.perf_counter()
+        # Spoken names are only matched by components without face input
+        self._snapshots.restore_friends(self._friends.friend_store,
+                                        embedding_index=self._friends.embedding_index if self._face_input else None,
+                                        name_index=self._friends.name_index if not self._face_input else None)
+        logger.info("Restored %s friends in %.1f ms", len(self._snapshots.friends),
+                    1000 * (time.perf_counter() - start))
+
+    def _restore_sessions(self):
+        start = time.perf_counter()
+        sessions = self._snapshots.sessions
+        for session_id, snapshot in sessions.items():
+            self._sessions.get(session_id).restore(snapshot)
+        logger.info("Restored %s sessions in %.1f ms", len(sessions), 1000 * (time.perf_counter() - start))
+
+    def _checkpoint(self, session_id: Hashable, g2ky: GetToKnowYou, before):
+        if self._snapshots and g2ky.state.conv_state is not before:
+            self._snapshots.write_session(session_id, g2ky.snapshot())
+
+    @property
+    def dropped_frames(self) -> int:
+        return self._queue.dropped if self._queue is not None else 0
+
+    @property
+    def scenario_ids(self) -> ScenarioIdCache:
+        return self._scenario_ids
+
+    @property
+    def face_groups(self) -> TimeoutGroupByProcessor:
+        return self._face_processor
+
+    def _dropped_frame_counts(self):
+        counts = {("coalesced",): self.dropped_frames,
+                  ("expired",): self._face_processor.expired,
+                  ("evicted",): self._face_processor.evicted,
+                  ("late",): self._face_processor.late,
+                  ("filtered",): self._face_processor.filtered}
+        if self._recorder:
+            counts[("capture",)] = self._recorder.dropped
+
+        return counts
+
     def _process(self, event: Event[Union[TextSignalEvent, AnnotationEvent]]):
+        if self._deadlines and event is not None and not self._deadlines.admit(event):
+            if self._recorder:
+                from cltl_service.g2ky.capture import Direction
+                self._recorder.record(Direction.SHED, event.metadata.topic, event)
+            return
+
+        if not self._metrics or event is None:
+            self._ingest(event)
+            return
+
+        start = time.perf_counter()
+        age = event_age(event)
+        self._ingest(event)
+        self._metrics.event_handled(event.metadata.topic, start, age)
+
+    def _needs_faces(self, key: Tuple[Hashable, str]) -> bool:
+        session_id, _ = key
+
+        return Input.FACES in self._sessions.get(session_id).inputs
+
+    def _ingest(self, event: Optional[Event[Union[TextSignalEvent, AnnotationEvent]]]):
+        if self._recorder:
+            from cltl_service.g2ky.capture import Direction
+            if event is None:
+                self._recorder.record(Direction.TICK, "", None)
+            else:
+                self._recorder.record(Direction.CONSUMED, event.metadata.topic, event)
+
+        if event is None:
+            for annotation in self._pending.expired() if self._pending is not None else ():
+                self._face_processor.process(annotation)
+            self._face_processor.expire()
+
+        if event is not None and event.metadata.topic == self._scenario_topic:
+            self._scenario_ids.update(event)
+        elif event is not None and event.metadata.topic in [self._image_topic, self._id_topic, self._face_topic]:
+            for camera_event in self._camera_events(event):
+                self._face_processor.process(camera_event)
+        elif self._queue is not None:
+            self._queue.put(event)
+        else:
+            self._handle_event(event)
+
+    def _camera_events(self, event: Event) -> List[Event]:
+        if self._pending is None:
+            return [event]
+
+        return self._pending.arrived(event, self._signal_scenarios)
+
+    def _run_coalesced(self):
+        while not self._queue.closed:
+            for item in self._queue.drain(timeout=1):
+                try:
+                    if isinstance(item, FaceGroup):
+                        self._process_group(item)
+                    else:
+                        self._handle_event(item)
+                except Exception:
+                    logger.exception("Failed to process %s", item)
+
+    def _handle_event(self, event: Optional[Event[Union[TextSignalEvent, AnnotationEvent]]]):
+        if event is None:
+            for session_id, g2ky in self._sessions.sessions():
+                before = g2ky.state.conv_state
+                self._publish_response(session_id, g2ky.response())
+                self._checkpoint(session_id, g2ky, before)
+            self._sessions.evict_expired()
+            return
+
+        session_id = self._get_session_id(event)
+        g2ky = self._sessions.get(session_id)
+        before = g2ky.state.conv_state
+
         response = None
-        if event is None or self._is_g2ky_intention(event):
-            response = self._g2ky.response()
+        if self._is_g2ky_intention(event):
+            response = g2ky.response()
         elif event.metadata.topic == self._utterance_topic:
-            response = self._g2ky.utterance_detected(event.payload.signal.text)
-        elif event.metadata.topic in [self._image_topic, self._id_topic, self._face_topic]:
-            self._face_processor.process(event)
+            response = g2ky.utterance_detected(event.payload.signal.text)
 
-        if response:
-            response_payload = self._create_payload(response)
-            self._event_bus.publish(self._response_topic, Event.for_payload(response_payload))
+        self._publish_response(session_id, response)
 
-        id, name = self._g2ky.speaker
+        id, name = g2ky.speaker
         # TODO remember the right utterance
-        if id and name and event and event.metadata.topic in [self._utterance_topic]:
+        if id and name and event.metadata.topic in [self._utterance_topic]:
             speaker_event = self._create_speaker_payload(event.payload.signal, id, name)
-            self._event_bus.publish(self._speaker_topic, Event.for_payload(speaker_event))
-            if self._desire_topic:
-                self._event_bus.publish(self._desire_topic, Event.for_payload(DesireEvent(["resolved"])))
+            self._publish_speaker(session_id, g2ky, speaker_event)
+
+        self._checkpoint(session_id, g2ky, before)
+        logger.debug("Found %s, %s, response: %s (session %s)", id, name, response, session_id)
 
-            self._g2ky.clear()
+    def _publish(self, topic: str, event: Event):
+        self._event_bus.publish(topic, event)
+        if self._recorder:
+            from cltl_service.g2ky.capture import Direction
+            self._recorder.record(Direction.PUBLISHED, topic, event)
+
+    def _publish_response(self, session_id: Hashable, response: Optional[str]):
+        if response:
+            response_payload = self._create_payload(response, session_id)
+            self._publish(self._response_topic, Event.for_payload(response_payload))
+
+    def _publish_speaker(self, session_id: Hashable, g2ky: GetToKnowYou, speaker_event: AnnotationEvent):
+        self._publish(self._speaker_topic, Event.for_payload(speaker_event))
+        if self._desire_topic:
+            from cltl.combot.event.bdi import DesireEvent
+            self._publish(self._desire_topic, Event.for_payload(DesireEvent(["resolved"])))
+        if self._metrics:
+            self._metrics.speaker_published(session_id)
+        if self._snapshots:
+            prototype = getattr(g2ky.state, "prototype", None)
+            id, name = g2ky.speaker
+            self._snapshots.add_friend(id, name, prototype.embeddings if prototype is not None else None)
+
+        g2ky.clear()
+        if not self._multi_session:
+            # Buffered events may belong to other sessions when running multiple sessions
             self._topic_worker.clear()
+            if self._queue is not None:
+                self._queue.clear()
+
+    def _get_session_id(self, event: Event) -> Hashable:
+        if not self._multi_session:
+            return None
 
-        if event:
-            logger.debug("Found %s, %s, response: %s", id, name, response)
+        scenario_id = self._signal_scenarios.scenario_id(event)
+
+        return scenario_id if scenario_id else self._scenario_ids.get()
 
     def _is_g2ky_intention(self, event):
         return (event.metadata.topic == self._intention_topic
                 and hasattr(event.payload, "intentions")
                 and any('g2ky' == intention.label for intention in event.payload.intentions))
 
-    def _create_payload(self, response):
-        scenario_id = self._emissor_client.get_current_scenario_id()
-        signal = TextSignal.for_scenario(scenario_id, timestamp_now(), timestamp_now(), None, response)
-
-        return TextSignalEvent.for_agent(signal)
+    def _create_payload(self, response, session_id: Hashable = None):
+        return create_response_payload(response, session_id if session_id else self._scenario_ids.get())
 
     def _create_speaker_payload(self, signal: Signal, id, name):
-        offset = signal.ruler
-        if hasattr(signal, 'text'):
-            segment_start = signal.text.find(name)
-            if segment_start >= 0:
-                offset = signal.ruler.get_offset(segment_start, segment_start + len(name))
-
-        ts = timestamp_now()
+        return create_speaker_payload(signal, id, name)
 
-        id_annotations = [Annotation(VectorIdentity.__name__, id, __name__, ts),
-                          Annotation(Entity.__name__, Entity(name, EntityType.SPEAKER, offset), __name__, ts)]
+    def new_group(self, key: Tuple[Hashable, str]) -> FaceGroup:
+        session_id, image_id = key
 
-        return AnnotationEvent.create([Mention(str(uuid.uuid4()), [offset], id_annotations)])
-
-    def new_group(self, image_id) -> FaceGroup:
-        return FaceGroup(image_id, self._face_topic, self._id_topic)
+        return FaceGroup(image_id, self._face_topic, self._id_topic, session_id=session_id)
 
     def process_group(self, group: FaceGroup):
-        logger.debug("Processing faces for image %s", group.key)
-        response = self._g2ky.persons_detected(group.get_persons())
-        if response:
-            response_payload = self._create_payload(response)
-            self._event_bus.publish(self._response_topic, Event.for_payload(response_payload))
+        if self._queue is not None:
+            self._queue.put_frame(group.session_id, group)
+        else:
+            self._process_group(group)
 
-        id, name = self._g2ky.speaker
+    def expire_group(self, group: FaceGroup):
+        if group.has_faces:
+            logger.debug("Processing incomplete face group for image %s", group.image_id)
+            self.process_group(group)
+        else:
+            logger.debug("Ignored face group without faces for image %s", group.image_id)
+
+    def _process_group(self, group: FaceGroup):
+        logger.debug("Processing faces for image %s in session %s", group.image_id, group.session_id)
+        start = time.perf_counter() if self._metrics else None
+
+        g2ky = self._sessions.get(group.session_id)
+        before = g2ky.state.conv_state
+        persons = group.get_persons()
+        if self._metrics and persons:
+            # A person that left without becoming known does not count towards the next conversation
+            self._metrics.face_seen(group.session_id, new_conversation=before.name == "START")
+        response = g2ky.persons_detected(persons)
+        self._publish_response(group.session_id, response)
+
+        id, name = g2ky.speaker
         logger.debug("Found %s, %s, response: %s", id, name, response)
         if id and name:
-            assert len(group._faces) > 0
-            face_key = next(iter(group._faces))
-            speaker_event = self._create_speaker_payload_for_img(face_key[0], face_key[1], id, name)
-            self._event_bus.publish(self._speaker_topic, Event.for_payload(speaker_event))
-            if self._desire_topic:
-                self._event_bus.publish(self._desire_topic, Event.for_payload(DesireEvent(["resolved"])))
-
-            self._g2ky.clear()
-            self._topic_worker.clear()
+            img_id, bbox = group.segment_key(g2ky.focus)
+            speaker_event = self._create_speaker_payload_for_img(img_id, bbox, id, name)
+            self._publish_speaker(group.session_id, g2ky, speaker_event)
 
-    def _create_speaker_payload_for_img(self, img_id, bbox, id, name):
-        offset = MultiIndex(img_id, bbox)
+        self._checkpoint(group.session_id, g2ky, before)
+        group.release()
+        if start is not None:
+            self._metrics.group_processed(start)
 
-        ts = timestamp_now()
-
-        id_annotations = [Annotation(VectorIdentity.__name__, id, __name__, ts),
-                          Annotation(Entity.__name__, Entity(name, EntityType.SPEAKER, offset), __name__, ts)]
-
-        return AnnotationEvent.create([Mention(str(uuid.uuid4()), [offset], id_annotations)])
+    def _create_speaker_payload_for_img(self, img_id, bbox, id, name):
+        return create_image_speaker_payload(img_id, bbox, id, name)
 
-    def get_key(self, event: Event) -> str:
+    def get_key(self, event: Event) -> Optional[Tuple[Hashable, str]]:
         if event.metadata.topic == self._image_topic:
-            return event.payload.signal.id
+            return self._get_session_id(event), event.payload.signal.id
         elif event.metadata.topic in [self._id_topic, self._face_topic]:
-            return self._get_image_id(event.payload.mentions)
+            return self._get_session_id(event), self._get_image_id(event.payload.mentions)
 
         return None
 
     def _get_image_id(self, mentions: Iterable[Mention]) -> str:
-        image_ids = {segment.container_id
-                     for mention in mentions
-                     for segment in mention.segment}
-
-        if len(image_ids) != 1:
-            raise ValueError("Expected exactly on image container, was %s", len(image_ids))
-
-        return next(iter(image_ids))
+        return get_image_id(mentions)
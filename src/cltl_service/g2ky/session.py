@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Hashable, Iterable, Tuple, FrozenSet
+
+from cltl.g2ky.api import GetToKnowYou, Input
+
+logger = logging.getLogger(__name__)
+
+
+class SessionManager:
+    """
+    Holds the conversation state of multiple concurrent sessions, keyed by scenario id.
+
+    Sessions are created lazily by the provided factory and are evicted when the number of
+    sessions exceeds ``max_sessions`` (least recently used first) or when they were not used
+    for longer than ``ttl`` seconds.
+
+    The inputs supported by the sessions are taken from ``supported_inputs`` if provided, otherwise from the
+    factory if it is a :class:`GetToKnowYou` class.
+    """
+    def __init__(self, factory: Callable[[], GetToKnowYou], max_sessions: int = 64, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic, supported_inputs: FrozenSet[Input] = None):
+        if max_sessions < 1:
+            raise ValueError(f"max_sessions must be positive, was {max_sessions}")
+
+        self._factory = factory
+        self._max_sessions = max_sessions
+        self._ttl = ttl
+        self._clock = clock
+        self._supported_inputs = (supported_inputs if supported_inputs is not None
+                                  else getattr(factory, "supported_inputs", frozenset(Input)))
+
+        self._sessions = OrderedDict()
+        self._lock = threading.RLock()
+
+    @classmethod
+    def for_instance(cls, g2ky: GetToKnowYou):
+        """
+        Create a SessionManager that serves a single, shared :class:`GetToKnowYou` instance.
+        """
+        manager = cls(lambda: g2ky, max_sessions=1, supported_inputs=g2ky.supported_inputs)
+        manager.get(None)
+
+        return manager
+
+    @property
+    def max_sessions(self) -> int:
+        return self._max_sessions
+
+    @property
+    def supported_inputs(self) -> FrozenSet[Input]:
+        return self._supported_inputs
+
+    def get(self, session_id: Hashable) -> GetToKnowYou:
+        with self._lock:
+            now = self._clock()
+            if session_id in self._sessions:
+                g2ky, _ = self._sessions.pop(session_id)
+            else:
+                g2ky = self._factory()
+                logger.debug("Created session %s", session_id)
+
+            self._sessions[session_id] = (g2ky, now)
+            self._evict(now)
+
+            return g2ky
+
+    def peek(self, session_id: Hashable) -> Optional[GetToKnowYou]:
+        """
+        Get the session if it exists, without creating it or refreshing the time it was last used.
+        """
+        with self._lock:
+            entry = self._sessions.get(session_id)
+
+            return entry[0] if entry else None
+
+    def remove(self, session_id: Hashable) -> Optional[GetToKnowYou]:
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+
+            return entry[0] if entry else None
+
+    def sessions(self) -> Iterable[Tuple[Hashable, GetToKnowYou]]:
+        with self._lock:
+            return [(session_id, g2ky) for session_id, (g2ky, _) in self._sessions.items()]
+
+    def evict_expired(self):
+        with self._lock:
+            self._evict(self._clock())
+
+    def _evict(self, now: float):
+        while len(self._sessions) > self._max_sessions:
+            session_id, _ = self._sessions.popitem(last=False)
+            logger.debug("Evicted least recently used session %s", session_id)
+
+        if self._ttl is None:
+            return
+
+        while self._sessions:
+            session_id, (_, last_used) = next(iter(self._sessions.items()))
+            if now - last_used <= self._ttl:
+                break
+            self._sessions.popitem(last=False)
+            logger.debug("Evicted idle session %s", session_id)
+
+    def __contains__(self, session_id: Hashable) -> bool:
+        return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
@@ -0,0 +1,548 @@
+import bisect
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Hashable, Iterable, List, Optional, Dict, Any
+
+from cltl.combot.infra.config import ConfigurationManager
+from cltl.combot.infra.event import Event, EventBus
+from cltl_service.emissordata.client import EmissorDataClient
+
+from cltl.g2ky.api import GetToKnowYou
+from cltl_service.g2ky.scenario import ScenarioIdCache, SignalScenarios, PendingAnnotations
+from cltl_service.g2ky.service import GetToKnowYouService
+from cltl_service.g2ky.session import SessionManager
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(key: str) -> int:
+    # Stable across processes, unlike the built-in hash of strings
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring that maps keys to nodes.
+
+    Each node is placed on the ring `replicas` times, such that adding or removing a node only moves
+    the keys of about ``1 / len(nodes)`` of the ring.
+    """
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 64):
+        self._replicas = replicas
+        self._hashes = []
+        self._nodes = []
+
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> List[str]:
+        return sorted(set(self._nodes))
+
+    def add(self, node: str):
+        if node in self._nodes:
+            raise ValueError(f"Node {node} is already on the ring")
+
+        for replica in range(self._replicas):
+            point = _hash(f"{node}#{replica}")
+            idx = bisect.bisect(self._hashes, point)
+            self._hashes.insert(idx, point)
+            self._nodes.insert(idx, node)
+
+    def remove(self, node: str):
+        if node not in self._nodes:
+            raise ValueError(f"Node {node} is not on the ring")
+
+        points = [(point, owner) for point, owner in zip(self._hashes, self._nodes) if owner != node]
+        self._hashes = [point for point, _ in points]
+        self._nodes = [owner for _, owner in points]
+
+    def node_for(self, key: Hashable) -> str:
+        if not self._hashes:
+            raise ValueError("No nodes on the ring")
+
+        idx = bisect.bisect(self._hashes, _hash(str(key))) % len(self._hashes)
+
+        return self._nodes[idx]
+
+    def __len__(self) -> int:
+        return len(set(self._nodes))
+
+
+class _ForwardingBus(EventBus):
+    """
+    Event bus of a worker process that passes published events to the supervisor.
+    """
+    def __init__(self, output: multiprocessing.Queue):
+        self._output = output
+
+    def publish(self, topic: str, event: Event):
+        self._output.put(("publish", topic, event))
+
+    def subscribe(self, topic, handler):
+        pass
+
+    def unsubscribe(self, topic, handler=None):
+        pass
+
+
+class _NoScenario:
+    def get_current_scenario_id(self):
+        return None
+
+
+class _ShardService(GetToKnowYouService):
+    """
+    Service of a worker process, the session of each event is resolved by the supervisor.
+
+    The friends learned in a session are kept, such that they move along with the session to another worker.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session_id = None
+        # Early annotations are held by the supervisor
+        self._pending = None
+        self.friends = defaultdict(dict)
+
+    def export_session(self, session_id: Hashable) -> Optional[Dict[str, Any]]:
+        g2ky = self._sessions.remove(session_id)
+        friends = self.friends.pop(session_id, {})
+        if g2ky is None:
+            return None
+
+        return {"state": g2ky.snapshot(),
+                "friends": [(identifier, name, embeddings) for identifier, (name, embeddings) in friends.items()]}
+
+    def import_session(self, session_id: Hashable, exported: Dict[str, Any]):
+        g2ky = self._sessions.get(session_id)
+        for identifier, name, embeddings in exported["friends"]:
+            g2ky.add_friend(identifier, name, embeddings)
+            self.friends[session_id][identifier] = (name, embeddings)
+        g2ky.restore(exported["state"])
+
+    def _get_session_id(self, event: Event) -> Hashable:
+        return self.session_id
+
+    def _publish_speaker(self, session_id: Hashable, g2ky: GetToKnowYou, speaker_event):
+        identifier, name = g2ky.speaker
+        prototype = getattr(g2ky.state, "prototype", None)
+        self.friends[session_id][identifier] = (name, prototype.embeddings if prototype is not None else None)
+        super()._publish_speaker(session_id, g2ky, speaker_event)
+
+
+def _run_worker(name: str, factory: Callable[[], GetToKnowYou], topics: Dict[str, Optional[str]],
+                options: Dict[str, Any], inbox: multiprocessing.Queue, output: multiprocessing.Queue,
+                interval: float):
+    service = _ShardService(topics["utterance"], topics["image"], topics["face"], topics["id"],
+                            topics["response"], topics["speaker"], topics["intention"], topics["desire"], [],
+                            None, _NoScenario(), _ForwardingBus(output), None,
+                            sessions=SessionManager(factory, **options.get("sessions", {})),
+                            group_timeout=options.get("group_timeout", 1.0))
+    logger.debug("Started worker %s", name)
+
+    # Sequence number of the last event routed to each session, to report sessions evicted by the worker
+    routed = {}
+    deadline = time.monotonic() + interval
+    while True:
+        try:
+            message = inbox.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            message = ("tick",)
+
+        kind = message[0]
+        try:
+            if kind == "event":
+                _, service.session_id, event, routed[service.session_id] = message
+                service._ingest(event)
+            elif kind == "tick":
+                service._ingest(None)
+                deadline = time.monotonic() + interval
+                evicted = {session_id: sequence for session_id, sequence in routed.items()
+                           if session_id not in service._sessions}
+                if evicted:
+                    for session_id in evicted:
+                        del routed[session_id]
+                    output.put(("evicted", name, None, evicted))
+            elif kind == "export":
+                exported = {session_id: service.export_session(session_id) for session_id in message[2]}
+                for session_id in message[2]:
+                    routed.pop(session_id, None)
+                output.put(("exported", name, message[1], exported))
+            elif kind == "import":
+                for session_id, (sequence, session) in message[1].items():
+                    routed[session_id] = sequence
+                    if session:
+                        service.import_session(session_id, session)
+            elif kind == "flush":
+                output.put(("flushed", name, message[1], None))
+            elif kind == "stop":
+                break
+        except Exception:
+            logger.exception("Worker %s failed to process %s", name, kind)
+
+    logger.debug("Stopped worker %s", name)
+
+
+class _Worker:
+    def __init__(self, name: str, process: multiprocessing.Process, inbox: multiprocessing.Queue):
+        self.name = name
+        self.process = process
+        self.inbox = inbox
+        # Sessions routed to the worker, with the sequence number of their last event
+        self.sessions: Dict[Hashable, int] = {}
+
+
+class ShardedGetToKnowYouService:
+    """
+    Supervisor that distributes the conversations of a :class:`GetToKnowYouService` over worker processes.
+
+    Events are routed by their scenario id on a consistent :class:`HashRing`. Face and id events that arrive
+    before their image signal are held until it arrives, for at most the `group_timeout`. The
+    :class:`GetToKnowYou` state of a conversation lives in the worker that owns its scenario. Each worker runs
+    the service logic with a session per scenario created by `factory`, which must be picklable.
+
+    Workers report the conversations they evicted by TTL or LRU, such that only the conversations that still
+    exist are tracked. When a worker is added or removed, the conversations whose scenario moves to another worker
+    are exported as snapshots, together with the friends learned in them, and restored on their new worker before
+    further events are routed to them. Conversations of a worker that does not export them in time restart on their new
+    worker. When a worker dies, it is removed from the ring and its conversations restart on the remaining workers.
+    Workers are checked every `heartbeat` seconds and dead workers are replaced if `restart` is enabled. Events
+    are dropped while there are no workers.
+
+    Worker processes are started with the spawn method unless another multiprocessing `context` is given, as
+    forking a process with running threads, such as those of the event bus, is unsafe.
+
+    Events published by the workers are published on `event_bus` by the supervisor. Events other than
+    intentions are only routed while one of the `intentions` is active, if provided.
+    """
+    @classmethod
+    def from_config(cls, factory: Callable[[], GetToKnowYou], emissor_client: EmissorDataClient,
+                    event_bus: EventBus, config_manager: ConfigurationManager):
+        if isinstance(factory, GetToKnowYou):
+            raise ValueError("Sharding requires a factory for the G2KY sessions, enable sessions in cltl.g2ky")
+
+        config = config_manager.get_config("cltl.g2ky.events")
+
+        intention_topic = config.get("topic_intention") if "topic_intention" in config else None
+        desire_topic = config.get("topic_desire") if "topic_desire" in config else None
+        scenario_topic = config.get("topic_scenario") if "topic_scenario" in config else None
+        intentions = config.get("intentions", multi=True) if "intentions" in config else []
+
+        session_config = config_manager.get_config("cltl.g2ky.sessions")
+        max_sessions = session_config.get_int("max_sessions") if "max_sessions" in session_config else 64
+        session_ttl = session_config.get_float("ttl") if "ttl" in session_config else None
+
+        processing_config = config_manager.get_config("cltl.g2ky.processing")
+        group_timeout = processing_config.get_float("group_timeout") if "group_timeout" in processing_config else 1.0
+        scenario_ttl = processing_config.get_float("scenario_ttl") if "scenario_ttl" in processing_config else 60
+
+        sharding_config = config_manager.get_config("cltl.g2ky.sharding")
+        workers = sharding_config.get_int("workers") if "workers" in sharding_config else 2
+        replicas = sharding_config.get_int("replicas") if "replicas" in sharding_config else 64
+        restart = sharding_config.get_boolean("restart") if "restart" in sharding_config else True
+
+        return cls(config.get("topic_utterance"), config.get("topic_image"), config.get("topic_face"),
+                   config.get("topic_id"), config.get("topic_response"), config.get("topic_speaker"),
+                   intention_topic, desire_topic, intentions,
+                   factory, emissor_client, event_bus, workers=workers, replicas=replicas,
+                   group_timeout=group_timeout, max_sessions=max_sessions, session_ttl=session_ttl,
+                   scenario_topic=scenario_topic, scenario_ttl=scenario_ttl, restart=restart)
+
+    def __init__(self, utterance_topic: str, image_topic: str, face_topic: str, id_topic: str, response_topic: str,
+                 speaker_topic: str, intention_topic: str, desire_topic: str, intentions: List[str],
+                 factory: Callable[[], GetToKnowYou], emissor_client: EmissorDataClient, event_bus: EventBus,
+                 workers: int = 2, replicas: int = 64, group_timeout: float = 1.0, max_sessions: int = 64,
+                 session_ttl: float = None, scenario_topic: str = None, scenario_ttl: float = 60,
+                 interval: float = 1.0, heartbeat: float = 1.0, restart: bool = True,
+                 context: multiprocessing.context.BaseContext = None):
+        if workers < 1:
+            raise ValueError(f"At least one worker is required, was {workers}")
+
+        self._topics = {"utterance": utterance_topic, "image": image_topic, "face": face_topic, "id": id_topic,
+                        "response": response_topic, "speaker": speaker_topic, "intention": intention_topic,
+                        "desire": desire_topic}
+        self._scenario_topic = scenario_topic
+        self._intentions = intentions
+        self._active = not intentions
+        self._factory = factory
+        self._event_bus = event_bus
+        self._scenario_ids = ScenarioIdCache(emissor_client, ttl=scenario_ttl)
+        self._signal_scenarios = SignalScenarios()
+        self._pending = PendingAnnotations(timeout=group_timeout)
+        self._options = {"group_timeout": group_timeout,
+                         "sessions": {"max_sessions": max_sessions, "ttl": session_ttl}}
+        self._num_workers = workers
+        self._replicas = replicas
+        self._interval = interval
+        self._heartbeat = heartbeat
+        self._restart = restart
+        self._context = context if context is not None else multiprocessing.get_context("spawn")
+
+        self._ring = HashRing(replicas=replicas)
+        self._workers: Dict[str, _Worker] = {}
+        self._names = (f"worker-{idx}" for idx in itertools.count())
+        self._tokens = itertools.count()
+        self._sequence = itertools.count()
+        self._evicted = queue.SimpleQueue()
+        self._lock = threading.RLock()
+
+        self._output = None
+        self._replies = {}
+        self._replied = threading.Condition()
+        self._forwarder = None
+        self._monitor = None
+        self._stopped = threading.Event()
+
+    @property
+    def workers(self) -> List[str]:
+        return self._ring.nodes
+
+    def owner(self, session_id: Hashable) -> str:
+        return self._ring.node_for(session_id)
+
+    def start(self):
+        self._output = self._context.Queue()
+        self._stopped.clear()
+        self._forwarder = threading.Thread(target=self._forward, daemon=True, name=f"{self.__class__.__name__}-output")
+        self._forwarder.start()
+
+        for _ in range(self._num_workers):
+            self.add_worker()
+
+        self._monitor = threading.Thread(target=self._watch, daemon=True, name=f"{self.__class__.__name__}-monitor")
+        self._monitor.start()
+
+        for topic in self._subscribed_topics():
+            self._event_bus.subscribe(topic, self.route)
+
+    def stop(self, timeout: float = 5):
+        for topic in self._subscribed_topics():
+            self._event_bus.unsubscribe(topic, self.route)
+
+        with self._lock:
+            self._stopped.set()
+            workers = list(self._workers.values())
+            for worker in workers:
+                worker.inbox.put(("stop",))
+            for worker in workers:
+                worker.process.join(timeout)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+            self._workers = {}
+            self._ring = HashRing(replicas=self._replicas)
+
+        self._output.put(None)
+        self._forwarder.join(timeout)
+        self._monitor.join(timeout)
+
+    def add_worker(self) -> str:
+        """
+        Start a new worker and move the conversations it owns on the ring to it.
+        """
+        with self._lock:
+            name = next(self._names)
+            inbox = self._context.Queue()
+            process = self._context.Process(target=_run_worker, name=f"g2ky-{name}", daemon=True,
+                                            args=(name, self._factory, self._topics, self._options, inbox,
+                                                  self._output, self._interval))
+            process.start()
+            worker = _Worker(name, process, inbox)
+            self._workers[name] = worker
+            self._ring.add(name)
+            logger.info("Started %s (pid %s)", name, process.pid)
+
+            self._rebalance()
+
+        return name
+
+    def remove_worker(self, name: str, timeout: float = 5):
+        """
+        Move the conversations of a worker to the remaining workers and stop it.
+        """
+        with self._lock:
+            if len(self._workers) < 2:
+                raise ValueError("Cannot remove the last worker")
+
+            self._ring.remove(name)
+            try:
+                self._rebalance()
+            finally:
+                worker = self._workers.pop(name)
+                worker.inbox.put(("stop",))
+
+        worker.process.join(timeout)
+        logger.info("Stopped %s", name)
+
+    def route(self, event: Event):
+        """
+        Route an event to the worker that owns its scenario.
+        """
+        topic = event.metadata.topic
+        if topic == self._scenario_topic:
+            self._scenario_ids.update(event)
+            return
+        if topic == self._topics["intention"] and self._intentions:
+            self._active = any(intention.label in self._intentions
+                               for intention in getattr(event.payload, "intentions", ()))
+        elif not self._active:
+            return
+
+        if topic in (self._topics["image"], self._topics["face"], self._topics["id"]):
+            self._send(self._pending.arrived(event, self._signal_scenarios))
+        else:
+            self._send([event])
+
+    def _send(self, events: List[Event]):
+        for event in events:
+            scenario_id = self._signal_scenarios.scenario_id(event)
+            session_id = scenario_id if scenario_id else self._scenario_ids.get()
+            with self._lock:
+                if not len(self._ring):
+                    logger.error("No workers, dropped event %s on %s", event.id, event.metadata.topic)
+                    continue
+
+                worker = self._workers[self._ring.node_for(session_id)]
+                sequence = worker.sessions[session_id] = next(self._sequence)
+                worker.inbox.put(("event", session_id, event, sequence))
+
+    def flush(self, timeout: float = 30):
+        """
+        Wait until all workers processed the events routed to them so far.
+        """
+        with self._lock:
+            token = self._expect_replies()
+            pending = list(self._workers)
+            for worker in self._workers.values():
+                worker.inbox.put(("flush", token))
+
+        replies = self._collect_replies(pending, token, timeout)
+        missing = set(pending) - replies.keys()
+        if missing:
+            raise TimeoutError(f"No reply from {', '.join(sorted(missing))} within {timeout} seconds")
+
+    def _rebalance(self, timeout: float = 10):
+        self._prune()
+
+        moves = {}
+        for name, worker in self._workers.items():
+            moved = {session_id for session_id in worker.sessions if self._ring.node_for(session_id) != name}
+            if moved:
+                moves[name] = moved
+
+        token = self._expect_replies()
+        for name, moved in moves.items():
+            self._workers[name].inbox.put(("export", token, list(moved)))
+        exported = self._collect_replies(moves, token, timeout)
+
+        for name, moved in moves.items():
+            sessions = exported.get(name, {})
+            sequences = {session_id: self._workers[name].sessions.pop(session_id) for session_id in moved}
+
+            targets = {}
+            for session_id in moved:
+                targets.setdefault(self._ring.node_for(session_id), {})[session_id] = (sequences[session_id],
+                                                                                      sessions.get(session_id))
+            for target, target_sessions in targets.items():
+                self._workers[target].sessions.update({session_id: sequences[session_id]
+                                                       for session_id in target_sessions})
+                self._workers[target].inbox.put(("import", target_sessions))
+            logger.info("Moved %s conversations from %s", len(moved), name)
+
+        missing = moves.keys() - exported.keys()
+        if missing:
+            raise TimeoutError(f"No conversations exported by {', '.join(sorted(missing))} within {timeout} seconds, "
+                               f"they restart on their new worker")
+
+    def _expect_replies(self) -> int:
+        token = next(self._tokens)
+        with self._replied:
+            self._replies[token] = {}
+
+        return token
+
+    def _collect_replies(self, names: Iterable[str], token: int, timeout: float) -> Dict[str, Any]:
+        """
+        The replies for `token` received within `timeout` seconds, replies arriving later are discarded.
+        """
+        names = set(names)
+        with self._replied:
+            self._replied.wait_for(lambda: names <= self._replies[token].keys(), timeout)
+
+            return self._replies.pop(token)
+
+    def _forward(self):
+        while True:
+            message = self._output.get()
+            if message is None:
+                return
+
+            if message[0] == "publish":
+                _, topic, event = message
+                try:
+                    self._event_bus.publish(topic, event)
+                except Exception:
+                    logger.exception("Failed to publish event on %s", topic)
+            elif message[0] == "evicted":
+                # Applied by the monitor, as the supervisor lock may be held while waiting for replies
+                _, name, _, evicted = message
+                self._evicted.put((name, evicted))
+            else:
+                _, name, token, value = message
+                with self._replied:
+                    if token not in self._replies:
+                        logger.warning("Discarded late reply of %s", name)
+                        continue
+                    self._replies[token][name] = value
+                    self._replied.notify_all()
+
+    def _watch(self):
+        while not self._stopped.wait(self._heartbeat):
+            with self._lock:
+                if self._stopped.is_set():
+                    return
+
+                dead = [worker for worker in self._workers.values() if not worker.process.is_alive()]
+                for worker in dead:
+                    logger.warning("Worker %s died (exit code %s), its %s conversations restart",
+                                   worker.name, worker.process.exitcode, len(worker.sessions))
+                    del self._workers[worker.name]
+                    self._ring.remove(worker.name)
+
+                if dead and self._restart:
+                    for _ in dead:
+                        try:
+                            self.add_worker()
+                        except TimeoutError:
+                            logger.exception("Failed to move conversations to the replacement worker")
+                elif dead and not self._workers:
+                    logger.error("All workers died, events are dropped")
+
+                self._prune()
+
+            self._send(self._pending.expired())
+
+    def _prune(self):
+        """
+        Forget the conversations evicted by the workers, unless events were routed to them since.
+        """
+        while True:
+            try:
+                name, evicted = self._evicted.get_nowait()
+            except queue.Empty:
+                return
+
+            worker = self._workers.get(name)
+            for session_id, sequence in (evicted.items() if worker else ()):
+                if worker.sessions.get(session_id) == sequence:
+                    del worker.sessions[session_id]
+
+    def _subscribed_topics(self) -> List[str]:
+        topics = [self._topics[key] for key in ("utterance", "intention", "image", "face", "id")]
+
+        return [topic for topic in topics + [self._scenario_topic] if topic]
@@ -0,0 +1,164 @@
+import logging
+import os
+import struct
+import threading
+from typing import Any, Dict, Hashable, Mapping, Optional, Tuple
+
+import numpy as np
+
+from cltl.g2ky.embedding import EmbeddingIndex
+from cltl.g2ky.friends import FriendStore
+from cltl.g2ky.names import NameIndex
+from cltl_service.g2ky.serialization import BinarySerializer
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = b"G2KYSNP1"
+_LENGTH = struct.Struct("<I")
+
+
+class SnapshotStore:
+    """
+    Persist the conversation state of sessions and the friends they got to know in an append-only file.
+
+    Each write appends a record with the latest snapshot of a session or with a new friend, such that
+    the state can be restored after a restart or by a standby instance. Once the file contains more than
+    `compact_after` superseded records it is rewritten with the current state only.
+
+    Records are encoded with the :class:`BinarySerializer`, embeddings are stored as raw buffers.
+    """
+    def __init__(self, path: str, compact_after: int = 1000):
+        self._path = path
+        self._compact_after = compact_after
+        self._serializer = BinarySerializer(namespaces=False)
+        self._lock = threading.Lock()
+
+        self._sessions = {}
+        self._friends = {}
+        self._records = 0
+
+        truncated = self._load() if os.path.exists(path) else False
+        self._file = self._open(path)
+        if truncated:
+            self._compact()
+
+    @property
+    def sessions(self) -> Dict[Hashable, Dict[str, Any]]:
+        """
+        The latest snapshot per session.
+        """
+        return dict(self._sessions)
+
+    @property
+    def friends(self) -> Dict[str, Tuple[str, Optional[np.ndarray]]]:
+        """
+        The name and face embeddings per friend identifier.
+        """
+        return dict(self._friends)
+
+    def write_session(self, session_id: Hashable, snapshot: Mapping[str, Any]):
+        with self._lock:
+            self._sessions[session_id] = snapshot
+            self._append({"session": session_id, "state": snapshot})
+
+    def remove_session(self, session_id: Hashable):
+        with self._lock:
+            if self._sessions.pop(session_id, None) is not None:
+                self._append({"session": session_id, "state": None})
+
+    def add_friend(self, identifier: str, name: str, embeddings: Optional[np.ndarray] = None):
+        with self._lock:
+            known = self._friends.get(identifier)
+            if known is not None and known[0] == name and (embeddings is None or known[1] is not None):
+                return
+
+            self._friends[identifier] = (name, embeddings)
+            self._append({"friends": [[identifier, name, embeddings]]})
+
+    def restore_friends(self, friend_store: FriendStore, embedding_index: EmbeddingIndex = None,
+                        name_index: NameIndex = None):
+        """
+        Add the stored friends to the friend store and name index, and their embeddings to the embedding index.
+        """
+        for identifier, (name, embeddings) in self._friends.items():
+            friend_store.add(identifier, name)
+            if name_index is not None:
+                name_index.add(identifier, name)
+            if embedding_index is not None and embeddings is not None:
+                embedding_index.add(identifier, embeddings)
+
+    def compact(self):
+        with self._lock:
+            self._compact()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def _append(self, record: Mapping[str, Any]):
+        payload = self._serializer.encode(record)
+        self._file.write(_LENGTH.pack(len(payload)))
+        self._file.write(payload)
+        self._file.flush()
+
+        self._records += 1
+        if self._records > self._compact_after + len(self._sessions) + 1:
+            self._compact()
+
+    def _compact(self):
+        tmp_path = self._path + ".tmp"
+        with self._open(tmp_path, truncate=True) as tmp_file:
+            records = [{"friends": [[identifier, name, embeddings]
+                                    for identifier, (name, embeddings) in self._friends.items()]}]
+            records += [{"session": session_id, "state": snapshot} for session_id, snapshot in self._sessions.items()]
+            for record in records:
+                payload = self._serializer.encode(record)
+                tmp_file.write(_LENGTH.pack(len(payload)))
+                tmp_file.write(payload)
+
+        self._file.close()
+        os.replace(tmp_path, self._path)
+        self._file = self._open(self._path)
+        self._records = len(records)
+        logger.debug("Compacted snapshots to %s records", self._records)
+
+    def _load(self) -> bool:
+        with open(self._path, "rb") as snapshot_file:
+            data = memoryview(snapshot_file.read())
+
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self._path} is not a G2KY snapshot file")
+
+        offset = len(MAGIC)
+        while offset + _LENGTH.size <= len(data):
+            length, = _LENGTH.unpack_from(data, offset)
+            offset += _LENGTH.size
+            if offset + length > len(data):
+                logger.warning("Truncated record at the end of the snapshot file")
+                return True
+
+            record = self._serializer.decode(data[offset:offset + length])
+            offset += length
+            self._records += 1
+
+            if "session" in record:
+                session_id = record["session"]
+                if record["state"] is None:
+                    self._sessions.pop(session_id, None)
+                else:
+                    self._sessions[session_id] = record["state"]
+            for identifier, name, embeddings in record.get("friends", ()):
+                self._friends[identifier] = (name, embeddings)
+
+        logger.info("Loaded %s sessions and %s friends from %s", len(self._sessions), len(self._friends), self._path)
+
+        return False
+
+    @staticmethod
+    def _open(path: str, truncate: bool = False):
+        snapshot_file = open(path, "wb" if truncate else "ab")
+        if snapshot_file.tell() == 0:
+            snapshot_file.write(MAGIC)
+
+        return snapshot_file
@@ -0,0 +1,219 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import signal
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _event_args(event, *args, **kwargs) -> Dict[str, Any]:
+    if event is None:
+        return {}
+
+    return {"event_id": getattr(event, "id", None), "topic": getattr(event.metadata, "topic", None)}
+
+
+def _group_args(group, *args, **kwargs) -> Dict[str, Any]:
+    return {"image_id": group.image_id, "session_id": str(group.session_id)}
+
+
+def _payload_args(response, session_id=None, *args, **kwargs) -> Dict[str, Any]:
+    return {"session_id": str(session_id)}
+
+
+def _publish_args(topic, event, *args, **kwargs) -> Dict[str, Any]:
+    return {"topic": topic, "event_id": getattr(event, "id", None)}
+
+
+class Tracer:
+    """
+    Sampling tracer for the :class:`GetToKnowYouService`.
+
+    :meth:`instrument` replaces the traced methods on the service and its event bus instance with wrappers,
+    the classes are not modified. A trace starts when an event is processed, with probability `sample_rate`,
+    and contains spans for the nested calls. Spans are kept in memory, up to `max_spans`, and can be exported
+    in the Chrome trace event format, e.g. for viewing in Perfetto.
+
+    The tracer can also capture a :mod:`cProfile` profile of event processing for a given duration, triggered
+    with :meth:`request_profile`, by a signal or by an event on the `control_topic`. A single profiler is enabled
+    only while an event is processed, by one thread at a time, as concurrent profilers are not supported from
+    Python 3.12 on. The profile is written when the duration has passed, or when the tracer is closed.
+    """
+    def __init__(self, sample_rate: float = 1.0, max_spans: int = 100_000, path: str = None,
+                 control_topic: str = None, profile_path: str = "g2ky.prof", profile_seconds: float = 10,
+                 clock: Callable[[], float] = time.perf_counter):
+        self.control_topic = control_topic
+
+        self._sample_rate = sample_rate
+        self._path = path
+        self._profile_path = profile_path
+        self._profile_seconds = profile_seconds
+        self._clock = clock
+        self._random = random.Random()
+
+        self._spans = deque(maxlen=max_spans)
+        self._local = threading.local()
+        self._patched = []
+
+        self._profile_lock = threading.Lock()
+        self._profiler = None
+        self._profiled = 0
+        self._profile_target = None
+        self._profile_timer = None
+
+    @property
+    def spans(self) -> List[tuple]:
+        return list(self._spans)
+
+    def instrument(self, service):
+        """
+        Trace `_process`, `process_group`, `_process_group`, `_create_payload` and `_create_speaker_payload`
+        of the service and `publish` of its event bus.
+
+        Must be called before the service is started.
+        """
+        self._patch(service, "_process", "process", _event_args, root=True)
+        self._patch(service, "process_group", "process_group", _group_args)
+        self._patch(service, "_process_group", "process_face_group", _group_args, root=True)
+        self._patch(service, "_create_payload", "create_payload", _payload_args)
+        self._patch(service, "_create_speaker_payload", "create_speaker_payload")
+        self._patch(service, "_create_speaker_payload_for_img", "create_speaker_payload")
+        self._patch(service._event_bus, "publish", "publish", _publish_args)
+
+        if self.control_topic:
+            process = service._process
+
+            def process_or_control(event):
+                if event is not None and event.metadata.topic == self.control_topic:
+                    seconds = getattr(event.payload, "seconds", None)
+                    self.request_profile(seconds if seconds else self._profile_seconds)
+                    return
+
+                return process(event)
+
+            setattr(service, "_process", process_or_control)
+
+    def uninstrument(self):
+        for target, name, original in reversed(self._patched):
+            if original is None:
+                delattr(target, name)
+            else:
+                setattr(target, name, original)
+        self._patched = []
+
+    def install_signal_handler(self, signum: int = signal.SIGUSR1):
+        """
+        Capture a profile when the process receives the signal, must be called from the main thread.
+        """
+        signal.signal(signum, lambda received, frame: self.request_profile())
+
+    def request_profile(self, seconds: float = None, path: str = None):
+        """
+        Profile the events processed during the next `seconds` and write the statistics to `path`.
+        """
+        seconds = seconds if seconds else self._profile_seconds
+        with self._profile_lock:
+            if self._profiler is not None:
+                logger.info("Profile already in progress")
+                return
+
+            self._profile_target = path if path else self._profile_path
+            self._profiler = cProfile.Profile()
+            self._profiled = 0
+            self._profile_timer = threading.Timer(seconds, self._write_profile)
+            self._profile_timer.daemon = True
+            self._profile_timer.start()
+        logger.info("Profiling for %s seconds", seconds)
+
+    def export(self, path: str = None):
+        """
+        Write the recorded spans in the Chrome trace event format.
+        """
+        pid = os.getpid()
+        events = [{"name": name, "cat": "g2ky", "ph": "X", "pid": pid, "tid": tid,
+                   "ts": start * 1e6, "dur": duration * 1e6, "args": args or {}}
+                  for name, tid, start, duration, args in list(self._spans)]
+
+        with open(path if path else self._path, "w") as trace_file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+
+    def close(self):
+        self.uninstrument()
+        if self._profile_timer is not None:
+            self._profile_timer.cancel()
+            self._write_profile()
+        if self._path:
+            self.export()
+
+    def _patch(self, target, attribute: str, name: str, args_fn: Callable[..., Dict[str, Any]] = None,
+               root: bool = False):
+        self._patched.append((target, attribute, target.__dict__.get(attribute)))
+        setattr(target, attribute, self._traced(name, getattr(target, attribute), args_fn, root))
+
+    def _traced(self, name: str, func: Callable, args_fn: Optional[Callable[..., Dict[str, Any]]], root: bool):
+        local = self._local
+
+        def traced(*args, **kwargs):
+            sampled = getattr(local, "sampled", None)
+            if sampled is None and root:
+                if self._profiler is not None and self._profile_lock.acquire(blocking=False):
+                    try:
+                        return self._profile(traced, *args, **kwargs)
+                    finally:
+                        self._profile_lock.release()
+
+                local.sampled = self._random.random() < self._sample_rate
+                try:
+                    return self._call(name, func, args_fn, args, kwargs) if local.sampled else func(*args, **kwargs)
+                finally:
+                    local.sampled = None
+
+            if sampled:
+                return self._call(name, func, args_fn, args, kwargs)
+
+            return func(*args, **kwargs)
+
+        return traced
+
+    def _call(self, name, func, args_fn, args, kwargs):
+        span_args = args_fn(*args, **kwargs) if args_fn else None
+        start = self._clock()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._spans.append((name, threading.get_ident(), start, self._clock() - start, span_args))
+
+    def _profile(self, traced: Callable, *args, **kwargs):
+        # Called with the profile lock held, events processed by other threads meanwhile are not profiled
+        profiler = self._profiler
+        if profiler is None:
+            return traced(*args, **kwargs)
+
+        self._profiled += 1
+        self._local.sampled = self._random.random() < self._sample_rate
+        profiler.enable()
+        try:
+            return traced(*args, **kwargs)
+        finally:
+            profiler.disable()
+            self._local.sampled = None
+
+    def _write_profile(self):
+        with self._profile_lock:
+            profiler, self._profiler = self._profiler, None
+            self._profile_timer = None
+            if profiler is None:
+                return
+            if not self._profiled:
+                logger.info("No events processed while profiling")
+                return
+
+            pstats.Stats(profiler).dump_stats(self._profile_target)
+        logger.info("Wrote profile of %s events to %s", self._profiled, self._profile_target)
@@ -0,0 +1,193 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from cltl.combot.event.emissor import TextSignalEvent
+from cltl.combot.infra.event import Event
+from cltl.combot.infra.event.memory import SynchronousEventBus
+from emissor.representation.scenario import TextSignal
+
+from cltl.g2ky.verbal import VerbalGetToKnowYou
+from cltl.g2ky.visual import VisualGetToKnowYou
+from cltl_service.g2ky.aio import AsyncGetToKnowYouService, InMemoryAsyncEventBus
+from cltl_service.g2ky.session import SessionManager
+from tests.test_scenario import frame
+
+
+class Client:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def get_current_scenario_id(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return "current"
+
+
+class BlockingBus(InMemoryAsyncEventBus):
+    """Holds back the first response until released."""
+    def __init__(self):
+        super().__init__()
+        self.released = asyncio.Event()
+        self.blocked = False
+
+    async def publish(self, topic, event):
+        if topic == "response" and not self.blocked:
+            self.blocked = True
+            await self.released.wait()
+        await super().publish(topic, event)
+
+
+def utterance(text, scenario_id=None):
+    signal = TextSignal.for_scenario(scenario_id, 0, 0, None, text)
+
+    return Event.for_payload(TextSignalEvent.for_speaker(signal))
+
+
+def service(event_bus, g2ky=None, sessions=None, client=None, **kwargs):
+    return AsyncGetToKnowYouService("utterance", "image", "face", "id", "response", "speaker", "intention", None, [],
+                                    g2ky, client or Client(), event_bus, sessions=sessions, **kwargs)
+
+
+class TestAsyncService(unittest.IsolatedAsyncioTestCase):
+    async def test_verbal_flow(self):
+        bus = InMemoryAsyncEventBus()
+        responses, speakers = [], []
+
+        async def on_response(event):
+            responses.append(event.payload.signal.text)
+
+        async def on_speaker(event):
+            speakers.append(event.payload.mentions[0].annotations[0].value)
+
+        bus.subscribe("response", on_response)
+        bus.subscribe("speaker", on_speaker)
+
+        g2ky_service = service(bus, g2ky=VerbalGetToKnowYou())
+        await g2ky_service.start()
+        self.assertEqual(["response", "speaker", "utterance", "intention"], bus.topics)
+        for text in ["Hi", "Thomas", "yes"]:
+            await bus.publish("utterance", utterance(text))
+        await g2ky_service.join()
+        await g2ky_service.stop()
+
+        self.assertEqual(["Hi, nice to meet you! What is your name?", "So your name is Thomas?",
+                          "Nice to meet you, Thomas!"], responses)
+        self.assertEqual(1, len(speakers))
+        self.assertEqual(["response", "speaker"], bus.topics)
+
+    async def test_sessions_do_not_wait_for_each_other(self):
+        bus = BlockingBus()
+        responses = []
+
+        async def on_response(event):
+            responses.append(event.payload.signal.text)
+
+        bus.subscribe("response", on_response)
+
+        g2ky_service = service(bus, sessions=SessionManager(VerbalGetToKnowYou))
+        await g2ky_service.start()
+        await bus.publish("utterance", utterance("Hi", "slow"))
+        await bus.publish("utterance", utterance("Hi", "fast"))
+        await bus.publish("utterance", utterance("Thomas", "fast"))
+
+        for _ in range(100):
+            if len(responses) == 2:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(["Hi, nice to meet you! What is your name?", "So your name is Thomas?"], responses)
+
+        bus.released.set()
+        await g2ky_service.join()
+        await g2ky_service.stop()
+
+        self.assertEqual(3, len(responses))
+
+    async def test_scenario_lookup_in_executor(self):
+        bus = InMemoryAsyncEventBus()
+        responses = []
+
+        async def on_response(event):
+            responses.append(event.payload.signal.text)
+
+        bus.subscribe("response", on_response)
+
+        client = Client(delay=0.1)
+        g2ky_service = service(bus, sessions=SessionManager(VerbalGetToKnowYou), client=client)
+        await g2ky_service.start()
+        await asyncio.gather(bus.publish("utterance", utterance("Hi")), bus.publish("utterance", utterance("Hi")))
+        await g2ky_service.join()
+        await g2ky_service.stop()
+
+        self.assertEqual(1, client.calls)
+        self.assertEqual(2, len(responses))
+
+    async def test_idle_sessions_expire(self):
+        bus = InMemoryAsyncEventBus()
+        sessions = SessionManager(VerbalGetToKnowYou, ttl=0.3)
+        g2ky_service = service(bus, sessions=sessions, interval=0.1)
+        await g2ky_service.start()
+        await bus.publish("utterance", utterance("Hi", "idle"))
+        await g2ky_service.join()
+        self.assertIn("idle", sessions)
+
+        for _ in range(150):
+            if "idle" not in g2ky_service._workers:
+                break
+            await asyncio.sleep(0.01)
+        await g2ky_service.stop()
+
+        self.assertNotIn("idle", sessions)
+        self.assertNotIn("idle", g2ky_service._workers)
+
+    async def test_annotations_before_image(self):
+        bus = InMemoryAsyncEventBus()
+        responses = []
+
+        async def on_response(event):
+            responses.append(event.payload.signal.time.container_id)
+
+        bus.subscribe("response", on_response)
+
+        client = Client()
+        sessions = SessionManager(VisualGetToKnowYou)
+        g2ky_service = service(bus, sessions=sessions, client=client)
+        await g2ky_service.start()
+        for topic, event in reversed(frame("first", 1.0)):
+            await bus.publish(topic, event)
+        await g2ky_service.join()
+        await g2ky_service.stop()
+
+        self.assertEqual({"first"}, {session_id for session_id, _ in sessions.sessions()})
+        self.assertEqual(["first"], responses)
+        self.assertEqual(0, client.calls)
+
+
+class TestEventBusAdapter(unittest.TestCase):
+    def test_blocking_event_bus(self):
+        bus = SynchronousEventBus()
+        received = []
+        done = threading.Event()
+
+        def on_response(event):
+            received.append((threading.current_thread().name, event.payload.signal.text))
+            done.set()
+
+        bus.subscribe("response", on_response)
+
+        async def run():
+            g2ky_service = service(bus, g2ky=VerbalGetToKnowYou(),
+                                   executor=ThreadPoolExecutor(1, thread_name_prefix="publisher"))
+            await g2ky_service.start()
+            await asyncio.get_running_loop().run_in_executor(None, bus.publish, "utterance", utterance("Hi"))
+            await g2ky_service.join()
+            await g2ky_service.stop()
+
+        asyncio.run(run())
+
+        self.assertTrue(done.wait(1))
+        self.assertEqual("Hi, nice to meet you! What is your name?", received[0][1])
+        self.assertTrue(received[0][0].startswith("publisher"))
@@ -0,0 +1,113 @@
+import random
+import unittest
+
+import numpy as np
+from cltl.face_recognition.api import Face
+from emissor.representation.entity import Gender
+
+from cltl.g2ky.batch import BatchVisualGetToKnowYou
+from cltl.g2ky.embedding import EmbeddingIndex
+from cltl.g2ky.friends import MemoryFriendStore
+from cltl.g2ky.visual import VisualGetToKnowYou, ConvState
+
+
+EMBEDDINGS = {identifier: np.eye(8, dtype=np.float32)[idx] for idx, identifier in enumerate([None, "id1", "id2", "id3"])}
+
+
+def random_frame(rng: random.Random):
+    num_persons = rng.choices([0, 1, 2], weights=[2, 8, 1])[0]
+    persons = []
+    for _ in range(num_persons):
+        identifier = rng.choice([None, "id1", "id1", "id2", "id3"])
+        embedding = EMBEDDINGS[identifier] + rng.random() * 0.1
+        persons.append((identifier, Face(embedding, Gender.FEMALE, 1)))
+
+    return persons
+
+
+class TestBatchG2KY(unittest.TestCase):
+    def test_regular_flow(self):
+        batch = BatchVisualGetToKnowYou(capacity=1, gaze_images=2)
+        face = Face(np.ones(4), Gender.FEMALE, 1)
+
+        self.assertEqual({"s1": "Hi Stranger! We haven't met, let me look at your face!",
+                          "s2": "Hi, anyone there? I can't see anyone.."},
+                         batch.persons_detected({"s1": [("id1", face)], "s2": []}))
+        self.assertEqual({"s1": None}, batch.persons_detected({"s1": [("id1", face)]}))
+        self.assertEqual({"s1": "What is your name, stranger?"}, batch.persons_detected({"s1": [("id1", face)]}))
+        self.assertEqual(ConvState.QUERY, batch.conv_state("s1"))
+        self.assertEqual(ConvState.START, batch.conv_state("s2"))
+
+        self.assertEqual("So your name is Thomas?", batch.utterance_detected("s1", "thomas"))
+        self.assertEqual("Nice to meet you, Thomas!", batch.utterance_detected("s1", "yes"))
+        self.assertEqual(("id1", "Thomas"), batch.speaker("s1"))
+
+        batch.clear("s1")
+        self.assertEqual({"s1": "Nice to meet you again Thomas!"}, batch.persons_detected({"s1": [("id1", face)]}))
+
+    def test_remove_session(self):
+        batch = BatchVisualGetToKnowYou(capacity=1)
+        batch.persons_detected({"s1": [("id1", Face(np.ones(4), Gender.FEMALE, 1))]})
+        batch.remove_session("s1")
+        batch.persons_detected({"s2": []})
+
+        self.assertEqual(["s2"], batch.sessions)
+        self.assertEqual(ConvState.START, batch.conv_state("s2"))
+
+    def test_equivalence(self):
+        for min_gaze_images, reidentify in [(None, False), (2, False), (None, True), (3, True)]:
+            with self.subTest(min_gaze_images=min_gaze_images, reidentify=reidentify):
+                self.assert_equivalent(min_gaze_images, reidentify)
+
+    def assert_equivalent(self, min_gaze_images, reidentify, num_sessions=50, ticks=200):
+        rng = random.Random(42)
+        friends = {"id2": "Anna"}
+        store, batch_store = MemoryFriendStore(friends), MemoryFriendStore(friends)
+        index, batch_index = (EmbeddingIndex(), EmbeddingIndex()) if reidentify else (None, None)
+        if reidentify:
+            index.add("id3", EMBEDDINGS["id3"])
+            batch_index.add("id3", EMBEDDINGS["id3"])
+
+        sessions = {session: VisualGetToKnowYou(gaze_images=4, friend_store=store, embedding_index=index,
+                                                min_gaze_images=min_gaze_images)
+                    for session in range(num_sessions)}
+        batch = BatchVisualGetToKnowYou(capacity=8, gaze_images=4, friend_store=batch_store,
+                                        embedding_index=batch_index, min_gaze_images=min_gaze_images)
+
+        visited = set()
+        for _ in range(ticks):
+            frames = {session: random_frame(rng) for session in sessions if rng.random() < 0.7}
+            expected = {session: sessions[session].persons_detected(persons) for session, persons in frames.items()}
+            self.assertEqual(expected, batch.persons_detected(frames))
+
+            for session, g2ky in sessions.items():
+                if rng.random() < 0.1:
+                    utterance = rng.choice(["thomas", "yes", "no"])
+                    self.assertEqual(g2ky.utterance_detected(utterance), batch.utterance_detected(session, utterance))
+                if g2ky.speaker[0] and rng.random() < 0.5:
+                    self.assertEqual(g2ky.speaker, batch.speaker(session))
+                    g2ky.clear()
+                    batch.clear(session)
+
+            for session, g2ky in sessions.items():
+                if session in batch.sessions:
+                    self.assert_state_equal(g2ky.state, batch.state(session))
+                visited.add(g2ky.state.conv_state)
+
+        self.assertEqual(set(ConvState), visited)
+        self.assertEqual(sorted(store.items()), sorted(batch_store.items()))
+
+    def assert_state_equal(self, expected, actual):
+        expected_snapshot, actual_snapshot = expected.snapshot(), actual.snapshot()
+        expected_prototype = expected_snapshot.pop("prototype")
+        actual_prototype = actual_snapshot.pop("prototype")
+        expected_faces = expected_snapshot.pop("faces")
+        actual_faces = actual_snapshot.pop("faces")
+
+        self.assertEqual(expected_snapshot, actual_snapshot)
+        self.assertEqual([identifier for identifier, _ in expected_faces],
+                         [identifier for identifier, _ in actual_faces])
+        if expected_prototype is None:
+            self.assertIsNone(actual_prototype)
+        else:
+            np.testing.assert_array_equal(expected_prototype, actual_prototype)
@@ -0,0 +1,145 @@
+import dataclasses
+import os
+import tempfile
+import unittest
+import uuid
+from types import SimpleNamespace
+
+import numpy as np
+from cltl.combot.event.emissor import AnnotationEvent, ImageSignalEvent, TextSignalEvent
+from cltl.combot.infra.event import Event
+from cltl.combot.infra.event.memory import SynchronousEventBus
+from cltl.face_recognition.api import Face
+from emissor.representation.scenario import Annotation, ImageSignal, Mention, MultiIndex, TextSignal
+
+from cltl.g2ky.visual import VisualGetToKnowYou
+from cltl_service.g2ky.capture import EventRecorder, EventLog, EventReplayer, Direction
+from cltl_service.g2ky.deadline import DeadlineFilter
+from cltl_service.g2ky.service import GetToKnowYouService
+
+
+def event(topic, embedding):
+    return SimpleNamespace(id=topic, metadata=SimpleNamespace(topic=topic, timestamp=0),
+                           payload=SimpleNamespace(embedding=embedding))
+
+
+class TestCapture(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "events.log")
+
+        recorder = EventRecorder(self.path)
+        recorder.record(Direction.CONSUMED, "face", event("face", np.arange(4, dtype=np.float32)))
+        recorder.record(Direction.PUBLISHED, "response", event("response", None))
+        recorder.record(Direction.CONSUMED, "id", event("id", np.ones(2)))
+        recorder.close()
+        self.assertEqual(3, recorder.recorded)
+
+        self.log = EventLog(self.path)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_read_log(self):
+        events = list(self.log)
+
+        self.assertEqual([Direction.CONSUMED, Direction.PUBLISHED, Direction.CONSUMED],
+                         [logged.direction for logged in events])
+        self.assertEqual(["face", "response", "id"], [logged.topic for logged in events])
+        np.testing.assert_array_equal(np.arange(4), events[0].event.payload.embedding)
+        self.assertFalse(events[0].event.payload.embedding.flags.writeable)
+        self.assertIsNone(events[1].event.payload.embedding)
+
+    def test_replay(self):
+        replayed = []
+        count = EventReplayer(self.log, replayed.append).replay()
+
+        self.assertEqual(2, count)
+        self.assertEqual(["face", "id"], [event.metadata.topic for event in replayed])
+
+    def test_replay_realtime(self):
+        sleeps = []
+        logged = list(self.log)
+        EventReplayer(self.log, lambda event: None, realtime=True, clock=lambda: 0, sleep=sleeps.append).replay()
+
+        self.assertAlmostEqual(logged[2].timestamp - logged[0].timestamp, sum(sleeps))
+
+
+class Client:
+    def get_current_scenario_id(self):
+        return "scenario"
+
+
+def frame_events(identifier, age=0):
+    image = ImageSignal.for_scenario("scenario", 0, 0, None, (0, 0, 100, 100))
+    mention = lambda value: Mention(str(uuid.uuid4()), [MultiIndex(image.id, (0, 0, 20, 20))],
+                                    [Annotation("", value, "", 0)])
+    face = Face(np.ones(4, dtype=np.float32), None, None)
+    events = [("image", ImageSignalEvent.create(image)), ("face", AnnotationEvent.create([mention(face)]))]
+    if identifier:
+        events.append(("id", AnnotationEvent.create([mention(identifier)])))
+
+    for topic, payload in events:
+        event = Event.for_payload(payload)
+        yield topic, dataclasses.replace(event, metadata=dataclasses.replace(
+            event.metadata, timestamp=event.metadata.timestamp - age * 1000))
+
+
+class TestLiveReplay(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "events.log")
+        self.now = 0.0
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def service(self, event_bus, clock, **kwargs):
+        service = GetToKnowYouService("utterance", "image", "face", "id", "response", "speaker", None, None, [],
+                                      VisualGetToKnowYou(gaze_images=2), Client(), event_bus, None,
+                                      group_timeout=1.0, clock=clock, **kwargs)
+        service.start()
+
+        return service
+
+    def test_replay_reproduces_live_responses(self):
+        bus = SynchronousEventBus()
+        live = []
+        bus.subscribe("response", lambda event: live.append(event.payload.signal.text))
+        deadlines = DeadlineFilter({"image": 0.3, "face": 0.3, "id": 0.3}, priority_topics=[])
+        service = self.service(bus, lambda: self.now, recorder=EventRecorder(self.path, clock=lambda: self.now),
+                               deadlines=deadlines)
+
+        for age in (0, 5, 0, 0):
+            for topic, event in frame_events("id1", age):
+                bus.publish(topic, event)
+            self.now += 0.1
+        for text in ("Thomas", "yes"):
+            bus.publish("utterance", Event.for_payload(TextSignalEvent.for_speaker(
+                TextSignal.for_scenario("scenario", 0, 0, None, text))))
+        # Incomplete frame, only processed when a tick expires it
+        for topic, event in frame_events(None):
+            bus.publish(topic, event)
+        self.now += 2
+        service._process(None)
+        service.stop()
+
+        log = EventLog(self.path)
+        self.assertEqual(1, sum(logged.direction == Direction.TICK for logged in log))
+        self.assertEqual(3, sum(logged.direction == Direction.SHED for logged in log))
+        self.assertEqual(live, [logged.event.payload.signal.text for logged in log
+                                if logged.direction == Direction.PUBLISHED and logged.topic == "response"])
+
+        replay_bus = SynchronousEventBus()
+        replayed = []
+        replay_bus.subscribe("response", lambda event: replayed.append(event.payload.signal.text))
+        replayer = EventReplayer(log, lambda event: service._process(event))
+        service = self.service(replay_bus, replayer.timestamp)
+        replayer.replay()
+        service.stop()
+        log.close()
+
+        self.assertEqual(["Hi Stranger! We haven't met, let me look at your face!", "What is your name, stranger?",
+                          "So your name is Thomas?", "Nice to meet you, Thomas!",
+                          "Hi Stranger! We haven't met, let me look at your face!"], live)
+        self.assertEqual(live, replayed)
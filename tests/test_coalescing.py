@@ -0,0 +1,32 @@
+import threading
+import unittest
+
+from cltl_service.g2ky.coalescing import CoalescingQueue
+
+
+class TestCoalescingQueue(unittest.TestCase):
+    def setUp(self) -> None:
+        self.queue = CoalescingQueue()
+
+    def test_keeps_latest_frame_per_session(self):
+        self.queue.put_frame("scenario1", "frame1")
+        self.queue.put("utterance1")
+        self.queue.put_frame("scenario2", "frame2")
+        self.queue.put_frame("scenario1", "frame3")
+        self.queue.put("utterance2")
+
+        self.assertEqual(["utterance1", "frame2", "frame3", "utterance2"], self.queue.drain(timeout=0))
+        self.assertEqual(1, self.queue.dropped)
+        self.assertEqual(0, len(self.queue))
+
+    def test_drain_waits_for_items(self):
+        self.assertEqual([], self.queue.drain(timeout=0.01))
+
+        threading.Timer(0.01, lambda: self.queue.put("utterance")).start()
+        self.assertEqual(["utterance"], self.queue.drain(timeout=1))
+
+    def test_close(self):
+        threading.Timer(0.01, self.queue.close).start()
+
+        self.assertEqual([], self.queue.drain(timeout=1))
+        self.assertTrue(self.queue.closed)
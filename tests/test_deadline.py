@@ -0,0 +1,125 @@
+import dataclasses
+import unittest
+import uuid
+from types import SimpleNamespace
+
+import numpy as np
+from cltl.combot.infra.event import Event
+from cltl.combot.infra.event.memory import SynchronousEventBus
+
+from cltl.g2ky.visual import VisualGetToKnowYou
+from cltl_service.g2ky.deadline import DeadlineFilter
+from cltl_service.g2ky.service import GetToKnowYouService
+
+
+def event(topic, timestamp, event_id="event", payload=None):
+    return Event(event_id, payload, SimpleNamespace(topic=topic, timestamp=timestamp))
+
+
+def frame(image_id, timestamp):
+    mentions = [SimpleNamespace(segment=[SimpleNamespace(container_id=image_id)])]
+
+    return [event("image", timestamp, payload=SimpleNamespace(signal=SimpleNamespace(id=image_id))),
+            event("face", timestamp, payload=SimpleNamespace(mentions=mentions)),
+            event("id", timestamp, payload=SimpleNamespace(mentions=mentions))]
+
+
+class Client:
+    def get_current_scenario_id(self):
+        return "scenario"
+
+
+class TestDeadlineFilter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = 1_700_000_000.0
+        self.deadlines = DeadlineFilter({"image": 0.3, "utterance": 10}, priority_topics=["utterance"],
+                                        priority_timeout=1.0, clock=lambda: self.now)
+
+    def test_max_age(self):
+        self.assertTrue(self.deadlines.admit(event("image", self.now - 0.1)))
+        self.assertFalse(self.deadlines.admit(event("image", self.now - 0.5)))
+        # Emissor timestamps in milliseconds
+        self.assertFalse(self.deadlines.admit(event("image", (self.now - 0.5) * 1000)))
+        self.assertTrue(self.deadlines.admit(event("utterance", self.now - 5)))
+        self.assertFalse(self.deadlines.admit(event("utterance", self.now - 15)))
+        self.assertTrue(self.deadlines.admit(event("scenario", self.now - 100)))
+
+        self.assertEqual({("image", "stale"): 2, ("utterance", "stale"): 1}, self.deadlines.dropped)
+        self.assertEqual(3, self.deadlines.count("stale"))
+
+    def test_priority(self):
+        self.deadlines.received(event("utterance", self.now, "utterance"))
+
+        self.assertFalse(self.deadlines.admit(event("image", self.now)))
+        self.assertTrue(self.deadlines.admit(event("scenario", self.now)))
+        self.assertTrue(self.deadlines.admit(event("utterance", self.now, "utterance")))
+        self.assertTrue(self.deadlines.admit(event("image", self.now)))
+
+        self.assertEqual({("image", "preempted"): 1}, self.deadlines.dropped)
+
+    def test_priority_timeout(self):
+        self.deadlines.received(event("utterance", self.now, "discarded"))
+        self.assertFalse(self.deadlines.admit(event("image", self.now)))
+
+        self.now += 2
+        self.assertTrue(self.deadlines.admit(event("image", self.now)))
+
+
+    def test_groups_are_not_split(self):
+        deadlines = DeadlineFilter({"image": 0.3, "face": 0.3, "id": 0.3}, priority_topics=["utterance"],
+                                   clock=lambda: self.now, group_topics=["image", "face", "id"])
+        admitted, preempted = frame("admitted", self.now), frame("preempted", self.now)
+
+        self.assertTrue(deadlines.admit(admitted[0]))
+        deadlines.received(event("utterance", self.now, "utterance"))
+        self.assertFalse(deadlines.admit(preempted[0]))
+        self.assertTrue(deadlines.admit(admitted[1]))
+        self.assertTrue(deadlines.admit(admitted[2]))
+
+        self.assertTrue(deadlines.admit(event("utterance", self.now, "utterance")))
+        self.assertFalse(deadlines.admit(preempted[1]))
+        self.assertFalse(deadlines.admit(preempted[2]))
+
+        self.assertEqual({("image", "preempted"): 1, ("face", "preempted"): 1, ("id", "preempted"): 1},
+                         deadlines.dropped)
+
+
+class TestServiceDeadlines(unittest.TestCase):
+    def setUp(self) -> None:
+        self.bus = SynchronousEventBus()
+        self.responses = []
+        self.bus.subscribe("response", lambda event: self.responses.append(event.payload.signal.text))
+
+        self.deadlines = DeadlineFilter({"image": 0.3, "face": 0.3, "id": 0.3}, priority_topics=["utterance"],
+                                        group_topics=["image", "face", "id"])
+        self.service = GetToKnowYouService("utterance", "image", "face", "id", "response", "speaker", None, None,
+                                           [], VisualGetToKnowYou(), Client(), self.bus, None,
+                                           deadlines=self.deadlines)
+        self.service.start()
+
+    def tearDown(self) -> None:
+        self.service.stop()
+
+    def publish_frame(self, age):
+        image_id = str(uuid.uuid4())
+        mention = lambda value: SimpleNamespace(
+            id=str(uuid.uuid4()), segment=[SimpleNamespace(container_id=image_id, bounds=(0, 0, 20, 20))],
+            annotations=[SimpleNamespace(type="", value=value, source="", timestamp=0)])
+        face = SimpleNamespace(embedding=np.ones(4, dtype=np.float32), gender=None, age=None)
+
+        for topic, payload in [("image", SimpleNamespace(signal=SimpleNamespace(id=image_id))),
+                               ("face", SimpleNamespace(mentions=[mention(face)])),
+                               ("id", SimpleNamespace(mentions=[mention("stranger")]))]:
+            frame_event = Event.for_payload(payload)
+            frame_event = dataclasses.replace(frame_event, metadata=dataclasses.replace(
+                frame_event.metadata, timestamp=frame_event.metadata.timestamp - age))
+            self.bus.publish(topic, frame_event)
+
+    def test_stale_frames_are_dropped(self):
+        self.publish_frame(age=3)
+        self.assertEqual([], self.responses)
+        self.assertEqual(3, self.deadlines.count("stale"))
+        self.assertEqual(0, len(self.service.face_groups))
+
+        self.publish_frame(age=0)
+        self.assertEqual(1, len(self.responses))
@@ -0,0 +1,98 @@
+import unittest
+
+import numpy as np
+from cltl.face_recognition.api import Face
+from emissor.representation.entity import Gender
+
+from cltl.g2ky.embedding import EmbeddingIndex, FacePrototype
+from cltl.g2ky.visual import VisualGetToKnowYou, ConvState
+
+
+class TestEmbeddingIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = EmbeddingIndex(threshold=0.9, capacity=2)
+
+    def test_empty_index(self):
+        self.assertEqual([(None, 0.0)], self.index.query([np.ones(4)]))
+
+    def test_query(self):
+        self.index.add("id1", np.array([[1, 0, 0, 0], [1, 0.1, 0, 0]]))
+        self.index.add("id2", np.array([0, 1, 0, 0]))
+        self.index.add("id3", np.array([0, 0, 1, 0]))
+
+        self.assertEqual(4, len(self.index))
+
+        matches = self.index.query([np.array([2, 0, 0, 0]), np.array([0, 0, 0, 1]), np.array([0, 0.1, 2, 0])])
+        self.assertEqual(["id1", None, "id3"], [identifier for identifier, _ in matches])
+        self.assertAlmostEqual(1.0, matches[0][1], places=5)
+
+    def test_query_with_invalid_embeddings(self):
+        self.index.add("id1", np.array([1, 0, 0, 0]))
+
+        matches = self.index.query([np.empty((0,)), np.array([1, 0, 0, 0])])
+        self.assertEqual([None, "id1"], [identifier for identifier, _ in matches])
+
+    def test_query_candidates(self):
+        rng = np.random.default_rng(0)
+        centers = rng.standard_normal((50, 16))
+        index, exhaustive = EmbeddingIndex(threshold=0.5, candidates=4), EmbeddingIndex(threshold=0.5, candidates=None)
+        for idx, center in enumerate(centers):
+            prototype = FacePrototype.from_embeddings(center + 0.3 * rng.standard_normal((5, 16)))
+            index.add(f"id{idx}", prototype.embeddings)
+            exhaustive.add(f"id{idx}", prototype.embeddings)
+        self.assertEqual(150, len(index))
+
+        queries = list(centers + 0.3 * rng.standard_normal((50, 16))) + [np.empty((0,))]
+        matches = index.query(queries)
+        self.assertEqual([f"id{idx}" for idx in range(50)] + [None], [identifier for identifier, _ in matches])
+        for (_, score), (_, expected) in zip(matches, exhaustive.query(queries)):
+            self.assertAlmostEqual(expected, score, places=5)
+
+    def test_dimension_mismatch(self):
+        self.index.add("id1", np.array([1, 0, 0, 0]))
+
+        with self.assertRaises(ValueError):
+            self.index.add("id2", np.array([1, 0]))
+
+
+class TestFacePrototype(unittest.TestCase):
+    def test_prototype(self):
+        embeddings = [np.array([1, 0, 0]), np.array([1, 0.1, 0]), np.array([0.9, 0, 0.1]), np.array([1, 0.5, 0])]
+        prototype = FacePrototype.from_embeddings(embeddings, max_exemplars=2)
+
+        self.assertEqual((3, 3), prototype.embeddings.shape)
+        self.assertEqual(np.float32, prototype.embeddings.dtype)
+        np.testing.assert_allclose(np.ones(3), np.linalg.norm(prototype.embeddings, axis=1), rtol=1e-5)
+        np.testing.assert_allclose(np.array([1, 0.1, 0]) / np.linalg.norm([1, 0.1, 0]), prototype.exemplars[0],
+                                   rtol=1e-5)
+        np.testing.assert_allclose(np.array([1, 0.5, 0]) / np.linalg.norm([1, 0.5, 0]), prototype.exemplars[1],
+                                   rtol=1e-5)
+
+    def test_exemplars_are_bounded(self):
+        prototype = FacePrototype.from_embeddings(np.random.rand(20, 8), max_exemplars=3)
+
+        self.assertEqual((4, 8), prototype.embeddings.shape)
+
+    def test_no_embeddings(self):
+        self.assertIsNone(FacePrototype.from_embeddings([np.empty((0,))]))
+
+
+class TestVisualReidentification(unittest.TestCase):
+    def test_recognize_friend_by_embedding(self):
+        index = EmbeddingIndex(threshold=0.9)
+        g2ky = VisualGetToKnowYou(gaze_images=2, embedding_index=index)
+        embedding = np.array([1, 2, 3, 4])
+
+        g2ky.persons_detected([("id1", Face(embedding, Gender.FEMALE, 1))])
+        g2ky.persons_detected([("id1", Face(embedding, Gender.FEMALE, 1))])
+        g2ky.persons_detected([("id1", Face(embedding + 1, Gender.FEMALE, 1))])
+        g2ky.utterance_detected("Thomas")
+        g2ky.utterance_detected("Yes")
+        self.assertIsNotNone(g2ky.state.prototype)
+        self.assertEqual(len(g2ky.state.prototype.embeddings), len(index))
+
+        g2ky.clear()
+        response = g2ky.persons_detected([("other id", Face(embedding * 1.1, Gender.FEMALE, 1))])
+        self.assertEqual("Nice to meet you again Thomas!", response)
+        self.assertEqual(ConvState.KNOWN, g2ky.state.conv_state)
+        self.assertEqual(("id1", "Thomas"), g2ky.speaker)
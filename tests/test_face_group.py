@@ -0,0 +1,67 @@
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+from cltl.face_recognition.api import Face
+from emissor.representation.entity import Gender
+from emissor.representation.scenario import Mention, MultiIndex, Annotation, Index
+
+from cltl_service.g2ky.service import FaceGroup
+
+
+def event(topic, mentions):
+    return SimpleNamespace(id=topic, metadata=SimpleNamespace(topic=topic), payload=SimpleNamespace(mentions=mentions))
+
+
+def mention(bounds, value):
+    return Mention("mention_id", [MultiIndex("img1", bounds)], [Annotation("type", value, "source", 0)])
+
+
+class TestFaceGroup(unittest.TestCase):
+    def setUp(self) -> None:
+        self.group = FaceGroup("img1", "face", "id")
+        self.embedding = np.arange(4, dtype=np.float32)
+
+    def test_persons(self):
+        self.group.add(event("face", [mention((0, 0, 10, 10), Face(self.embedding, Gender.FEMALE, 1)),
+                                      mention((20, 0, 30, 10), Face(self.embedding, Gender.MALE, 1))]))
+        self.assertFalse(self.group.complete)
+
+        self.group.add(event("id", [mention([0, 0, 10, 10], "id1"), mention([20, 0, 30, 10], "id2")]))
+        self.assertTrue(self.group.complete)
+
+        persons = self.group.get_persons()
+        self.assertEqual(["id1", "id2"], [identifier for identifier, _ in persons])
+        self.assertEqual((0, 0, 10, 10), persons[0][1].bounds)
+        self.assertTrue(np.shares_memory(self.embedding, persons[0][1].embedding))
+        self.assertEqual([("img1", (0, 0, 10, 10)), ("img1", (20, 0, 30, 10))], self.group.segment_keys)
+
+    def test_no_faces(self):
+        self.group.add(event("face", [mention((0, 0, 100, 100), None)]))
+
+        self.assertTrue(self.group.complete)
+        self.assertEqual([], self.group.get_persons())
+
+    def test_faces_without_ids(self):
+        self.group.add(event("face", [mention((0, 0, 10, 10), Face(self.embedding, Gender.FEMALE, 1))]))
+
+        self.assertTrue(self.group.has_faces)
+        self.assertEqual([None], [identifier for identifier, _ in self.group.get_persons()])
+
+    def test_release(self):
+        self.group.add(event("face", [mention((0, 0, 10, 10), Face(self.embedding, Gender.FEMALE, 1))]))
+        self.group.add(event("id", [mention((0, 0, 10, 10), "id1")]))
+        self.group.release()
+
+        self.assertFalse(self.group.has_faces)
+        self.assertEqual([], self.group.segment_keys)
+
+    def test_segment_without_bounds(self):
+        face = Mention("mention_id", [Index("img1", 0, 10)], [Annotation("type", Face(self.embedding, None, 1),
+                                                                         "source", 0)])
+        self.group.add(event("face", [face]))
+
+        self.assertEqual([("img1", None)], self.group.segment_keys)
+        img_id, bbox = self.group.segment_key(None)
+        self.assertEqual("img1", img_id)
+        self.assertIsNone(bbox)
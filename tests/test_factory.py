@@ -0,0 +1,100 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+from cltl.g2ky.friends import SQLiteFriendStore
+from cltl.g2ky.verbal import VerbalGetToKnowYou
+from cltl.g2ky.visual import VisualGetToKnowYou, Timing
+from cltl_service.g2ky.factory import create_g2ky, create_friends
+
+
+class Config(dict):
+    def get(self, key, multi=False):
+        return self[key]
+
+    def get_int(self, key):
+        return int(self[key])
+
+    def get_float(self, key):
+        return float(self[key])
+
+    def get_boolean(self, key):
+        return self[key] == "true"
+
+
+class ConfigManager:
+    def __init__(self, sections):
+        self.sections = sections
+
+    def get_config(self, name):
+        return Config(self.sections.get(name, {}))
+
+
+class TestFactory(unittest.TestCase):
+    def test_verbal(self):
+        g2ky = create_g2ky(ConfigManager({"cltl.g2ky": {"implementation": "verbal"}}))
+
+        self.assertIsInstance(g2ky, VerbalGetToKnowYou)
+
+    def test_visual(self):
+        g2ky = create_g2ky(ConfigManager({"cltl.g2ky": {"implementation": "visual"},
+                                          "cltl.g2ky.visual": {"gaze_images": "3", "min_gaze_images": "2",
+                                                               "timing": "clock", "prompt_interval": "2.0"}}))
+
+        self.assertIsInstance(g2ky, VisualGetToKnowYou)
+        self.assertEqual(3, g2ky._gaze_images)
+        self.assertEqual(2, g2ky._min_gaze_images)
+        self.assertEqual(Timing(prompt_interval=2.0), g2ky._timing)
+
+    def test_sessions(self):
+        factory = create_g2ky(ConfigManager({"cltl.g2ky": {"implementation": "verbal", "sessions": "true"}}))
+
+        self.assertIsNot(factory(), factory())
+        self.assertIsInstance(factory(), VerbalGetToKnowYou)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            create_g2ky(ConfigManager({"cltl.g2ky": {"implementation": "unknown"}}))
+        with self.assertRaises(ValueError):
+            create_g2ky(ConfigManager({"cltl.g2ky.visual": {"timing": "unknown"}}))
+
+    def test_sessions_share_friends(self):
+        factory = create_g2ky(ConfigManager({"cltl.g2ky": {"implementation": "visual", "sessions": "true"},
+                                             "cltl.g2ky.friends": {"embedding_threshold": "0.7"},
+                                             "cltl.g2ky.tracking": {"enabled": "true", "max_misses": "3"}}))
+        first, second = factory(), factory()
+
+        self.assertIs(first._friends, second._friends)
+        self.assertIs(first._embedding_index, second._embedding_index)
+        self.assertEqual(0.7, first._embedding_index.threshold)
+        self.assertIsNot(first._tracker, second._tracker)
+        self.assertEqual(3, first._tracker._max_misses)
+
+        factory.friends.friend_store.add("thomas", "Thomas")
+        self.assertEqual("Thomas", second._friends.get("thomas"))
+
+    def test_verbal_sessions_share_names(self):
+        factory = create_g2ky(ConfigManager({"cltl.g2ky": {"implementation": "verbal", "sessions": "true"}}))
+        first, second = factory(), factory()
+
+        self.assertIs(first._names, second._names)
+        for utterance in ["Hi", "Thomas", "yes"]:
+            first.utterance_detected(utterance)
+        second.utterance_detected("Hi")
+        second.utterance_detected("Tomas")
+        self.assertEqual(first.speaker[0], second.state.face_id)
+
+    def test_persistent_friends(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config = ConfigManager({"cltl.g2ky.friends": {"path": os.path.join(tmp_dir, "friends.db"),
+                                                          "flush_interval": "0"}})
+            friends = create_friends(config)
+            self.assertIsInstance(friends.friend_store, SQLiteFriendStore)
+            friends.friend_store.add("thomas", "Thomas")
+            friends.close()
+
+            restored = pickle.loads(pickle.dumps(create_friends(config)))
+            self.assertEqual("Thomas", restored.friend_store.get("thomas"))
+            self.assertEqual("thomas", restored.name_index.best("Thomas"))
+            restored.close()
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from emissor.representation.entity import Gender
+from cltl.face_recognition.api import Face
+
+from cltl.g2ky.friends import SQLiteFriendStore
+from cltl.g2ky.visual import VisualGetToKnowYou, ConvState
+
+
+EMPTY_ARRAY = np.empty((0,))
+
+
+class TestSQLiteFriendStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "friends.db")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_lookup(self):
+        store = SQLiteFriendStore(self.path, flush_interval=None)
+        store.add("id1", "Thomas")
+
+        self.assertEqual("Thomas", store.get("id1"))
+        self.assertEqual("id1", store.find("Thomas"))
+        self.assertIsNone(store.get("id2"))
+        self.assertIsNone(store.find("Piek"))
+        self.assertIn("id1", store)
+        self.assertNotIn("id2", store)
+        store.close()
+
+    def test_write_behind_in_batches(self):
+        store = SQLiteFriendStore(self.path, batch_size=2, flush_interval=None)
+        store.add("id1", "Thomas")
+
+        reader = SQLiteFriendStore(self.path, flush_interval=None)
+        self.assertIsNone(reader.get("id1"))
+
+        store.add("id2", "Piek")
+        reader = SQLiteFriendStore(self.path, flush_interval=None)
+        self.assertEqual("Thomas", reader.get("id1"))
+        self.assertEqual("Piek", reader.get("id2"))
+
+        store.close()
+        reader.close()
+
+    def test_friends_added_by_other_store(self):
+        store = SQLiteFriendStore(self.path, flush_interval=None)
+        other = SQLiteFriendStore(self.path, batch_size=1, flush_interval=None)
+        self.assertIsNone(store.get("id1"))
+        self.assertIsNone(store.find("Thomas"))
+
+        other.add("id1", "Thomas")
+        self.assertEqual("Thomas", store.get("id1"))
+        self.assertEqual("id1", store.find("Thomas"))
+
+        store.close()
+        other.close()
+
+    def test_restart(self):
+        store = SQLiteFriendStore(self.path)
+        for i in range(100):
+            store.add(f"id{i}", f"Name {i}")
+        store.close()
+
+        store = SQLiteFriendStore(self.path)
+        self.assertEqual(100, len(store))
+        self.assertEqual("Name 42", store.get("id42"))
+        store.close()
+
+    def test_known_face_after_restart(self):
+        store = SQLiteFriendStore(self.path, flush_interval=None)
+        g2ky = VisualGetToKnowYou(gaze_images=1, friend_store=store)
+        g2ky.persons_detected([("id1", Face(EMPTY_ARRAY, Gender.FEMALE, 1))])
+        g2ky.persons_detected([("id1", Face(EMPTY_ARRAY, Gender.FEMALE, 1))])
+        g2ky.utterance_detected("Thomas")
+        g2ky.utterance_detected("Yes")
+        self.assertEqual(ConvState.KNOWN, g2ky.state.conv_state)
+        store.close()
+
+        store = SQLiteFriendStore(self.path, flush_interval=None)
+        g2ky = VisualGetToKnowYou(friend_store=store)
+        response = g2ky.persons_detected([("id1", Face(EMPTY_ARRAY, Gender.FEMALE, 1))])
+        self.assertEqual("Nice to meet you again Thomas!", response)
+        self.assertEqual(ConvState.KNOWN, g2ky.state.conv_state)
+        store.close()
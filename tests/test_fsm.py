@@ -0,0 +1,51 @@
+import unittest
+
+from cltl.g2ky.fsm import transition_log
+from cltl.g2ky.visual import State, ConvState
+
+
+class TestStateRecord(unittest.TestCase):
+    def setUp(self) -> None:
+        self.state = State(None, None, ConvState.START, [], 0)
+
+    def tearDown(self) -> None:
+        transition_log.enabled = False
+        transition_log.clear()
+
+    def test_transitions_are_precomputed(self):
+        self.assertIsInstance(ConvState.START.transitions(), frozenset)
+        self.assertIs(ConvState.START.transitions(), ConvState.START.transitions())
+
+    def test_transition_in_place(self):
+        state = self.state.transition(ConvState.KNOWN, face_id="id1", name="Thomas")
+
+        self.assertIs(self.state, state)
+        self.assertEqual(State("id1", "Thomas", ConvState.KNOWN, [], 0), self.state)
+
+    def test_invalid_transition(self):
+        with self.assertRaises(ValueError):
+            self.state.transition(ConvState.CONFIRM)
+
+    def test_stay_counts(self):
+        self.state.transition(ConvState.KNOWN, face_id="id1", name="Thomas")
+        self.state.stay()
+        self.state.stay()
+
+        self.assertEqual(2, self.state.state_count)
+
+        self.state.transition(ConvState.START)
+        self.assertEqual(State(None, None, ConvState.START, [], 0), self.state)
+
+    def test_transition_log(self):
+        self.state.transition(ConvState.GAZE)
+        self.assertEqual([], transition_log.entries)
+
+        transitions = []
+        listener = lambda from_state, to_state: transitions.append((from_state, to_state))
+        transition_log.add_listener(listener)
+        self.state.transition(ConvState.QUERY)
+        self.state.stay()
+        transition_log.remove_listener(listener)
+
+        self.assertEqual([(ConvState.GAZE, ConvState.QUERY)], [entry[1:] for entry in transition_log.entries])
+        self.assertEqual([(ConvState.GAZE, ConvState.QUERY)], transitions)
@@ -0,0 +1,103 @@
+import unittest
+from types import SimpleNamespace
+
+from cltl.combot.infra.groupby_processor import Group
+
+from cltl_service.g2ky.grouping import ExpiringGroupProcessor, TimeoutGroupByProcessor
+
+
+class PairGroup(Group):
+    def __init__(self, key):
+        self._key = key
+        self.events = []
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def complete(self) -> bool:
+        return len(self.events) == 2
+
+    def add(self, event):
+        self.events.append(event)
+
+
+class PairProcessor(ExpiringGroupProcessor):
+    def __init__(self):
+        self.processed = []
+        self.expired = []
+
+    def new_group(self, key):
+        return PairGroup(key)
+
+    def process_group(self, group):
+        self.processed.append(group.key)
+
+    def expire_group(self, group):
+        self.expired.append(group.key)
+
+    def get_key(self, event):
+        return event.key
+
+
+def event(key):
+    return SimpleNamespace(id=key, key=key)
+
+
+class TestTimeoutGroupByProcessor(unittest.TestCase):
+    def setUp(self) -> None:
+        self.time = 0
+        self.processor = PairProcessor()
+        self.groups = TimeoutGroupByProcessor(self.processor, max_size=2, timeout=1,
+                                              clock=lambda: self.time)
+
+    def test_complete_group(self):
+        self.groups.process(event("img1"))
+        self.groups.process(event("img1"))
+
+        self.assertEqual(["img1"], self.processor.processed)
+        self.assertEqual(1, self.groups.completed)
+        self.assertEqual(0, len(self.groups))
+
+    def test_expired_group(self):
+        self.groups.process(event("img1"))
+        self.time = 0.5
+        self.groups.process(event("img2"))
+        self.time = 1.2
+        self.groups.expire()
+
+        self.assertEqual(["img1"], self.processor.expired)
+        self.assertEqual(1, self.groups.expired)
+        self.assertEqual(1, len(self.groups))
+
+    def test_evicted_group(self):
+        for key in ["img1", "img2", "img3"]:
+            self.groups.process(event(key))
+
+        self.assertEqual(["img1"], self.processor.expired)
+        self.assertEqual(1, self.groups.evicted)
+        self.assertEqual(2, len(self.groups))
+
+    def test_late_event(self):
+        self.groups.process(event("img1"))
+        self.time = 2
+        self.groups.process(event("img1"))
+
+        self.assertEqual(["img1"], self.processor.expired)
+        self.assertEqual([], self.processor.processed)
+        self.assertEqual(1, self.groups.late)
+        self.assertEqual(0, len(self.groups))
+
+    def test_filtered_event(self):
+        accepted = {"img1"}
+        groups = TimeoutGroupByProcessor(self.processor, max_size=2, timeout=1, clock=lambda: self.time,
+                                         accept=lambda key: key in accepted)
+        groups.process(event("img1"))
+        groups.process(event("img2"))
+        accepted.clear()
+        groups.process(event("img1"))
+
+        self.assertEqual(["img1"], self.processor.processed)
+        self.assertEqual(1, groups.filtered)
+        self.assertEqual(0, len(groups))
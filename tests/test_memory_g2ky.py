@@ -5,7 +5,9 @@ from cltl.backend.api.camera import Bounds
 from cltl.face_recognition.api import Face
 from emissor.representation.entity import Gender
 
-from cltl.g2ky.visual import VisualGetToKnowYou, ConvState
+from cltl.g2ky.api import Input
+from cltl.g2ky.verbal import VerbalGetToKnowYou
+from cltl.g2ky.visual import VisualGetToKnowYou, ConvState, Timing
 
 
 EMPTY_ARRAY = np.empty((0,))
@@ -99,3 +101,97 @@ class TestMemoryG2KY(unittest.TestCase):
         response = self.g2ky.utterance_detected("Yes")
         self.assertEqual("Nice to meet you, Thomas!", response)
         self.assertEqual(ConvState.KNOWN, self.g2ky.state.conv_state)
+
+    def test_unidentified_faces(self):
+        response = self.g2ky.persons_detected([(None, Face(EMPTY_ARRAY, Gender.FEMALE, 1))])
+        self.assertEqual("Hi Stranger! We haven't met, let me look at your face!", response)
+        self.assertEqual(ConvState.GAZE, self.g2ky.state.conv_state)
+
+        for i in range(10):
+            response = self.g2ky.persons_detected([(None, Face(EMPTY_ARRAY, Gender.FEMALE, 1))])
+            self.assertIsNone(response)
+            self.assertEqual(ConvState.GAZE, self.g2ky.state.conv_state)
+            self.assertEqual([], self.g2ky.state.faces)
+
+    def test_inputs(self):
+        self.assertEqual({Input.UTTERANCE}, VerbalGetToKnowYou().inputs)
+        self.assertEqual({Input.UTTERANCE, Input.FACES}, self.g2ky.inputs)
+
+        for i in range(6):
+            self.g2ky.persons_detected([("id1", Face(EMPTY_ARRAY, Gender.FEMALE, 1))])
+        self.assertEqual(ConvState.QUERY, self.g2ky.state.conv_state)
+        self.assertEqual({Input.UTTERANCE, Input.FACES}, self.g2ky.inputs)
+
+        self.g2ky.utterance_detected("Thomas")
+        self.assertEqual({Input.UTTERANCE}, self.g2ky.inputs)
+
+        self.g2ky.utterance_detected("Yes")
+        self.assertEqual({Input.UTTERANCE, Input.FACES}, self.g2ky.inputs)
+
+    def test_multiple_persons_while_asking_name(self):
+        for i in range(6):
+            self.g2ky.persons_detected([("id1", Face(EMPTY_ARRAY, Gender.FEMALE, 1))])
+        self.assertEqual(ConvState.QUERY, self.g2ky.state.conv_state)
+        self.assertIn(Input.FACES, self.g2ky.inputs)
+
+        persons = [("id1", Face(EMPTY_ARRAY, Gender.FEMALE, 1)), ("id2", Face(EMPTY_ARRAY, Gender.MALE, 1))]
+        responses = [self.g2ky.persons_detected(persons) for _ in range(3)]
+        self.assertEqual([None, None, "Hi there! Apologizes, but I will only talk to one of you at a time.."],
+                         responses)
+        self.assertEqual(ConvState.QUERY, self.g2ky.state.conv_state)
+
+    def test_early_gaze_exit(self):
+        g2ky = VisualGetToKnowYou(min_gaze_images=3)
+        face = Face(np.ones(4), Gender.FEMALE, 1)
+        for i in range(3):
+            g2ky.persons_detected([("id1", face)])
+        self.assertEqual(ConvState.GAZE, g2ky.state.conv_state)
+
+        response = g2ky.persons_detected([("id1", face)])
+        self.assertEqual("What is your name, stranger?", response)
+        self.assertEqual("id1", g2ky.state.face_id)
+        self.assertEqual({}, g2ky.state.votes)
+
+    def test_early_gaze_exit_disagreement(self):
+        g2ky = VisualGetToKnowYou(min_gaze_images=3)
+        g2ky.persons_detected([("id1", Face(EMPTY_ARRAY, Gender.FEMALE, 1))])
+        for identifier in ["id1", "id2", "id1"]:
+            g2ky.persons_detected([(identifier, Face(EMPTY_ARRAY, Gender.FEMALE, 1))])
+        self.assertEqual(ConvState.GAZE, g2ky.state.conv_state)
+
+        g2ky.persons_detected([("id1", Face(EMPTY_ARRAY, Gender.FEMALE, 1))])
+        self.assertEqual(ConvState.GAZE, g2ky.state.conv_state)
+        g2ky.persons_detected([("id1", Face(EMPTY_ARRAY, Gender.FEMALE, 1))])
+        self.assertEqual(ConvState.QUERY, g2ky.state.conv_state)
+        self.assertEqual("id1", g2ky.state.face_id)
+
+        g2ky = VisualGetToKnowYou(min_gaze_images=3)
+        g2ky.persons_detected([("id1", Face(EMPTY_ARRAY, Gender.FEMALE, 1))])
+        for embedding in np.eye(3):
+            g2ky.persons_detected([("id1", Face(embedding, Gender.FEMALE, 1))])
+        self.assertEqual(ConvState.GAZE, g2ky.state.conv_state)
+
+    def test_time_based(self):
+        now = [0.0]
+        g2ky = VisualGetToKnowYou(friends={"id1": "Thomas"}, timing=Timing(), clock=lambda: now[0])
+
+        self.assertEqual("Hi, anyone there? I can't see anyone..", g2ky.persons_detected([]))
+        now[0] = 4.9
+        self.assertIsNone(g2ky.persons_detected([]))
+        now[0] = 5.0
+        self.assertEqual("Hi, anyone there? I can't see anyone..", g2ky.persons_detected([]))
+
+        face = Face(EMPTY_ARRAY, Gender.FEMALE, 1)
+        self.assertIsNone(g2ky.persons_detected([("id1", face), ("id2", face)]))
+        now[0] = 6.5
+        self.assertEqual("Hi there! Apologizes, but I will only talk to one of you at a time..",
+                         g2ky.persons_detected([("id1", face), ("id2", face)]))
+
+        self.assertEqual("Nice to meet you again Thomas!", g2ky.persons_detected([("id1", face)]))
+        # Frames within the speaker change delay don't change the speaker, independent of their number
+        for _ in range(10):
+            g2ky.persons_detected([("id2", face)])
+        self.assertEqual(ConvState.KNOWN, g2ky.state.conv_state)
+        now[0] = 8.1
+        g2ky.persons_detected([("id2", face)])
+        self.assertEqual(ConvState.START, g2ky.state.conv_state)
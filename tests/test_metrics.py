@@ -0,0 +1,126 @@
+import unittest
+import urllib.request
+import uuid
+from types import SimpleNamespace
+
+import numpy as np
+from cltl.combot.event.emissor import AnnotationEvent, ImageSignalEvent
+from cltl.combot.infra.event import Event
+from cltl.combot.infra.event.memory import SynchronousEventBus
+from cltl.face_recognition.api import Face
+from emissor.representation.scenario import Annotation, ImageSignal, Mention, MultiIndex
+
+from cltl.g2ky.visual import ConvState, State, VisualGetToKnowYou
+from cltl_service.g2ky.metrics import MetricsRegistry, ServiceMetrics, MetricsServer, event_age
+from cltl_service.g2ky.service import GetToKnowYouService
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("latency", "Latency", ("topic",), buckets=(0.1, 1))
+        histogram.observe(0.05, "a")
+        histogram.observe(0.5, "a")
+        histogram.observe(5, "a")
+
+        self.assertEqual(3, histogram.count("a"))
+        self.assertEqual(0, histogram.count("b"))
+
+        text = registry.render()
+        self.assertIn('latency_bucket{topic="a",le="0.1"} 1', text)
+        self.assertIn('latency_bucket{topic="a",le="1"} 2', text)
+        self.assertIn('latency_bucket{topic="a",le="+Inf"} 3', text)
+        self.assertIn('latency_count{topic="a"} 3', text)
+
+    def test_callback(self):
+        registry = MetricsRegistry()
+        registry.callback("dropped_total", "Dropped", lambda: {("late",): 2}, labels=("reason",), type="counter")
+
+        self.assertIn("# TYPE dropped_total counter", registry.render())
+        self.assertIn('dropped_total{reason="late"} 2', registry.render())
+
+    def test_event_age(self):
+        self.assertIsNone(event_age(SimpleNamespace(metadata=SimpleNamespace())))
+        self.assertAlmostEqual(2, event_age(SimpleNamespace(metadata=SimpleNamespace(timestamp=1_700_000_000)),
+                                            now=1_700_000_002))
+        self.assertAlmostEqual(2, event_age(SimpleNamespace(metadata=SimpleNamespace(timestamp=1_700_000_000_000)),
+                                            now=1_700_000_002))
+
+    def test_service_metrics(self):
+        now = [0]
+        metrics = ServiceMetrics(clock=lambda: now[0])
+        metrics.start()
+        try:
+            State(None, None, ConvState.START, [], 0).transition(ConvState.GAZE)
+        finally:
+            metrics.stop()
+        self.assertEqual(1, metrics.transitions.get("START", "GAZE"))
+
+        metrics.face_seen("session")
+        now[0] = 2
+        metrics.face_seen("session")
+        now[0] = 3
+        metrics.speaker_published("session")
+        metrics.speaker_published("session")
+
+        self.assertEqual(1, metrics.time_to_known.count())
+        self.assertIn("g2ky_time_to_known_seconds_sum 3", metrics.registry.render())
+
+    def test_new_conversation(self):
+        now = [0]
+        metrics = ServiceMetrics(clock=lambda: now[0])
+        metrics.face_seen("session")
+        now[0] = 100
+        metrics.face_seen("session", new_conversation=True)
+        now[0] = 103
+        metrics.speaker_published("session")
+
+        self.assertIn("g2ky_time_to_known_seconds_sum 3", metrics.registry.render())
+
+    def test_time_to_known_after_stranger_left(self):
+        now = [0]
+        metrics = ServiceMetrics(clock=lambda: now[0])
+        bus = SynchronousEventBus()
+        g2ky = VisualGetToKnowYou(friends={"friend": "Thomas"})
+        service = GetToKnowYouService("utterance", "image", "face", "id", "response", "speaker", None, None, [],
+                                      g2ky, SimpleNamespace(get_current_scenario_id=lambda: "scenario"), bus, None,
+                                      metrics=metrics)
+
+        def frame(identifier):
+            image = ImageSignal.for_scenario("scenario", 0, 0, None, (0, 0, 100, 100))
+            face = Face(np.ones(4, dtype=np.float32), None, None) if identifier else None
+            mention = lambda value: Mention(str(uuid.uuid4()), [MultiIndex(image.id, (0, 0, 10, 10))],
+                                            [Annotation("", value, "", 0)])
+            bus.publish("image", Event.for_payload(ImageSignalEvent.create(image)))
+            bus.publish("face", Event.for_payload(AnnotationEvent.create([mention(face)])))
+            if identifier:
+                bus.publish("id", Event.for_payload(AnnotationEvent.create([mention(identifier)])))
+
+        service.start()
+        try:
+            frame("stranger")
+            self.assertEqual(ConvState.GAZE, g2ky.state.conv_state)
+            for _ in range(3):
+                frame(None)
+            self.assertEqual(ConvState.START, g2ky.state.conv_state)
+
+            now[0] = 3600
+            frame("friend")
+        finally:
+            service.stop()
+
+        self.assertEqual(1, metrics.time_to_known.count())
+        self.assertIn("g2ky_time_to_known_seconds_sum 0", metrics.registry.render())
+
+    def test_server(self):
+        registry = MetricsRegistry()
+        registry.counter("events_total", "Events").inc()
+        server = MetricsServer(registry, 0)
+        server.start()
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+                body = response.read().decode("utf-8")
+        finally:
+            server.stop()
+
+        self.assertIn("events_total 1", body)
@@ -0,0 +1,72 @@
+import unittest
+
+from cltl.g2ky.names import NameIndex, normalize_name
+from cltl.g2ky.verbal import VerbalGetToKnowYou, ConvState
+
+
+class TestNameIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = NameIndex([("id1", "John"), ("id2", "Thomas"), ("id3", "Anna Maria")])
+
+    def test_normalize(self):
+        self.assertEqual("jose maria", normalize_name("  José-Maria. "))
+
+    def test_search(self):
+        self.assertEqual("id1", self.index.best("john."))
+        self.assertEqual("id1", self.index.best("Jon"))
+        self.assertEqual("id3", self.index.best("ana maria"))
+        self.assertIsNone(self.index.best("Piek"))
+
+    def test_exclude(self):
+        self.assertIsNone(self.index.best("John", exclude={"id1"}))
+
+    def test_update(self):
+        self.index.add("id1", "Piek")
+        self.index.remove("id2")
+
+        self.assertIsNone(self.index.best("John"))
+        self.assertIsNone(self.index.best("Thomas"))
+        self.assertEqual("id1", self.index.best("Piek"))
+        self.assertEqual(2, len(self.index))
+
+
+    def test_lazy_loading(self):
+        loads = []
+
+        def loader():
+            loads.append(True)
+            return [("id1", "John"), ("id2", "Thomas")]
+
+        index = NameIndex(loader=loader)
+        index.add("id1", "Piek")
+        self.assertEqual([], loads)
+
+        self.assertEqual("id2", index.best("Tomas"))
+        self.assertEqual("id1", index.best("Piek"))
+        self.assertIsNone(index.best("John"))
+        self.assertEqual(2, len(index))
+        self.assertEqual(1, len(loads))
+
+
+class TestVerbalNames(unittest.TestCase):
+    def setUp(self) -> None:
+        self.g2ky = VerbalGetToKnowYou(friends={"id1": "John"})
+        self.g2ky.utterance_detected("Hi")
+
+    def test_approximate_name(self):
+        self.assertEqual("So your name is John?", self.g2ky.utterance_detected("Jon."))
+        self.g2ky.utterance_detected("yes")
+
+        self.assertEqual(("id1", "John"), self.g2ky.speaker)
+
+    def test_new_identity_after_rejection(self):
+        self.g2ky.utterance_detected("Jon")
+        self.g2ky.utterance_detected("no")
+        self.assertEqual(ConvState.QUERY, self.g2ky.state.conv_state)
+
+        self.assertEqual("So your name is Jon?", self.g2ky.utterance_detected("Jon"))
+        self.g2ky.utterance_detected("yes")
+
+        identifier, name = self.g2ky.speaker
+        self.assertEqual("Jon", name)
+        self.assertNotEqual("id1", identifier)
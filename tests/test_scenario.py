@@ -0,0 +1,157 @@
+import unittest
+import uuid
+from types import SimpleNamespace
+
+import numpy as np
+from cltl.combot.event.emissor import AnnotationEvent, ImageSignalEvent, ScenarioStarted, ScenarioStopped, \
+    TextSignalEvent
+from cltl.combot.infra.event import Event
+from cltl.combot.infra.event.memory import SynchronousEventBus
+from cltl.face_recognition.api import Face
+from emissor.representation.scenario import Annotation, ImageSignal, Mention, MultiIndex, TextSignal
+
+from cltl.g2ky.visual import VisualGetToKnowYou
+from cltl_service.g2ky.scenario import ScenarioIdCache, SignalScenarios, PendingAnnotations
+from cltl_service.g2ky.service import GetToKnowYouService
+from cltl_service.g2ky.session import SessionManager
+
+
+class Client:
+    def __init__(self):
+        self.calls = 0
+
+    def get_current_scenario_id(self):
+        self.calls += 1
+        return f"scenario_{self.calls}"
+
+
+def scenario_event(payload):
+    return SimpleNamespace(metadata=SimpleNamespace(topic="scenario"), payload=payload)
+
+
+class TestScenarioIdCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = 0
+        self.client = Client()
+        self.cache = ScenarioIdCache(self.client, ttl=10, clock=lambda: self.now)
+
+    def test_cached_until_expired(self):
+        self.assertEqual("scenario_1", self.cache.get())
+        self.now = 9
+        self.assertEqual("scenario_1", self.cache.get())
+        self.now = 10
+        self.assertEqual("scenario_2", self.cache.get())
+
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(2, self.cache.misses)
+
+    def test_scenario_events(self):
+        self.cache.update(scenario_event(ScenarioStarted("ScenarioStarted", SimpleNamespace(id="started"))))
+        self.assertEqual("started", self.cache.get())
+        self.assertEqual(0, self.client.calls)
+
+        self.cache.update(scenario_event(ScenarioStopped("ScenarioStopped", SimpleNamespace(id="started"))))
+        self.assertEqual("scenario_1", self.cache.get())
+        self.assertEqual(1, self.client.calls)
+
+
+def frame(scenario_id, value):
+    image = ImageSignal.for_scenario(scenario_id, 0, 0, None, (0, 0, 100, 100))
+    mention = lambda annotation: Mention(str(uuid.uuid4()), [MultiIndex(image.id, (0, 0, 20, 20))],
+                                         [Annotation("", annotation, "", 0)])
+    face = Face(np.full(4, value, dtype=np.float32), None, None)
+
+    return [("image", Event.for_payload(ImageSignalEvent.create(image))),
+            ("face", Event.for_payload(AnnotationEvent.create([mention(face)]))),
+            ("id", Event.for_payload(AnnotationEvent.create([mention("stranger")])))]
+
+
+class TestSignalScenarios(unittest.TestCase):
+    def test_scenario_from_events(self):
+        scenarios = SignalScenarios(capacity=1)
+        utterance = TextSignal.for_scenario("chat", 0, 0, None, "Hi")
+        first, second = frame("first", 1.0), frame("second", 1.0)
+
+        self.assertEqual("chat", scenarios.scenario_id(Event.for_payload(TextSignalEvent.for_speaker(utterance))))
+        self.assertEqual("first", scenarios.scenario_id(first[0][1]))
+        self.assertEqual("first", scenarios.scenario_id(first[1][1]))
+        self.assertEqual("second", scenarios.scenario_id(second[0][1]))
+        self.assertEqual("second", scenarios.scenario_id(second[2][1]))
+        # Evicted
+        self.assertIsNone(scenarios.scenario_id(first[2][1]))
+        self.assertIsNone(scenarios.scenario_id(Event.for_payload(SimpleNamespace(intentions=[]))))
+
+
+class TestPendingAnnotations(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = 0
+        self.scenarios = SignalScenarios()
+        self.pending = PendingAnnotations(timeout=1, capacity=2, clock=lambda: self.now)
+
+    def test_held_until_signal(self):
+        (_, image), (_, face), (_, id) = frame("first", 1.0)
+
+        self.assertEqual([], self.pending.arrived(face, self.scenarios))
+        self.assertEqual([], self.pending.arrived(id, self.scenarios))
+        self.assertEqual([image, face, id], self.pending.arrived(image, self.scenarios))
+        self.assertEqual(0, len(self.pending))
+
+        self.scenarios.scenario_id(image)
+        self.assertEqual([face], self.pending.arrived(face, self.scenarios))
+
+    def test_released_without_signal(self):
+        first, second, third = frame("first", 1.0), frame("second", 1.0), frame("third", 1.0)
+
+        self.pending.arrived(first[1][1], self.scenarios)
+        self.now = 0.5
+        self.pending.arrived(second[1][1], self.scenarios)
+        self.assertEqual([], self.pending.expired())
+        self.now = 1
+        self.assertEqual([first[1][1]], self.pending.expired())
+
+        self.pending.arrived(third[1][1], self.scenarios)
+        # Over capacity
+        self.assertEqual([second[1][1]], self.pending.arrived(first[2][1], self.scenarios))
+
+
+class TestServiceScenarios(unittest.TestCase):
+    def test_sessions_by_event_scenario(self):
+        bus = SynchronousEventBus()
+        responses = []
+        bus.subscribe("response", lambda event: responses.append(event.payload.signal.time.container_id))
+        client = Client()
+        sessions = SessionManager(VisualGetToKnowYou)
+        service = GetToKnowYouService("utterance", "image", "face", "id", "response", "speaker", None, None, [],
+                                      None, client, bus, None, sessions=sessions)
+        service.start()
+        try:
+            for topic, event in frame("first", 1.0) + frame("second", -1.0):
+                bus.publish(topic, event)
+            utterance = TextSignal.for_scenario("first", 0, 0, None, "Hi")
+            bus.publish("utterance", Event.for_payload(TextSignalEvent.for_speaker(utterance)))
+        finally:
+            service.stop()
+
+        self.assertEqual({"first", "second"}, {session_id for session_id, _ in sessions.sessions()})
+        self.assertEqual({"first", "second"}, set(responses))
+        self.assertEqual(0, client.calls)
+
+    def test_annotations_before_image(self):
+        bus = SynchronousEventBus()
+        responses = []
+        bus.subscribe("response", lambda event: responses.append(event.payload.signal.time.container_id))
+        client = Client()
+        sessions = SessionManager(VisualGetToKnowYou)
+        service = GetToKnowYouService("utterance", "image", "face", "id", "response", "speaker", None, None, [],
+                                      None, client, bus, None, sessions=sessions)
+        service.start()
+        try:
+            for topic, event in reversed(frame("first", 1.0)):
+                bus.publish(topic, event)
+        finally:
+            service.stop()
+
+        self.assertEqual({"first"}, {session_id for session_id, _ in sessions.sessions()})
+        self.assertEqual({"first"}, set(responses))
+        self.assertEqual(0, len(service.face_groups))
+        self.assertEqual(0, client.calls)
@@ -0,0 +1,76 @@
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from cltl_service.g2ky.serialization import BinarySerializer, CODECS, without_kombu_compression
+
+
+class TestBinarySerializer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.embedding = np.arange(8, dtype=np.float32)
+        self.event = SimpleNamespace(id="event_id",
+                                     metadata=SimpleNamespace(topic="face"),
+                                     payload=SimpleNamespace(embedding=self.embedding,
+                                                             matrix=np.ones((2, 3), dtype=np.int16),
+                                                             labels=["a", "b"], count=np.int64(3)))
+
+    def test_round_trip(self):
+        for codec in ["none", "zlib", "bz2", "lzma"]:
+            with self.subTest(codec):
+                serializer = BinarySerializer(codec)
+                decoded = serializer.decode(serializer.encode(self.event))
+
+                self.assertEqual("event_id", decoded.id)
+                self.assertEqual("face", decoded.metadata.topic)
+                np.testing.assert_array_equal(self.embedding, decoded.payload.embedding)
+                self.assertEqual(np.float32, decoded.payload.embedding.dtype)
+                self.assertEqual((2, 3), decoded.payload.matrix.shape)
+                self.assertEqual(np.int16, decoded.payload.matrix.dtype)
+                self.assertEqual(["a", "b"], decoded.payload.labels)
+                self.assertEqual(3, decoded.payload.count)
+
+    def test_arrays_are_not_copied(self):
+        serializer = BinarySerializer()
+        data = serializer.encode(self.event)
+        decoded = serializer.decode(data)
+
+        self.assertTrue(np.shares_memory(decoded.payload.embedding, np.frombuffer(data, dtype=np.uint8)))
+
+    def test_topic_compression(self):
+        serializer = BinarySerializer("none", {"face": "zlib"})
+        data = serializer.encode(self.event)
+
+        self.assertNotEqual(BinarySerializer().encode(self.event), data)
+        np.testing.assert_array_equal(self.embedding, serializer.decode(data).payload.embedding)
+
+    def test_topic_compression_without_topic(self):
+        serializer = BinarySerializer("lzma", {"face": "zlib"})
+        event = SimpleNamespace(id="event_id", payload=SimpleNamespace(embedding=self.embedding))
+
+        with self.assertLogs("cltl_service.g2ky.serialization", level="WARNING"):
+            data = serializer.encode(event)
+        self.assertEqual(CODECS["lzma"], data[5])
+        np.testing.assert_array_equal(self.embedding, serializer.decode(data).payload.embedding)
+
+        without_topic = SimpleNamespace(id="event_id", metadata=SimpleNamespace(topic=None), payload=None)
+        self.assertEqual(CODECS["lzma"], serializer.encode(without_topic)[5])
+        self.assertEqual(CODECS["zlib"], serializer.encode(self.event)[5])
+        self.assertEqual(CODECS["zlib"], serializer.encode({"metadata": {"topic": "face"}})[5])
+
+    def test_without_kombu_compression(self):
+        class ConfigManager:
+            def get_config(self, name):
+                return {"compression": "bzip2", "server": "amqp://localhost:5672"}
+
+        config_manager = without_kombu_compression(ConfigManager())
+        kombu_config = config_manager.get_config("cltl.event.kombu")
+
+        self.assertIsNone(kombu_config.get("compression"))
+        self.assertNotIn("compression", kombu_config)
+        self.assertEqual("amqp://localhost:5672", kombu_config.get("server"))
+        self.assertEqual("bzip2", config_manager.get_config("cltl.other").get("compression"))
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ValueError):
+            BinarySerializer("snappy")
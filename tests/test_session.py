@@ -0,0 +1,63 @@
+import unittest
+
+from cltl.g2ky.verbal import VerbalGetToKnowYou
+from cltl_service.g2ky.session import SessionManager
+
+
+class TestSessionManager(unittest.TestCase):
+    def setUp(self) -> None:
+        self.time = 0
+        self.sessions = SessionManager(VerbalGetToKnowYou, max_sessions=2, ttl=10, clock=lambda: self.time)
+
+    def test_sessions_are_created_lazily(self):
+        self.assertEqual(0, len(self.sessions))
+
+        first = self.sessions.get("scenario1")
+        self.assertIs(first, self.sessions.get("scenario1"))
+        self.assertIsNot(first, self.sessions.get("scenario2"))
+        self.assertEqual(2, len(self.sessions))
+
+    def test_sessions_keep_state(self):
+        self.sessions.get("scenario1").utterance_detected("Hallo")
+        self.sessions.get("scenario1").utterance_detected("Thomas")
+
+        self.assertEqual("Thomas", self.sessions.get("scenario1").state.name)
+        self.assertIsNone(self.sessions.get("scenario2").state.name)
+
+    def test_least_recently_used_session_is_evicted(self):
+        self.sessions.get("scenario1")
+        self.sessions.get("scenario2")
+        self.sessions.get("scenario1")
+        self.sessions.get("scenario3")
+
+        self.assertIn("scenario1", self.sessions)
+        self.assertNotIn("scenario2", self.sessions)
+        self.assertIn("scenario3", self.sessions)
+
+    def test_idle_sessions_expire(self):
+        self.sessions.get("scenario1")
+        self.time = 5
+        self.sessions.get("scenario2")
+        self.time = 12
+        self.sessions.evict_expired()
+
+        self.assertNotIn("scenario1", self.sessions)
+        self.assertIn("scenario2", self.sessions)
+
+    def test_peek_does_not_refresh(self):
+        self.assertIsNone(self.sessions.peek("scenario1"))
+        self.assertEqual(0, len(self.sessions))
+
+        first = self.sessions.get("scenario1")
+        self.time = 8
+        self.assertIs(first, self.sessions.peek("scenario1"))
+        self.time = 11
+        self.sessions.evict_expired()
+        self.assertNotIn("scenario1", self.sessions)
+
+    def test_single_instance(self):
+        g2ky = VerbalGetToKnowYou()
+        sessions = SessionManager.for_instance(g2ky)
+
+        self.assertEqual([(None, g2ky)], list(sessions.sessions()))
+        self.assertIs(g2ky, sessions.get(None))
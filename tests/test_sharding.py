@@ -0,0 +1,211 @@
+import time
+import unittest
+from collections import Counter
+from unittest import mock
+
+from cltl.combot.event.emissor import TextSignalEvent
+from cltl.combot.infra.event import Event
+from cltl.combot.infra.event.memory import SynchronousEventBus
+from emissor.representation.scenario import TextSignal
+
+from cltl.g2ky.verbal import VerbalGetToKnowYou
+from cltl_service.g2ky.factory import create_g2ky
+from cltl_service.g2ky.sharding import HashRing, ShardedGetToKnowYouService
+from tests.test_factory import ConfigManager
+from tests.test_scenario import frame
+
+
+class Client:
+    def get_current_scenario_id(self):
+        return "current"
+
+
+def utterance(text, scenario_id):
+    signal = TextSignal.for_scenario(scenario_id, 0, 0, None, text)
+
+    return Event.for_payload(TextSignalEvent.for_speaker(signal))
+
+
+class TestHashRing(unittest.TestCase):
+    def test_distribution(self):
+        ring = HashRing(["a", "b", "c", "d"])
+        counts = Counter(ring.node_for(f"scenario-{idx}") for idx in range(10000))
+
+        self.assertEqual({"a", "b", "c", "d"}, set(counts))
+        self.assertTrue(all(count > 1500 for count in counts.values()), counts)
+
+    def test_minimal_movement(self):
+        ring = HashRing(["a", "b", "c"])
+        keys = [f"scenario-{idx}" for idx in range(3000)]
+        before = {key: ring.node_for(key) for key in keys}
+
+        ring.add("d")
+        moved = [key for key in keys if ring.node_for(key) != before[key]]
+        self.assertTrue(all(ring.node_for(key) == "d" for key in moved))
+        self.assertLess(len(moved), 0.4 * len(keys))
+
+        ring.remove("d")
+        self.assertEqual(before, {key: ring.node_for(key) for key in keys})
+
+    def test_invalid(self):
+        ring = HashRing(["a"])
+        with self.assertRaises(ValueError):
+            ring.add("a")
+        ring.remove("a")
+        with self.assertRaises(ValueError):
+            ring.node_for("scenario")
+
+
+class TestShardedServiceConfig(unittest.TestCase):
+    def test_from_config(self):
+        config = ConfigManager({"cltl.g2ky": {"implementation": "verbal", "sessions": "true"},
+                                "cltl.g2ky.events": {"topic_utterance": "utterance", "topic_image": "image",
+                                                     "topic_face": "face", "topic_id": "id",
+                                                     "topic_response": "response", "topic_speaker": "speaker"},
+                                "cltl.g2ky.sharding": {"enabled": "true", "workers": "3", "restart": "false"}})
+
+        service = ShardedGetToKnowYouService.from_config(create_g2ky(config), Client(), SynchronousEventBus(), config)
+        self.assertEqual(3, service._num_workers)
+        self.assertFalse(service._restart)
+
+        with self.assertRaises(ValueError):
+            ShardedGetToKnowYouService.from_config(VerbalGetToKnowYou(), Client(), SynchronousEventBus(), config)
+
+
+class TestShardedService(unittest.TestCase):
+    def setUp(self) -> None:
+        self.bus = SynchronousEventBus()
+        self.responses = []
+        self.bus.subscribe("response", self.on_response)
+        self.signals = {}
+        self.speakers = {}
+        self.bus.subscribe("speaker", self.on_speaker)
+
+        self.service = self.create_service()
+        self.service.start()
+
+    def create_service(self, **kwargs):
+        options = dict(workers=2, interval=60, heartbeat=0.05)
+        options.update(kwargs)
+
+        return ShardedGetToKnowYouService("utterance", "image", "face", "id", "response", "speaker", "intention", None,
+                                          [], VerbalGetToKnowYou, Client(), self.bus, **options)
+
+    def restart(self, **kwargs):
+        self.service.stop()
+        self.service = self.create_service(**kwargs)
+        self.service.start()
+
+    def tearDown(self) -> None:
+        self.service.stop()
+
+    def on_response(self, event):
+        self.responses.append(event.payload.signal.text)
+
+    def on_speaker(self, event):
+        mention = event.payload.mentions[0]
+        self.speakers[self.signals[mention.segment[0].container_id]] = mention.annotations[0].value
+
+    def say(self, text, scenarios):
+        for scenario_id in scenarios:
+            event = utterance(text, scenario_id)
+            self.signals[event.payload.signal.id] = scenario_id
+            self.bus.publish("utterance", event)
+        self.service.flush()
+
+    def test_conversations_survive_rebalancing(self):
+        scenarios = [f"scenario-{idx}" for idx in range(20)]
+
+        self.say("Hi", scenarios)
+        self.assertEqual(2, len({self.service.owner(scenario_id) for scenario_id in scenarios}))
+
+        added = self.service.add_worker()
+        self.assertIn(added, {self.service.owner(scenario_id) for scenario_id in scenarios})
+        self.say("Thomas", scenarios)
+
+        self.service.remove_worker(self.service.workers[0])
+        self.say("yes", scenarios)
+
+        self.assertEqual({"Hi, nice to meet you! What is your name?": 20, "So your name is Thomas?": 20,
+                          "Nice to meet you, Thomas!": 20}, Counter(self.responses))
+
+    def test_friends_move_with_conversations(self):
+        scenarios = [f"scenario-{idx}" for idx in range(20)]
+        for text in ("Hi", "Thomas", "yes"):
+            self.say(text, scenarios)
+        known = dict(self.speakers)
+        self.assertEqual(20, len(set(known.values())))
+
+        owners = {scenario_id: self.service.owner(scenario_id) for scenario_id in scenarios}
+        self.service.add_worker()
+        self.assertTrue(any(self.service.owner(scenario_id) != owners[scenario_id] for scenario_id in scenarios))
+
+        self.speakers.clear()
+        for text in ("Hi", "Thomas", "yes"):
+            self.say(text, scenarios)
+        self.assertEqual(known, self.speakers)
+
+    def test_monitor_survives_rebalance_timeout(self):
+        with mock.patch.object(self.service, "_rebalance", side_effect=TimeoutError("No reply")), \
+                self.assertLogs("cltl_service.g2ky.sharding", level="ERROR"):
+            victim = self.service.workers[0]
+            self.service._workers[victim].process.kill()
+            for _ in range(100):
+                if victim not in self.service.workers and len(self.service.workers) == 2:
+                    break
+                time.sleep(0.05)
+
+        self.assertTrue(self.service._monitor.is_alive())
+        self.assertNotIn(victim, self.service.workers)
+        self.assertEqual(2, len(self.service.workers))
+
+    def test_dead_worker_is_replaced(self):
+        victim = self.service.workers[0]
+        self.service._workers[victim].process.kill()
+
+        for _ in range(100):
+            if victim not in self.service.workers and len(self.service.workers) == 2:
+                break
+            time.sleep(0.05)
+        self.assertNotIn(victim, self.service.workers)
+        self.assertEqual(2, len(self.service.workers))
+
+        self.say("Hi", ["scenario"])
+        self.assertEqual(["Hi, nice to meet you! What is your name?"], self.responses)
+
+    def test_events_are_dropped_without_workers(self):
+        self.restart(restart=False)
+        for worker in list(self.service._workers.values()):
+            worker.process.kill()
+        for _ in range(100):
+            if not self.service.workers:
+                break
+            time.sleep(0.05)
+        self.assertEqual([], self.service.workers)
+
+        with self.assertLogs("cltl_service.g2ky.sharding", level="ERROR"):
+            self.bus.publish("utterance", utterance("Hi", "scenario"))
+        self.assertEqual([], self.responses)
+
+    def test_evicted_conversations_are_forgotten(self):
+        self.restart(session_ttl=0.5, interval=0.1)
+        scenarios = [f"scenario-{idx}" for idx in range(10)]
+        self.say("Hi", scenarios)
+        self.assertEqual(10, sum(len(worker.sessions) for worker in self.service._workers.values()))
+
+        for _ in range(100):
+            if not any(worker.sessions for worker in self.service._workers.values()):
+                break
+            time.sleep(0.05)
+        self.assertEqual(0, sum(len(worker.sessions) for worker in self.service._workers.values()))
+
+        self.say("Hi", scenarios)
+        self.assertEqual(["Hi, nice to meet you! What is your name?"] * 20, self.responses)
+
+    def test_annotations_routed_with_their_image(self):
+        for topic, event in reversed(frame("first", 1.0)):
+            self.bus.publish(topic, event)
+        self.service.flush()
+
+        self.assertEqual({"first"}, {session_id for worker in self.service._workers.values()
+                                     for session_id in worker.sessions})
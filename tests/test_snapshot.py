@@ -0,0 +1,196 @@
+import os
+import tempfile
+import time
+import unittest
+import uuid
+
+import numpy as np
+from cltl.combot.event.emissor import AnnotationEvent, ImageSignalEvent, TextSignalEvent
+from cltl.combot.infra.event import Event
+from cltl.combot.infra.event.memory import SynchronousEventBus
+from cltl.face_recognition.api import Face
+from emissor.representation.entity import Gender
+from emissor.representation.scenario import Annotation, ImageSignal, Mention, MultiIndex, TextSignal
+
+from cltl.g2ky.embedding import EmbeddingIndex
+from cltl.g2ky.friends import MemoryFriendStore
+from cltl.g2ky.verbal import VerbalGetToKnowYou, ConvState as VerbalState
+from cltl.g2ky.visual import VisualGetToKnowYou, ConvState
+from cltl_service.g2ky.factory import FriendRegistry, G2KYFactory
+from cltl_service.g2ky.service import GetToKnowYouService
+from cltl_service.g2ky.session import SessionManager
+from cltl_service.g2ky.snapshot import SnapshotStore
+
+
+def face(embedding):
+    return Face(np.asarray(embedding, dtype=np.float32), Gender.FEMALE, 1)
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "snapshots.bin")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_visual_round_trip(self):
+        g2ky = VisualGetToKnowYou(gaze_images=2)
+        for _ in range(3):
+            g2ky.persons_detected([("id1", face([1, 0, 0]))])
+        self.assertEqual(ConvState.QUERY, g2ky.state.conv_state)
+
+        restored = VisualGetToKnowYou(gaze_images=2)
+        restored.restore(g2ky.snapshot())
+
+        self.assertEqual(ConvState.QUERY, restored.state.conv_state)
+        self.assertEqual("id1", restored.state.face_id)
+        np.testing.assert_array_equal(g2ky.state.prototype.embeddings, restored.state.prototype.embeddings)
+
+        self.assertEqual("So your name is Thomas?", restored.utterance_detected("Thomas"))
+
+    def test_verbal_round_trip(self):
+        g2ky = VerbalGetToKnowYou(friends={"id1": "Thomas"})
+        g2ky.response()
+        g2ky.utterance_detected("Thomas")
+        g2ky.utterance_detected("No")
+
+        restored = VerbalGetToKnowYou(friends={"id1": "Thomas"})
+        restored.restore(g2ky.snapshot())
+
+        self.assertEqual(VerbalState.QUERY, restored.state.conv_state)
+        self.assertEqual({"id1"}, restored.state.rejected)
+
+    def test_reload(self):
+        g2ky = VisualGetToKnowYou(gaze_images=2)
+        for _ in range(3):
+            g2ky.persons_detected([("id1", face([1, 0, 0]))])
+
+        store = SnapshotStore(self.path)
+        store.write_session("scenario_1", g2ky.snapshot())
+        store.write_session("scenario_2", VisualGetToKnowYou().snapshot())
+        store.remove_session("scenario_2")
+        store.add_friend("id2", "Anna", np.eye(3, dtype=np.float32))
+        store.close()
+
+        store = SnapshotStore(self.path)
+        self.assertEqual(["scenario_1"], list(store.sessions))
+        self.assertEqual("QUERY", store.sessions["scenario_1"]["conv_state"])
+        name, embeddings = store.friends["id2"]
+        self.assertEqual("Anna", name)
+        np.testing.assert_array_equal(np.eye(3), embeddings)
+
+        restored = VisualGetToKnowYou(gaze_images=2)
+        restored.restore(store.sessions["scenario_1"])
+        self.assertEqual(ConvState.QUERY, restored.state.conv_state)
+        store.close()
+
+    def test_truncated_file(self):
+        store = SnapshotStore(self.path)
+        store.write_session("scenario_1", VerbalGetToKnowYou().snapshot())
+        store.close()
+        with open(self.path, "ab") as snapshot_file:
+            snapshot_file.write(b"\xff\x00\x00\x00partial")
+
+        store = SnapshotStore(self.path)
+        self.assertEqual(["scenario_1"], list(store.sessions))
+        store.write_session("scenario_2", VerbalGetToKnowYou().snapshot())
+        store.close()
+
+        self.assertEqual({"scenario_1", "scenario_2"}, set(SnapshotStore(self.path).sessions))
+
+    def test_compaction(self):
+        store = SnapshotStore(self.path, compact_after=10)
+        g2ky = VerbalGetToKnowYou()
+        for _ in range(100):
+            store.write_session("scenario_1", g2ky.snapshot())
+        size = os.path.getsize(self.path)
+        store.compact()
+        self.assertLessEqual(os.path.getsize(self.path), size)
+        store.close()
+
+        self.assertEqual(["scenario_1"], list(SnapshotStore(self.path).sessions))
+
+    def test_restore_friends(self):
+        store = SnapshotStore(self.path)
+        store.add_friend("id1", "Thomas", np.asarray([[1, 0], [1, 0]], dtype=np.float32))
+        store.add_friend("id2", "Anna")
+        store.close()
+
+        friends = MemoryFriendStore()
+        index = EmbeddingIndex()
+        SnapshotStore(self.path).restore_friends(friends, index)
+
+        self.assertEqual("Thomas", friends.get("id1"))
+        self.assertEqual("Anna", friends.get("id2"))
+        self.assertEqual("id1", index.query([np.asarray([1, 0], dtype=np.float32)])[0][0])
+
+    def test_restore_time(self):
+        store = SnapshotStore(self.path)
+        g2ky = VisualGetToKnowYou(gaze_images=2)
+        for _ in range(3):
+            g2ky.persons_detected([("id1", face(np.random.rand(512)))])
+        for session in range(1000):
+            store.write_session(f"scenario_{session}", g2ky.snapshot())
+        store.close()
+
+        start = time.perf_counter()
+        store = SnapshotStore(self.path)
+        for snapshot in store.sessions.values():
+            VisualGetToKnowYou().restore(snapshot)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        store.close()
+
+
+class Client:
+    def get_current_scenario_id(self):
+        return "scenario"
+
+
+class TestServiceRestart(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "snapshots.bin")
+        self.bus = SynchronousEventBus()
+        self.responses = []
+        self.bus.subscribe("response", lambda event: self.responses.append(event.payload.signal.text))
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def start_service(self):
+        factory = G2KYFactory("visual", FriendRegistry(), {"gaze_images": 2})
+        service = GetToKnowYouService("utterance", "image", "face", "id", "response", "speaker", None, None, [],
+                                      None, Client(), self.bus, None, sessions=SessionManager(factory),
+                                      snapshots=SnapshotStore(self.path), friends=factory.friends)
+        service.start()
+
+        return service
+
+    def publish_frame(self, identifier, embedding):
+        image = ImageSignal.for_scenario("scenario", 0, 0, None, (0, 0, 100, 100))
+        mention = lambda value: Mention(str(uuid.uuid4()), [MultiIndex(image.id, (0, 0, 20, 20))],
+                                        [Annotation("", value, "", 0)])
+        self.bus.publish("image", Event.for_payload(ImageSignalEvent.create(image)))
+        self.bus.publish("face", Event.for_payload(AnnotationEvent.create([mention(face(embedding))])))
+        self.bus.publish("id", Event.for_payload(AnnotationEvent.create([mention(identifier)])))
+
+    def publish_utterance(self, text):
+        signal = TextSignal.for_scenario("scenario", 0, 0, None, text)
+        self.bus.publish("utterance", Event.for_payload(TextSignalEvent.for_speaker(signal)))
+
+    def test_known_friend_is_recognized_after_restart(self):
+        service = self.start_service()
+        for _ in range(3):
+            self.publish_frame("id1", [1, 0, 0])
+        self.publish_utterance("Thomas")
+        self.publish_utterance("yes")
+        service.stop()
+        self.assertEqual("Nice to meet you, Thomas!", self.responses[-1])
+
+        service = self.start_service()
+        # Face recognition assigns a new identifier after the restart
+        self.publish_frame("id2", [0.9, 0.1, 0])
+        service.stop()
+
+        self.assertEqual("Nice to meet you again Thomas!", self.responses[-1])
@@ -0,0 +1,154 @@
+import json
+import os
+import pstats
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+
+from cltl_service.g2ky.tracing import Tracer
+
+
+class Bus:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, event):
+        self.published.append(topic)
+
+
+class Service:
+    def __init__(self):
+        self._event_bus = Bus()
+        self.groups = []
+
+    def _process(self, event):
+        if event.metadata.topic == "face":
+            self.process_group(SimpleNamespace(image_id="image", session_id=None))
+        self._event_bus.publish("response", self._create_payload("Hi"))
+
+    def process_group(self, group):
+        self._process_group(group)
+
+    def _process_group(self, group):
+        self.groups.append(group)
+
+    def _create_payload(self, response, session_id=None):
+        return SimpleNamespace(id="response")
+
+    def _create_speaker_payload(self, signal, id, name):
+        pass
+
+    def _create_speaker_payload_for_img(self, img_id, bbox, id, name):
+        pass
+
+
+def event(topic, **payload):
+    return SimpleNamespace(id=f"{topic}_event", metadata=SimpleNamespace(topic=topic),
+                           payload=SimpleNamespace(**payload))
+
+
+class TestTracer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.service = Service()
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_spans(self):
+        tracer = Tracer()
+        tracer.instrument(self.service)
+        self.service._process(event("face"))
+
+        spans = {span[0]: span for span in tracer.spans}
+        self.assertEqual({"process", "process_group", "process_face_group", "create_payload", "publish"},
+                         set(spans))
+        self.assertEqual({"event_id": "face_event", "topic": "face"}, spans["process"][4])
+        self.assertEqual("image", spans["process_group"][4]["image_id"])
+        self.assertEqual({"topic": "response", "event_id": "response"}, spans["publish"][4])
+        self.assertEqual(["response"], self.service._event_bus.published)
+
+    def test_sampling(self):
+        tracer = Tracer(sample_rate=0)
+        tracer.instrument(self.service)
+        self.service._process(event("face"))
+
+        self.assertEqual([], tracer.spans)
+        self.assertEqual(1, len(self.service.groups))
+
+    def test_uninstrument(self):
+        tracer = Tracer()
+        tracer.instrument(self.service)
+        tracer.uninstrument()
+
+        self.assertNotIn("_process", vars(self.service))
+        self.assertNotIn("publish", vars(self.service._event_bus))
+
+    def test_export(self):
+        path = os.path.join(self.tmp_dir.name, "trace.json")
+        tracer = Tracer(path=path)
+        tracer.instrument(self.service)
+        self.service._process(event("text"))
+        tracer.close()
+
+        with open(path) as trace_file:
+            trace = json.load(trace_file)
+        self.assertEqual({"process", "create_payload", "publish"},
+                         {trace_event["name"] for trace_event in trace["traceEvents"]})
+        self.assertTrue(all(trace_event["ph"] == "X" for trace_event in trace["traceEvents"]))
+
+    def test_profile_on_control_event(self):
+        path = os.path.join(self.tmp_dir.name, "g2ky.prof")
+        tracer = Tracer(sample_rate=0, control_topic="control", profile_path=path)
+        tracer.instrument(self.service)
+
+        self.service._process(event("control", seconds=0.05))
+        timer = tracer._profile_timer
+        self.service._process(event("face"))
+        self.assertFalse(os.path.exists(path))
+
+        timer.join(1)
+
+        self.assertTrue(os.path.exists(path))
+        self.assertTrue(pstats.Stats(path).total_calls > 0)
+
+    def test_profile_written_on_close(self):
+        path = os.path.join(self.tmp_dir.name, "g2ky.prof")
+        tracer = Tracer(sample_rate=0, profile_path=path)
+        tracer.instrument(self.service)
+
+        tracer.request_profile(60)
+        self.service._process(event("face"))
+        self.assertFalse(os.path.exists(path))
+
+        tracer.close()
+        self.assertTrue(os.path.exists(path))
+        self.assertTrue(pstats.Stats(path).total_calls > 0)
+
+    def test_profile_concurrent_threads(self):
+        path = os.path.join(self.tmp_dir.name, "g2ky.prof")
+        tracer = Tracer(sample_rate=1, profile_path=path)
+        tracer.instrument(self.service)
+        tracer.request_profile(60)
+
+        errors = []
+
+        def process():
+            try:
+                for _ in range(50):
+                    self.service._process(event("face"))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=process) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        tracer.close()
+
+        self.assertEqual([], errors)
+        self.assertEqual(200, len(self.service.groups))
+        self.assertEqual(200, sum(1 for span in tracer.spans if span[0] == "process"))
+        self.assertTrue(pstats.Stats(path).total_calls > 0)
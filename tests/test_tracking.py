@@ -0,0 +1,110 @@
+import unittest
+import uuid
+from types import SimpleNamespace
+
+import numpy as np
+from cltl.combot.event.emissor import AnnotationEvent, ImageSignalEvent
+from cltl.combot.infra.event import Event
+from cltl.combot.infra.event.memory import SynchronousEventBus
+from cltl.face_recognition.api import Face
+from emissor.representation.scenario import Annotation, ImageSignal, Mention, MultiIndex
+
+from cltl.g2ky.tracking import FaceTracker, iou
+from cltl.g2ky.visual import VisualGetToKnowYou, ConvState
+from cltl_service.g2ky.service import GetToKnowYouService
+
+
+def face(x, size=10):
+    return SimpleNamespace(embedding=np.empty((0,)), bounds=(x, 0, x + size, size))
+
+
+class TestFaceTracker(unittest.TestCase):
+    def test_iou(self):
+        self.assertEqual(1, iou((0, 0, 10, 10), (0, 0, 10, 10)))
+        self.assertEqual(0, iou((0, 0, 10, 10), (10, 0, 20, 10)))
+        self.assertAlmostEqual(1 / 3, iou((0, 0, 10, 10), (5, 0, 15, 10)))
+
+    def test_carry_over_identity(self):
+        tracker = FaceTracker()
+        first, = tracker.update([("id1", face(0))])
+        second, = tracker.update([(None, face(2))])
+
+        self.assertIs(first, second)
+        self.assertEqual("id1", second.identifier)
+
+    def test_resolved_identity(self):
+        tracker = FaceTracker()
+        track, = tracker.update([("id1", face(0))])
+        track.resolved = True
+        tracker.update([("id2", face(1))])
+
+        self.assertEqual("id1", track.identifier)
+
+    def test_new_and_dropped_tracks(self):
+        tracker = FaceTracker(max_misses=1)
+        left, right = tracker.update([("id1", face(0)), ("id2", face(50))])
+        self.assertNotEqual(left.track_id, right.track_id)
+
+        tracker.update([("id1", face(1))])
+        self.assertEqual(2, len(tracker.tracks))
+        tracker.update([("id1", face(2))])
+        self.assertEqual([left], tracker.tracks)
+
+    def test_focus(self):
+        tracker = FaceTracker()
+        small, large = tracker.update([("id1", face(0)), ("id2", face(50, size=20))])
+        self.assertIs(large, tracker.focus([small, large]))
+
+        # Keep the focus while the track is visible
+        visible = tracker.update([("id1", face(0)), ("id2", face(50, size=20)), ("id3", face(100, size=40))])
+        self.assertIs(large, tracker.focus(visible))
+
+        visible = tracker.update([("id1", face(0)), ("id3", face(100, size=40))])
+        self.assertEqual("id3", tracker.focus(visible).identifier)
+
+
+class TestTrackingG2KY(unittest.TestCase):
+    def test_multiple_persons(self):
+        g2ky = VisualGetToKnowYou(friends={"id2": "Thomas"}, tracker=FaceTracker())
+
+        response = g2ky.persons_detected([("id1", face(0)), ("id2", face(50, size=20))])
+
+        self.assertEqual("Nice to meet you again Thomas!", response)
+        self.assertEqual(ConvState.KNOWN, g2ky.state.conv_state)
+
+    def test_gaze_without_ids(self):
+        g2ky = VisualGetToKnowYou(tracker=FaceTracker())
+        g2ky.persons_detected([("id1", face(0))])
+        for x in range(1, 6):
+            response = g2ky.persons_detected([(None, face(x))])
+
+        self.assertEqual("What is your name, stranger?", response)
+        self.assertEqual("id1", g2ky.state.face_id)
+
+
+class TestTrackingService(unittest.TestCase):
+    def test_speaker_on_focused_face(self):
+        bus = SynchronousEventBus()
+        speakers = []
+        bus.subscribe("speaker", lambda event: speakers.append(event.payload.mentions[0]))
+        g2ky = VisualGetToKnowYou(friends={"id2": "Thomas"}, tracker=FaceTracker())
+        service = GetToKnowYouService("utterance", "image", "face", "id", "response", "speaker", None, None, [],
+                                      g2ky, SimpleNamespace(get_current_scenario_id=lambda: "scenario"), bus,
+                                      None)
+        service.start()
+        try:
+            image = ImageSignal.for_scenario("scenario", 0, 0, None, (0, 0, 100, 100))
+            bounds = [(0, 0, 10, 10), (50, 0, 90, 40)]
+            mentions = lambda values: [Mention(str(uuid.uuid4()), [MultiIndex(image.id, bound)],
+                                               [Annotation("", value, "", 0)]) for bound, value in zip(bounds, values)]
+            faces = [Face(np.ones(4, dtype=np.float32), None, None) for _ in bounds]
+            bus.publish("image", Event.for_payload(ImageSignalEvent.create(image)))
+            bus.publish("face", Event.for_payload(AnnotationEvent.create(mentions(faces))))
+            bus.publish("id", Event.for_payload(AnnotationEvent.create(mentions(["id1", "id2"]))))
+        finally:
+            service.stop()
+
+        self.assertEqual(1, len(speakers))
+        self.assertEqual("id2", speakers[0].annotations[0].value)
+        self.assertEqual(image.id, speakers[0].segment[0].container_id)
+        self.assertEqual((50, 0, 90, 40), tuple(speakers[0].segment[0].bounds))